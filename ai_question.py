@@ -1,25 +1,619 @@
 import os
 import json
-from openai import AzureOpenAI
-from typing import List, Dict, Any
-
-# AzureOpenAIクライアントの初期化
-client = AzureOpenAI(
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-    api_version="2024-12-01-preview",
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
+import time
+import asyncio
+import threading
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, AsyncIterator
+
+# openai（と httpx）は読み込みに時間がかかるため、クライアントを生成するときに読み込む（ワーカーの起動を速くする）
+if TYPE_CHECKING:
+    from openai import AzureOpenAI, AsyncAzureOpenAI
+
+from llm_cache import LLMResponseCache, create_llm_cache_from_env, make_cache_key
+from observability import DEPLOYMENT_REQUESTS, ERRORS, LLM_CALL_LATENCY, LLM_TOKENS, observe_latency
+from llm_resilience import (
+    CircuitOpenError,
+    LatencyTracker,
+    PRIORITY_BACKGROUND,
+    PRIORITY_BATCH,
+    PRIORITY_INTERACTIVE,
+    estimate_request_tokens,
+    hedge_delay,
+    run_hedged,
 )
-# デプロイメント名は環境に合わせて調整してください
-DEPLOYMENT_NAME = "gpt-4o-mini"
+from llm_pool import Deployment, DeploymentPool, LLM_POOL_MAX_ATTEMPTS, load_deployments_from_env
+
+API_VERSION = "2024-12-01-preview"
+
+# 同期版の AzureOpenAI クライアント（初回の呼び出し時に生成する。環境変数の不足はインポート時ではなく呼び出し時のエラーになる）
+_sync_client: Optional["AzureOpenAI"] = None
+_sync_client_lock = threading.Lock()
+
+
+def get_sync_client() -> "AzureOpenAI":
+    """同期版のクライアントを返す（初回だけ生成する）"""
+    global _sync_client
+    if _sync_client is None:
+        with _sync_client_lock:
+            if _sync_client is None:
+                from openai import AzureOpenAI
+
+                _sync_client = AzureOpenAI(
+                    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+                    api_version=API_VERSION,
+                    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
+                )
+    return _sync_client
+
+# デプロイメント名は環境に合わせて調整してください（非同期版の呼び出し先は llm_pool を参照）
+DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_DEPLOYMENT", "gpt-4o-mini")
 
 # ----------------------------------------------------
-# 新規追加: 最初の質問を生成する関数
+# 非同期クライアントの設定（接続プール・タイムアウト）
 # ----------------------------------------------------
-def generate_initial_question(company_info: str) -> str:
+# 1ワーカーあたりの同時接続数の上限
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+
+# 呼び出し種別ごとのタイムアウト（秒）
+LLM_TIMEOUTS = {
+    "initial": float(os.getenv("LLM_TIMEOUT_INITIAL", "20")),
+    "followup": float(os.getenv("LLM_TIMEOUT_FOLLOWUP", "20")),
+    "review": float(os.getenv("LLM_TIMEOUT_REVIEW", "20")),
+    "summary": float(os.getenv("LLM_TIMEOUT_SUMMARY", "60")),
+}
+
+# 質問生成の応答キャッシュ（LLM_CACHE_ENABLED=true の場合のみ有効。負荷試験・デモ用）。
+# SQLite のファイルなどをインポート時に作らないよう、最初に使うときに生成する
+_llm_cache: Optional[LLMResponseCache] = None
+_llm_cache_loaded = False
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """応答キャッシュを返す（初回だけ生成する。無効な場合は None）"""
+    global _llm_cache, _llm_cache_loaded
+    if not _llm_cache_loaded:
+        with _llm_cache_lock:
+            if not _llm_cache_loaded:
+                _llm_cache = create_llm_cache_from_env()
+                _llm_cache_loaded = True
+    return _llm_cache
+
+
+# リクエスト単位でキャッシュを使わないためのフラグ（api.py がリクエストヘッダーから設定する）
+llm_cache_bypass: ContextVar[bool] = ContextVar("llm_cache_bypass", default=False)
+
+
+class LLMUsageStats:
     """
-    企業情報に基づいて、面接開始時の最初の質問を生成します。
-    必ずJSON形式で返す: {"question": "生成された質問"}
+    LLM呼び出しのトークン使用量の集計。
+    プロンプトの先頭部分がプロバイダ側でキャッシュされたトークン数（cached_tokens）も数え、
+    プロンプトキャッシュのヒット率を確認できるようにする。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+        self.requests_with_cache_hit = 0
+
+    def record(self, usage: Any, call: str = "other") -> None:
+        """レスポンスの usage を集計に加える（usage が無い場合は何もしない）"""
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = (getattr(details, "cached_tokens", None) or 0) if details is not None else 0
+        LLM_TOKENS.labels(call=call, kind="prompt").inc(usage.prompt_tokens or 0)
+        LLM_TOKENS.labels(call=call, kind="completion").inc(usage.completion_tokens or 0)
+        LLM_TOKENS.labels(call=call, kind="cached").inc(cached)
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += usage.prompt_tokens or 0
+            self.completion_tokens += usage.completion_tokens or 0
+            self.cached_tokens += cached
+            if cached:
+                self.requests_with_cache_hit += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens,
+                "completion_tokens": self.completion_tokens,
+                "requests_with_cache_hit": self.requests_with_cache_hit,
+                "cached_token_rate": self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0,
+            }
+
+
+llm_usage = LLMUsageStats()
+
+# 呼び出し種別ごとの直近のレイテンシ（ヘッジリクエストの待ち時間の計算に使う）
+llm_latency: Dict[str, LatencyTracker] = defaultdict(LatencyTracker)
+# 呼び出し種別ごとの優先度。面接中のターンを先に通し、総合レビュー、バックグラウンドの要約の順にする
+CALL_PRIORITIES = {
+    "initial": PRIORITY_INTERACTIVE,
+    "followup": PRIORITY_INTERACTIVE,
+    "review": PRIORITY_INTERACTIVE,
+    "full_review": PRIORITY_BATCH,
+    "criterion_review": PRIORITY_BATCH,
+    "rolling_summary": PRIORITY_BACKGROUND,
+    "question_pool": PRIORITY_BACKGROUND,
+    # 過去の面接の一括再レビュー（バッチジョブ）は、面接中の総合レビューより後に通す
+    "batch_review": PRIORITY_BACKGROUND,
+    "batch_criterion_review": PRIORITY_BACKGROUND,
+}
+# 呼び出し種別ごとのデプロイメントのクラス（プールにそのクラスが無い場合は全デプロイメントから選ぶ）
+LLM_DEPLOYMENT_CLASS_INTERACTIVE = os.getenv("LLM_DEPLOYMENT_CLASS_INTERACTIVE", "fast")
+LLM_DEPLOYMENT_CLASS_REVIEW = os.getenv("LLM_DEPLOYMENT_CLASS_REVIEW", "large")
+CALL_DEPLOYMENT_CLASSES = {
+    "initial": LLM_DEPLOYMENT_CLASS_INTERACTIVE,
+    "followup": LLM_DEPLOYMENT_CLASS_INTERACTIVE,
+    "review": LLM_DEPLOYMENT_CLASS_INTERACTIVE,
+    "rolling_summary": LLM_DEPLOYMENT_CLASS_INTERACTIVE,
+    "question_pool": LLM_DEPLOYMENT_CLASS_INTERACTIVE,
+    "full_review": LLM_DEPLOYMENT_CLASS_REVIEW,
+    "criterion_review": LLM_DEPLOYMENT_CLASS_REVIEW,
+    "batch_review": LLM_DEPLOYMENT_CLASS_REVIEW,
+    "batch_criterion_review": LLM_DEPLOYMENT_CLASS_REVIEW,
+}
+
+
+def create_async_client(deployment: Deployment) -> "AsyncAzureOpenAI":
+    """
+    デプロイメントごとにプロセス内で共有する非同期クライアントを生成する（llm_pool が初回の選択時に呼び出す）。
+    接続プールを共有することで、1ワーカーで多数のLLM呼び出しを並行して処理できる。
+    """
+    import httpx
+    from openai import AsyncAzureOpenAI, DefaultAsyncHttpxClient
+
+    http_client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+        ),
+        timeout=httpx.Timeout(max(LLM_TIMEOUTS.values()), connect=LLM_CONNECT_TIMEOUT),
+    )
+    return AsyncAzureOpenAI(
+        api_key=deployment.api_key,
+        api_version=API_VERSION,
+        azure_endpoint=deployment.endpoint,
+        http_client=http_client,
+    )
+
+
+# 非同期版の呼び出し先（AZURE_OPENAI_DEPLOYMENTS で複数のデプロイメントを指定できる）。
+# 環境変数の読み込みはインポート時ではなく、最初の呼び出し（またはワーカーの起動時の準備）で行う
+_llm_pool: Optional[DeploymentPool] = None
+_llm_pool_lock = threading.Lock()
+
+
+def get_llm_pool() -> DeploymentPool:
+    """デプロイメントのプールを返す（初回だけ生成する）"""
+    global _llm_pool
+    if _llm_pool is None:
+        with _llm_pool_lock:
+            if _llm_pool is None:
+                _llm_pool = DeploymentPool(load_deployments_from_env(), create_async_client)
+    return _llm_pool
+
+
+async def close_async_client() -> None:
+    """全デプロイメントの非同期クライアントを閉じる（アプリ終了時に呼び出す）"""
+    if _llm_pool is not None:
+        await _llm_pool.close()
+
+
+async def warm_up_llm_clients(timeout: float) -> Dict[str, str]:
+    """
+    全デプロイメントの非同期クライアントを生成し、接続プールに接続を開いておく（ワーカーの起動時に呼び出す）。
+    接続を開くために軽いリクエスト（モデルの一覧）を送る。エラーの応答でも接続は開けるため、
+    失敗しても例外にはせず、デプロイメントごとの結果（"ok"、エラーの応答の "status_<コード>"、または例外の種類）を返す。
+    """
+    from openai import APIStatusError
+
+    pool = get_llm_pool()
+
+    async def connect(deployment: Deployment) -> str:
+        try:
+            await pool.prepare(deployment).client.models.list(timeout=timeout)
+            return "ok"
+        except APIStatusError as e:
+            return f"status_{e.status_code}"
+        except Exception as e:
+            return type(e).__name__
+
+    names = [deployment.name for deployment in pool.deployments]
+    results = await asyncio.gather(*(connect(deployment) for deployment in pool.deployments))
+    return dict(zip(names, results))
+
+
+def _completion_kwargs(messages: List[Dict[str, str]], max_tokens: int, json_mode: bool) -> Dict[str, Any]:
+    """chat.completions.create に渡す共通パラメータを組み立てる"""
+    kwargs: Dict[str, Any] = {
+        "model": DEPLOYMENT_NAME,
+        "messages": messages,
+        "temperature": 0.7,
+        "max_tokens": max_tokens,
+    }
+    if json_mode:
+        kwargs["response_format"] = {"type": "json_object"}
+    return kwargs
+
+
+def _cache_key(kwargs: Dict[str, Any], models: Optional[List[str]] = None) -> Optional[str]:
+    """
+    キャッシュを使う場合はキャッシュキーを、使わない場合は None を返す。
+    models を指定した場合は、kwargs の model（設定上のデプロイメント名）の代わりにそれをキーに含める
+    """
+    if get_llm_cache() is None or llm_cache_bypass.get():
+        return None
+    params = {key: value for key, value in kwargs.items() if key != "messages"}
+    if models is not None:
+        params["model"] = models
+    return make_cache_key(kwargs["messages"], params)
+
+
+def _routable_models(call: str, deployment_class: Optional[str]) -> List[str]:
+    """
+    プールの呼び出しで、キャッシュキーに含めるデプロイメント名の一覧。
+    キャッシュは振り分けの前に引くため、実際に応答するデプロイメントではなく、振り分けうるデプロイメント全体をキーにする
+    （同じクラスのデプロイメントは同じモデルとみなして応答を共有し、クラスや構成が変われば別のキーになる）
+    """
+    return get_llm_pool().models(deployment_class or CALL_DEPLOYMENT_CLASSES.get(call))
+
+
+def _should_cache(cache_key: Optional[str], content: str, json_mode: bool) -> bool:
+    """正常な応答だけをキャッシュに保存する（JSONモードで不正なJSONは保存しない）"""
+    if cache_key is None or not content:
+        return False
+    if json_mode:
+        try:
+            json.loads(content)
+        except json.JSONDecodeError:
+            return False
+    return True
+
+
+def _store_in_cache(cache_key: Optional[str], content: str, json_mode: bool) -> None:
+    if _should_cache(cache_key, content, json_mode):
+        get_llm_cache().set(cache_key, content)
+
+
+async def _store_in_cache_async(cache_key: Optional[str], content: str, json_mode: bool) -> None:
+    """_store_in_cache の非同期版（キャッシュへの書き込みはイベントループの外で行う）"""
+    if _should_cache(cache_key, content, json_mode):
+        await get_llm_cache().set_async(cache_key, content)
+
+
+def _is_backend_failure(error: Exception) -> bool:
+    """接続エラー・タイムアウト・レート制限・5xx だけをバックエンドの障害とみなす（リクエスト内容による 4xx は含めない）"""
+    from openai import APIConnectionError, APIStatusError
+
+    return isinstance(error, APIConnectionError) or (
+        isinstance(error, APIStatusError) and (error.status_code == 429 or error.status_code >= 500)
+    )
+
+
+def is_transient_llm_error(error: BaseException) -> bool:
+    """
+    試し直せば成功しうるLLM呼び出しの失敗か（バックエンドの障害・タイムアウト・サーキットブレーカーによる遮断）。
+    リクエスト内容による 4xx（コンテンツフィルターなど）や、入力の検証エラーは含めない
+    """
+    return isinstance(error, (asyncio.TimeoutError, CircuitOpenError)) or (
+        isinstance(error, Exception) and _is_backend_failure(error)
+    )
+
+
+def _count_llm_error(deployment: Deployment, error: Exception) -> None:
+    """LLM呼び出しの失敗を種類別に数え、バックエンドの障害とみなせるものはデプロイメントのサーキットブレーカーに記録する"""
+    from openai import APIStatusError, APITimeoutError
+
+    ERRORS.labels(type="llm_timeout" if isinstance(error, APITimeoutError) else "llm_error").inc()
+    DEPLOYMENT_REQUESTS.labels(deployment=deployment.name, outcome="error").inc()
+    if _is_backend_failure(error):
+        deployment.breaker.record_failure()
+    # レート制限を受けた場合は、Retry-After の間は流量制御の側でも送信を止める
+    if isinstance(error, APIStatusError) and error.status_code == 429:
+        try:
+            retry_after = float(error.response.headers.get("retry-after", "1"))
+        except ValueError:
+            retry_after = 1.0
+        deployment.limiter.pause(retry_after)
+
+
+def _record_cancelled(deployment: Deployment, timeout: Optional[float], start: float) -> None:
+    """
+    呼び出し元の期限切れなどでキャンセルされた呼び出しを記録する。
+    タイムアウトの直前までかかっていた場合は、応答しなかったものとして障害に数える
+    （ヘッジリクエストで負けた方は、通常はそれより前にキャンセルされるため数えない）。
+    """
+    elapsed = time.perf_counter() - start
+    DEPLOYMENT_REQUESTS.labels(deployment=deployment.name, outcome="cancelled").inc()
+    deployment.observe_latency(elapsed)
+    if timeout and elapsed >= timeout * 0.9:
+        ERRORS.labels(type="llm_timeout").inc()
+        deployment.breaker.record_failure()
+
+
+def _route(call: str, deployment_class: Optional[str], outcome: Dict[str, str]) -> Deployment:
+    """呼び出し先のデプロイメントを選ぶ（全て切り離し中の場合は CircuitOpenError を送出する）"""
+    try:
+        return get_llm_pool().choose(deployment_class or CALL_DEPLOYMENT_CLASSES.get(call))
+    except CircuitOpenError:
+        outcome["outcome"] = "circuit_open"
+        ERRORS.labels(type="circuit_open").inc()
+        raise
+
+
+def _failover(call: str, deployment_class: Optional[str], error: Exception,
+              tried: List[Deployment]) -> Optional[Deployment]:
+    """障害とみなせる失敗の場合、まだ試していないデプロイメントを返す（やり直さない場合は None）"""
+    if not _is_backend_failure(error) or len(tried) >= LLM_POOL_MAX_ATTEMPTS:
+        return None
+    try:
+        deployment = get_llm_pool().choose(deployment_class or CALL_DEPLOYMENT_CLASSES.get(call), exclude=tried)
+    except CircuitOpenError:
+        return None
+    ERRORS.labels(type="llm_failover").inc()
+    return deployment
+
+
+async def _admit(deployment: Deployment, kwargs: Dict[str, Any], call: str) -> int:
+    """送信前にトークン数を見積もり、流量制御の枠が空くまで優先度に応じて待つ。見積もった値を返す"""
+    estimated = estimate_request_tokens(kwargs["messages"], kwargs["max_tokens"])
+    await deployment.limiter.acquire(estimated, CALL_PRIORITIES.get(call, PRIORITY_BACKGROUND))
+    return estimated
+
+
+def _record_success(deployment: Deployment, call: str, start: float) -> None:
+    elapsed = time.perf_counter() - start
+    deployment.breaker.record_success()
+    deployment.observe_latency(elapsed)
+    DEPLOYMENT_REQUESTS.labels(deployment=deployment.name, outcome="ok").inc()
+    llm_latency[call].observe(elapsed)
+
+
+def _chat_completion(messages: List[Dict[str, str]], max_tokens: int, json_mode: bool = False,
+                     timeout: Optional[float] = None, cacheable: bool = False, call: str = "other") -> str:
     """
+    同期クライアントでチャット補完を実行し、本文を返す（call は計測用の呼び出し種別）。
+    デプロイメントの振り分け・サーキットブレーカー・流量制御（llm_pool）は非同期版だけで行う
+    """
+    kwargs = _completion_kwargs(messages, max_tokens, json_mode)
+    cache_key = _cache_key(kwargs) if cacheable else None
+    with observe_latency(LLM_CALL_LATENCY, call=call) as outcome:
+        if cache_key is not None:
+            cached = get_llm_cache().get(cache_key)
+            if cached is not None:
+                outcome["outcome"] = "cache_hit"
+                return cached
+
+        start = time.perf_counter()
+        try:
+            response = get_sync_client().chat.completions.create(**kwargs, timeout=timeout)
+        except Exception as e:
+            from openai import APITimeoutError
+
+            ERRORS.labels(type="llm_timeout" if isinstance(e, APITimeoutError) else "llm_error").inc()
+            raise
+        llm_latency[call].observe(time.perf_counter() - start)
+        llm_usage.record(response.usage, call)
+        content = response.choices[0].message.content.strip()
+        _store_in_cache(cache_key, content, json_mode)
+        return content
+
+
+async def _chat_completion_async(messages: List[Dict[str, str]], max_tokens: int, json_mode: bool = False,
+                                 timeout: Optional[float] = None, cacheable: bool = False,
+                                 call: str = "other", deployment_class: Optional[str] = None) -> str:
+    """
+    デプロイメントのプールから呼び出し先を選んでチャット補完を実行し、本文を返す。
+    call は計測用の呼び出し種別で、deployment_class を省略した場合は call に対応するクラスを使う。
+    """
+    kwargs = _completion_kwargs(messages, max_tokens, json_mode)
+    cache_key = _cache_key(kwargs, _routable_models(call, deployment_class)) if cacheable else None
+    with observe_latency(LLM_CALL_LATENCY, call=call) as outcome:
+        if cache_key is not None:
+            cached = await get_llm_cache().get_async(cache_key)
+            if cached is not None:
+                outcome["outcome"] = "cache_hit"
+                return cached
+
+        deployment: Optional[Deployment] = _route(call, deployment_class, outcome)
+        tried: List[Deployment] = []
+        while True:
+            current = deployment
+            kwargs["model"] = current.deployment
+            estimated = await _admit(current, kwargs, call)
+            start = time.perf_counter()
+            current.begin()
+            try:
+                response = await current.client.chat.completions.create(**kwargs, timeout=timeout)
+                break
+            except asyncio.CancelledError:
+                _record_cancelled(current, timeout, start)
+                raise
+            except Exception as e:
+                _count_llm_error(current, e)
+                tried.append(current)
+                # 障害とみなせる失敗は、別のデプロイメントがあればそちらでやり直す
+                deployment = _failover(call, deployment_class, e, tried)
+                if deployment is None:
+                    raise
+            finally:
+                current.end()
+        _record_success(current, call, start)
+        current.limiter.adjust(estimated, getattr(response.usage, "total_tokens", None))
+        llm_usage.record(response.usage, call)
+        content = response.choices[0].message.content.strip()
+        await _store_in_cache_async(cache_key, content, json_mode)
+        return content
+
+
+async def _chat_completion_stream_async(messages: List[Dict[str, str]], max_tokens: int, json_mode: bool = False,
+                                        timeout: Optional[float] = None, cacheable: bool = False,
+                                        call: str = "other",
+                                        deployment_class: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    デプロイメントのプールから呼び出し先を選んでストリーミング補完を実行し、トークン（差分テキスト）を順に返す。
+    振り分けに使う応答時間は、最初のチャンクが返るまでの時間とする。
+    """
+    kwargs = _completion_kwargs(messages, max_tokens, json_mode)
+    cache_key = _cache_key(kwargs, _routable_models(call, deployment_class)) if cacheable else None
+    with observe_latency(LLM_CALL_LATENCY, call=f"{call}_stream") as outcome:
+        if cache_key is not None:
+            cached = await get_llm_cache().get_async(cache_key)
+            if cached is not None:
+                outcome["outcome"] = "cache_hit"
+                yield cached
+                return
+
+        deployment = _route(call, deployment_class, outcome)
+        kwargs["model"] = deployment.deployment
+        estimated = await _admit(deployment, kwargs, call)
+        start = time.perf_counter()
+        deployment.begin()
+        try:
+            # include_usage を指定すると、最後のチャンク（choices が空）で usage が返る
+            stream = await deployment.client.chat.completions.create(
+                **kwargs, stream=True, stream_options={"include_usage": True}, timeout=timeout
+            )
+            _record_success(deployment, f"{call}_stream", start)
+            chunks = []
+            async for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    llm_usage.record(chunk.usage, call)
+                    deployment.limiter.adjust(estimated, getattr(chunk.usage, "total_tokens", None))
+                # Azure はコンテンツフィルタ結果のみのチャンク（choices が空）を返すことがある
+                if chunk.choices and chunk.choices[0].delta.content:
+                    chunks.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+        except asyncio.CancelledError:
+            _record_cancelled(deployment, timeout, start)
+            raise
+        except Exception as e:
+            _count_llm_error(deployment, e)
+            raise
+        finally:
+            deployment.end()
+        await _store_in_cache_async(cache_key, "".join(chunks).strip(), json_mode)
+
+
+class JSONFieldStreamExtractor:
+    """
+    JSONモードで逐次生成される出力から、指定した文字列フィールドの値を取り出す。
+    feed() にチャンクを渡すたびに、新たに確定した値の部分文字列を返す。
+
+    例: '{"question": "御社' -> '御社'、続けて 'の..."}' -> 'の...'
+    """
+
+    _ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+    def __init__(self, field: str = "question"):
+        self._key = json.dumps(field)
+        self._buffer = ""
+        self._pos = 0
+        self._state = "key"  # key -> value -> done
+        self.raw = ""  # 受信したチャンク全体（パース失敗時のフォールバック用）
+        self.value = ""
+
+    @property
+    def done(self) -> bool:
+        return self._state == "done"
+
+    def _skip_whitespace(self, pos: int) -> int:
+        while pos < len(self._buffer) and self._buffer[pos] in " \t\r\n":
+            pos += 1
+        return pos
+
+    def _find_value_start(self) -> bool:
+        """キーとコロンの後ろの開始引用符まで読み進める（データ不足なら False）"""
+        while True:
+            idx = self._buffer.find(self._key, self._pos)
+            if idx < 0:
+                # キーがチャンク境界で分割されている可能性があるため末尾を残す
+                self._pos = max(self._pos, len(self._buffer) - len(self._key))
+                return False
+            pos = self._skip_whitespace(idx + len(self._key))
+            if pos >= len(self._buffer):
+                self._pos = idx
+                return False
+            if self._buffer[pos] != ":":
+                self._pos = idx + 1
+                continue
+            pos = self._skip_whitespace(pos + 1)
+            if pos >= len(self._buffer):
+                self._pos = idx
+                return False
+            if self._buffer[pos] != '"':
+                # 文字列以外の値は対象外
+                self._pos = idx + 1
+                continue
+            self._pos = pos + 1
+            return True
+
+    def _read_value(self) -> str:
+        out = []
+        buf = self._buffer
+        pos = self._pos
+        while pos < len(buf):
+            ch = buf[pos]
+            if ch == '"':
+                self._state = "done"
+                pos += 1
+                break
+            if ch != "\\":
+                out.append(ch)
+                pos += 1
+                continue
+            if pos + 1 >= len(buf):
+                break
+            esc = buf[pos + 1]
+            if esc != "u":
+                out.append(self._ESCAPES.get(esc, esc))
+                pos += 2
+                continue
+            if pos + 6 > len(buf):
+                break
+            code = int(buf[pos + 2:pos + 6], 16)
+            if 0xD800 <= code < 0xDC00:
+                # サロゲートペアは後半の \uXXXX が揃ってから復元する
+                if pos + 12 > len(buf):
+                    break
+                low = int(buf[pos + 8:pos + 12], 16)
+                out.append(chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)))
+                pos += 12
+            else:
+                out.append(chr(code))
+                pos += 6
+        self._pos = pos
+        return "".join(out)
+
+    def feed(self, chunk: str) -> str:
+        self.raw += chunk
+        if self._state == "done":
+            return ""
+        self._buffer += chunk
+        if self._state == "key":
+            if not self._find_value_start():
+                return ""
+            self._state = "value"
+        delta = self._read_value()
+        self.value += delta
+        return delta
+
+# ----------------------------------------------------
+# 新規追加: 最初の質問を生成する関数
+# ----------------------------------------------------
+def _build_initial_question_messages(company_info: str) -> List[Dict[str, str]]:
+    """最初の質問生成用のメッセージを組み立てる"""
     system_prompt = (
         "あなたは経験豊富な面接官です。以下の企業情報を考慮し、面接の導入として適切な、最初の一問だけを生成してください。\n"
         "応答は質問文のみとし、他の挨拶や説明は含めないでください。\n"
@@ -31,39 +625,53 @@ def generate_initial_question(company_info: str) -> str:
     
     user_prompt = f"面接設定情報:\n{company_info}\n\nこの情報に基づいた面接の導入となる質問を生成してください。"
 
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+def generate_initial_question(company_info: str) -> str:
+    """
+    企業情報に基づいて、面接開始時の最初の質問を生成します。
+    必ずJSON形式で返す: {"question": "生成された質問"}
+    """
     try:
-        response = client.chat.completions.create(
-            model=DEPLOYMENT_NAME,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.7,
+        return _chat_completion(
+            _build_initial_question_messages(company_info),
             max_tokens=200,
-            response_format={"type": "json_object"}
+            json_mode=True,
+            timeout=LLM_TIMEOUTS["initial"],
+            call="initial",
+            cacheable=True,
         )
         
-        content = response.choices[0].message.content.strip()
-        return content
-        
     except Exception as e:
         # エラー発生時はエラーフラグ付きのJSONを返す
         return json.dumps({"question": f"AI質問生成エラー: {e}", "is_error": True}, ensure_ascii=False)
 
 
+async def generate_initial_question_async(company_info: str, timeout: Optional[float] = None) -> str:
+    """generate_initial_question の非同期版（イベントループをブロックしない）"""
+    try:
+        return await _chat_completion_async(
+            _build_initial_question_messages(company_info),
+            max_tokens=200,
+            json_mode=True,
+            timeout=timeout or LLM_TIMEOUTS["initial"],
+            call="initial",
+            cacheable=True,
+        )
+
+    except Exception as e:
+        return json.dumps({"question": f"AI質問生成エラー: {e}", "is_error": True}, ensure_ascii=False)
+
+
 # ----------------------------------------------------
 # 修正: スキルシート情報を活用した質問生成
 # ----------------------------------------------------
-def generate_followup(user_answer: str, current_question: str, company_info: str) -> str:
-    """
-    企業情報、スキルシート情報、会話の流れを考慮し、深掘りする質問を1つだけ生成。
-    必ずJSON形式で返す: {"question": "生成された質問"}
-    
-    Args:
-        user_answer: ユーザーの回答
-        current_question: 前回の質問
-        company_info: 企業情報とスキルシート情報を結合したテキスト
-    """
+def _build_followup_messages(user_answer: str, current_question: str, company_info: str) -> List[Dict[str, str]]:
+    """深掘り質問生成用のメッセージを組み立てる"""
     system_prompt = (
         "あなたは経験豊富な面接官です。以下の情報を活用して、候補者に深掘りする質問を1つだけ生成してください。\n\n"
         "【活用する情報】\n"
@@ -83,37 +691,128 @@ def generate_followup(user_answer: str, current_question: str, company_info: str
     )
     
     # 企業情報にスキルシート情報が含まれている
-    user_prompt = (
-        f"面接設定情報・スキルシート情報:\n{company_info}\n\n"
+    # プロバイダ側のプロンプトキャッシュは先頭が一致する部分にしか効かないため、
+    # 面接中は変わらない企業情報・スキルシート情報を先に置き、毎ターン変わる質問と回答は最後のメッセージに分ける
+    context_prompt = f"面接設定情報・スキルシート情報:\n{company_info}"
+    turn_prompt = (
         f"前回の質問: {current_question}\n"
         f"面接者の回答: {user_answer}\n\n"
         "この一連の流れとスキルシート情報を受けて、次に何を聞きますか？"
     )
 
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": context_prompt},
+        {"role": "user", "content": turn_prompt}
+    ]
+
+
+def generate_followup(user_answer: str, current_question: str, company_info: str) -> str:
+    """
+    企業情報、スキルシート情報、会話の流れを考慮し、深掘りする質問を1つだけ生成。
+    必ずJSON形式で返す: {"question": "生成された質問"}
+    
+    Args:
+        user_answer: ユーザーの回答
+        current_question: 前回の質問
+        company_info: 企業情報とスキルシート情報を結合したテキスト
+    """
     try:
-        response = client.chat.completions.create(
-            model=DEPLOYMENT_NAME,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.7,
+        return _chat_completion(
+            _build_followup_messages(user_answer, current_question, company_info),
             max_tokens=200,
-            response_format={"type": "json_object"}
+            json_mode=True,
+            timeout=LLM_TIMEOUTS["followup"],
+            call="followup",
+            cacheable=True,
         )
         
-        content = response.choices[0].message.content.strip()
-        return content
-        
     except Exception as e:
         return json.dumps({"question": f"AI質問生成エラー: {e}", "is_error": True}, ensure_ascii=False)
 
+
+async def generate_followup_async(user_answer: str, current_question: str, company_info: str,
+                                  timeout: Optional[float] = None) -> str:
+    """
+    generate_followup の非同期版（イベントループをブロックしない）。
+    LLM_HEDGE_ENABLED=true の場合、応答がこれまでの p95 を超えたら同じ呼び出しをもう1つ送る。
+    """
+    messages = _build_followup_messages(user_answer, current_question, company_info)
+    try:
+        return await run_hedged(
+            lambda: _chat_completion_async(
+                messages,
+                max_tokens=200,
+                json_mode=True,
+                timeout=timeout or LLM_TIMEOUTS["followup"],
+                call="followup",
+                cacheable=True,
+            ),
+            hedge_delay(llm_latency["followup"]),
+        )
+
+    except CircuitOpenError as e:
+        return json.dumps({"question": f"AI質問生成エラー: {e}", "is_error": True, "circuit_open": True},
+                          ensure_ascii=False)
+    except Exception as e:
+        return json.dumps({"question": f"AI質問生成エラー: {e}", "is_error": True}, ensure_ascii=False)
+
+
+async def stream_followup_async(user_answer: str, current_question: str, company_info: str,
+                                timeout: Optional[float] = None) -> AsyncIterator[str]:
+    """
+    generate_followup のストリーミング版。
+    JSONモードの出力から "question" フィールドの値だけを、生成され次第少しずつ返す。
+    """
+    extractor = JSONFieldStreamExtractor("question")
+    async for token in _chat_completion_stream_async(
+        _build_followup_messages(user_answer, current_question, company_info),
+        max_tokens=200,
+        json_mode=True,
+        timeout=timeout or LLM_TIMEOUTS["followup"],
+        call="followup",
+        cacheable=True,
+    ):
+        delta = extractor.feed(token)
+        if delta:
+            yield delta
+
+    if not extractor.value:
+        # フィールドを逐次抽出できなかった場合は、全体をJSONとして解釈して返す
+        question = json.loads(extractor.raw).get("question", "")
+        if question:
+            yield question
+
+
+async def open_followup_stream(user_answer: str, current_question: str, company_info: str,
+                               timeout: Optional[float] = None) -> tuple:
+    """
+    stream_followup_async を始め、最初の差分が届くまで待つ。
+    LLM_HEDGE_ENABLED=true の場合、最初のチャンクがこれまでの p95 までに届かなければ同じ呼び出しをもう1つ送り、
+    先に最初の差分を返した方を使う（使わなかった方は閉じる）。
+
+    Returns:
+        (最初の差分（質問が空の場合は None）, 残りの差分を返す非同期ジェネレーター)
+        途中で読むのをやめる場合（クライアントの切断など）は、呼び出し元が aclose() で閉じること
+        （閉じるまでデプロイメントの処理中の件数が減らない）
+    """
+    async def first_delta() -> tuple:
+        deltas = stream_followup_async(user_answer, current_question, company_info, timeout=timeout)
+        try:
+            return await deltas.__anext__(), deltas
+        except StopAsyncIteration:
+            return None, deltas
+
+    async def close(result: tuple) -> None:
+        await result[1].aclose()
+
+    return await run_hedged(first_delta, hedge_delay(llm_latency["followup_stream"]), discard=close)
+
 # ----------------------------------------------------
 # 修正なし: review_answer (引数やロジックの変更なし)
 # ----------------------------------------------------
-def review_answer(rules: str, answer: str) -> str:
-    """面談の注意事項を基に回答を添削する"""
-    
+def _build_review_messages(rules: str, answer: str) -> List[Dict[str, str]]:
+    """回答添削用のメッセージを組み立てる"""
     prompt = f"""
     以下の面談の注意事項を参考に、面接者の回答がルールに違反していないかチェックしてください。
     特に、ルールに違反している場合は、その点を指摘し、修正案を簡潔に提示してください。
@@ -129,33 +828,60 @@ def review_answer(rules: str, answer: str) -> str:
     添削結果:
     """
     
-    response = client.chat.completions.create(
-        model=DEPLOYMENT_NAME,
-        messages=[
-            {"role": "system", "content": "あなたはプロの面接官であり、面談の指導者です。面接者の回答を冷静かつ客観的に添削してください。"},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0.7,
-        max_tokens=250
-    )
+    return [
+        {"role": "system", "content": "あなたはプロの面接官であり、面談の指導者です。面接者の回答を冷静かつ客観的に添削してください。"},
+        {"role": "user", "content": prompt}
+    ]
+
 
-    return response.choices[0].message.content.strip()
+def review_answer(rules: str, answer: str) -> str:
+    """面談の注意事項を基に回答を添削する"""
+    return _chat_completion(_build_review_messages(rules, answer), max_tokens=250, timeout=LLM_TIMEOUTS["review"],
+                            call="review")
+
+
+async def review_answer_async(rules: str, answer: str, timeout: Optional[float] = None) -> str:
+    """review_answer の非同期版"""
+    return await _chat_completion_async(
+        _build_review_messages(rules, answer),
+        max_tokens=250,
+        timeout=timeout or LLM_TIMEOUTS["review"],
+        call="review",
+    )
 
 # ----------------------------------------------------
 # 修正なし: summarize_and_review_conversation
 # ----------------------------------------------------
-def summarize_and_review_conversation(conversation_history: List[Dict[str, str]]) -> str:
-    """
-    全体の会話履歴を基に、要約と総合的なレビューを生成する
-    """
-    # 会話履歴を整形
+def _format_conversation(conversation_history: List[Dict[str, str]]) -> str:
+    """会話履歴をプロンプト用のテキストに整形する"""
     formatted_history = []
     for item in conversation_history:
         # itemは通常、{"type": "question" or "answer", "text": "..."} の形式を想定
         speaker = "面接官 (質問)" if item.get('type') == 'question' else "あなた (回答)"
         formatted_history.append(f"{speaker}: {item.get('text', '')}")
-    
-    full_conversation = "\n".join(formatted_history)
+    return "\n".join(formatted_history)
+
+
+def _format_review_conversation(conversation_history: List[Dict[str, str]],
+                                rolling_summary: Optional[str] = None) -> str:
+    """レビュー対象の会話（要約がある場合は要約と直近の会話）をテキストにする"""
+    full_conversation = _format_conversation(conversation_history)
+    if rolling_summary:
+        full_conversation = (
+            f"（ここまでの会話の要約）\n{rolling_summary}\n\n"
+            f"（直近の会話）\n{full_conversation}"
+        )
+    return full_conversation
+
+
+def _build_full_review_messages(conversation_history: List[Dict[str, str]],
+                                rolling_summary: Optional[str] = None) -> List[Dict[str, str]]:
+    """
+    総合レビュー用のメッセージを組み立てる。
+    rolling_summary を指定した場合、conversation_history はその要約より後の会話だけでよい。
+    """
+    # 会話履歴を整形
+    full_conversation = _format_review_conversation(conversation_history, rolling_summary)
 
     prompt = f"""
     あなたはプロの面接コンサルタントです。
@@ -174,14 +900,170 @@ def summarize_and_review_conversation(conversation_history: List[Dict[str, str]]
     総合レビュー:
     """
 
-    response = client.chat.completions.create(
-        model=DEPLOYMENT_NAME,
-        messages=[
-            {"role": "system", "content": "あなたはプロの面接官であり、面接者の能力を客観的に評価する役割を担っています。"},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0.7,
-        max_tokens=500
+    return [
+        {"role": "system", "content": "あなたはプロの面接官であり、面接者の能力を客観的に評価する役割を担っています。"},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def summarize_and_review_conversation(conversation_history: List[Dict[str, str]],
+                                      rolling_summary: Optional[str] = None) -> str:
+    """
+    全体の会話履歴を基に、要約と総合的なレビューを生成する
+    """
+    return _chat_completion(
+        _build_full_review_messages(conversation_history, rolling_summary),
+        max_tokens=500,
+        timeout=LLM_TIMEOUTS["summary"],
+        call="full_review",
     )
-    
-    return response.choices[0].message.content.strip()
+
+
+async def summarize_and_review_conversation_async(conversation_history: List[Dict[str, str]],
+                                                  timeout: Optional[float] = None,
+                                                  rolling_summary: Optional[str] = None,
+                                                  call: str = "full_review") -> str:
+    """summarize_and_review_conversation の非同期版（call はバッチジョブの場合に "batch_review" を指定する）"""
+    return await _chat_completion_async(
+        _build_full_review_messages(conversation_history, rolling_summary),
+        max_tokens=500,
+        timeout=timeout or LLM_TIMEOUTS["summary"],
+        call=call,
+    )
+
+
+async def stream_full_review_async(conversation_history: List[Dict[str, str]],
+                                   timeout: Optional[float] = None,
+                                   rolling_summary: Optional[str] = None) -> AsyncIterator[str]:
+    """summarize_and_review_conversation のストリーミング版（生成されたトークンを順に返す）"""
+    async for token in _chat_completion_stream_async(
+        _build_full_review_messages(conversation_history, rolling_summary),
+        max_tokens=500,
+        timeout=timeout or LLM_TIMEOUTS["summary"],
+        call="full_review",
+    ):
+        yield token
+
+
+# ----------------------------------------------------
+# 項目ごとの総合レビュー（項目ごとに別の呼び出しにして並行に生成する）
+# ----------------------------------------------------
+# (項目ID, 見出し) の一覧。_build_full_review_messages の項目と同じ
+FULL_REVIEW_CRITERIA = [
+    ("flow", "会話の全体的な流れと構成の評価"),
+    ("logic", "回答の論理性、説得力、一貫性"),
+    ("improvements", "改善すべき具体的な点"),
+]
+
+
+def _build_criterion_review_messages(conversation_history: List[Dict[str, str]], title: str,
+                                     rolling_summary: Optional[str] = None) -> List[Dict[str, str]]:
+    """1項目分の総合レビュー用のメッセージを組み立てる"""
+    full_conversation = _format_review_conversation(conversation_history, rolling_summary)
+
+    prompt = f"""
+    あなたはプロの面接コンサルタントです。
+    以下に示された面接での全会話履歴を読み、
+    「{title}」の観点に絞ってレビューしてください（他の観点には触れないこと）。
+    見出しは付けず、本文のみを出力してください。
+
+    レビューは簡潔に、かつ具体的なフィードバックを含めてください。
+    ---
+    会話履歴:
+    {full_conversation}
+    ---
+    {title}:
+    """
+
+    return [
+        {"role": "system", "content": "あなたはプロの面接官であり、面接者の能力を客観的に評価する役割を担っています。"},
+        {"role": "user", "content": prompt}
+    ]
+
+
+async def review_conversation_criterion_async(conversation_history: List[Dict[str, str]], title: str,
+                                              timeout: Optional[float] = None,
+                                              rolling_summary: Optional[str] = None,
+                                              call: str = "criterion_review") -> str:
+    """会話履歴を1つの観点でレビューする（総合レビューを項目ごとに並行生成するときに使う）"""
+    return await _chat_completion_async(
+        _build_criterion_review_messages(conversation_history, title, rolling_summary),
+        max_tokens=200,
+        timeout=timeout or LLM_TIMEOUTS["summary"],
+        call=call,
+    )
+
+
+# ----------------------------------------------------
+# 面接中に更新する会話の要約（総合レビューの入力を一定の長さに保つ）
+# ----------------------------------------------------
+# 要約の長さの目安（文字数）
+ROLLING_SUMMARY_MAX_CHARS = int(os.getenv("ROLLING_SUMMARY_MAX_CHARS", "800"))
+
+
+def _build_rolling_summary_messages(previous_summary: str,
+                                    new_turns: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """会話の要約を更新するためのメッセージを組み立てる"""
+    prompt = (
+        "以下は面接のこれまでの要約と、その後に続く会話です。\n"
+        "両方を統合して、面接全体の要約を更新してください。\n"
+        "総合レビュー（会話の流れと構成、回答の論理性・説得力・一貫性、改善点）の材料になるよう、"
+        "質問の流れ、回答で述べられた具体的な経験・スキル・数値、回答の矛盾や曖昧な点を残してください。\n"
+        f"要約は箇条書きで、{ROLLING_SUMMARY_MAX_CHARS}文字以内にしてください。\n\n"
+        f"これまでの要約:\n{previous_summary or '（なし）'}\n\n"
+        f"続きの会話:\n{_format_conversation(new_turns)}"
+    )
+    return [
+        {"role": "system", "content": "あなたは面接の記録係です。会話の内容を正確かつ簡潔に要約してください。"},
+        {"role": "user", "content": prompt}
+    ]
+
+
+async def update_rolling_summary_async(previous_summary: str, new_turns: List[Dict[str, str]],
+                                       timeout: Optional[float] = None) -> str:
+    """これまでの要約に新しい会話を取り込んだ要約を返す"""
+    return await _chat_completion_async(
+        _build_rolling_summary_messages(previous_summary, new_turns),
+        max_tokens=600,
+        timeout=timeout or LLM_TIMEOUTS["summary"],
+        call="rolling_summary",
+    )
+
+
+# ----------------------------------------------------
+# スキルシートから事前に作る深掘り質問の候補（面接中の待ち時間を減らす）
+# ----------------------------------------------------
+def _build_question_candidates_messages(source_text: str, count: int) -> List[Dict[str, str]]:
+    """スキルシートの一部（1つのプロジェクト、または経験技術のまとめ）から質問の候補を作るためのメッセージを組み立てる"""
+    system_prompt = (
+        "あなたは経験豊富な面接官です。候補者のスキルシートの一部を読み、面接で使う深掘り質問を作成してください。\n\n"
+        "【質問作成のポイント】\n"
+        "- スキルシートに記載されている具体的な経験やスキルに言及する\n"
+        "- プロジェクトの詳細や役割、作業工程での具体的な取り組みや課題解決の経験を聞く\n"
+        "- 1つの質問で聞くことは1つにする\n\n"
+        "出力は必ず以下のJSON形式にしてください。余計な説明文は出力しないこと。\n"
+        "{\n"
+        "  \"questions\": [\"質問1\", \"質問2\"]\n"
+        "}"
+    )
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": f"スキルシート（抜粋）:\n{source_text}\n\n深掘り質問を{count}個作成してください。"},
+    ]
+
+
+async def generate_question_candidates_async(source_text: str, count: int,
+                                             timeout: Optional[float] = None) -> List[str]:
+    """
+    スキルシートの一部から深掘り質問の候補を最大 count 個作る。
+    失敗した場合や応答が不正なJSONの場合は例外を送出する。
+    """
+    content = await _chat_completion_async(
+        _build_question_candidates_messages(source_text, count),
+        max_tokens=80 * count,
+        json_mode=True,
+        timeout=timeout or LLM_TIMEOUTS["summary"],
+        call="question_pool",
+    )
+    questions = json.loads(content).get("questions") or []
+    return [q.strip() for q in questions if isinstance(q, str) and q.strip()][:count]
@@ -1,18 +1,117 @@
-import uvicorn
-from fastapi import FastAPI, HTTPException, UploadFile, File
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Query, Request, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel, ValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Dict, Optional
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from typing import Callable, List, Dict, Optional
+from contextlib import aclosing, asynccontextmanager
+import asyncio
+import hashlib
+import io
 import random
 import os
+import string
 import json
+import time
+import logging
+import zipfile
+import zlib
+import functools
+
+from ai_question import (
+    generate_followup_async,
+    review_answer_async,
+    summarize_and_review_conversation_async,
+    open_followup_stream,
+    stream_full_review_async,
+    review_conversation_criterion_async,
+    update_rolling_summary_async,
+    FULL_REVIEW_CRITERIA,
+    close_async_client,
+    get_llm_pool,
+    llm_latency,
+    get_llm_cache,
+    llm_cache_bypass,
+    llm_usage,
+    warm_up_llm_clients,
+    is_transient_llm_error,
+)
+from manual_questions import questions_by_stage, INITIAL_QUESTION, FALLBACK_QUESTION_TEMPLATES
+from session_store import create_session_store_from_env
+from skillsheet_cache import create_skillsheet_cache_from_env
+from skillsheet_repository import CERTIFICATION_FIELD, create_skillsheet_repository_from_env
+from upload_spool import InvalidUploadError, UploadTooLargeError, receive_upload
+from batch_review import JOB_RUNNING, BatchReviewRunner, create_batch_job_store_from_env
+from rule_engine import RuleFileLoader
+from skillsheet_index import build_skillsheet_context
+from question_pool import QUESTION_POOL_MIN_SCORE, generate_question_pool, rank_pooled_questions
+from llm_resilience import CircuitOpenError, LLM_HEDGE_ENABLED, LLM_HEDGE_PERCENTILE
+from skillsheet_parser import (
+    shutdown_parse_executor,
+    parse_skillsheet_job_async,
+    warm_up_parser,
+    SKILLSHEET_PARSE_WORKERS,
+)
+from observability import (
+    ERRORS,
+    FALLBACK_QUESTIONS,
+    INTERVIEW_WS_CONNECTIONS,
+    INTERVIEW_WS_TURN_LATENCY,
+    JSON_DECODE_LATENCY,
+    QUESTION_POOL_EVENTS,
+    REQUEST_LATENCY,
+    STAGE_TRANSITIONS,
+    log_event,
+    observe_latency,
+    render_metrics,
+    setup_logging,
+    stop_logging,
+)
+
+async def warm_up() -> None:
+    """
+    重いライブラリの読み込みと LLM への接続を済ませ、ワーカーを準備完了にする（/readyz が 200 を返すようになる）。
+    失敗した準備があっても準備完了にする（その処理は最初のリクエストで改めて行う）
+    """
+    start = time.perf_counter()
+    result: Dict = {}
+    if WARMUP_ENABLED:
+        try:
+            await asyncio.to_thread(warm_up_parser)
+            result["parser"] = "ok"
+        except Exception as e:
+            result["parser"] = type(e).__name__
+        result["llm"] = await warm_up_llm_clients(WARMUP_TIMEOUT)
+    result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    worker_state.update(status="ready", warmup=result)
+    log_event("worker_ready", **result)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    起動時に準備（warm_up）を始め、中断されていた一括総合レビューのジョブを再開する。
+    終了時に共有のLLMクライアント（接続プール）と解析用プールを閉じる
+    """
+    background_tasks = [asyncio.create_task(warm_up()), asyncio.create_task(batch_runner.run_forever())]
+    if skillsheet_repository is not None:
+        background_tasks.append(asyncio.create_task(purge_skillsheet_repository()))
+    yield
+    worker_state["status"] = "stopping"
+    for task in background_tasks:
+        task.cancel()
+    batch_runner.shutdown()
+    for task in list(rolling_summary_tasks.values()) + list(question_pool_tasks.values()):
+        task.cancel()
+    await close_async_client()
+    shutdown_parse_executor()
+    stop_logging()
 
-from ai_question import generate_followup, review_answer, summarize_and_review_conversation
-from manual_questions import questions_by_stage, INITIAL_QUESTION
-from skillsheet_parser import parse_skillsheet
 
 # FastAPIのインスタンスを作成
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+
+# ログは1行1JSONで、別スレッドから書き出す（リクエスト処理をログ出力で待たせない）
+setup_logging()
 
 # CORS設定
 origins = [
@@ -28,6 +127,59 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# LLM応答キャッシュを使わないリクエストに付けるヘッダー（本番トラフィック用）
+LLM_CACHE_BYPASS_HEADER = "X-LLM-Cache-Bypass"
+
+
+@app.middleware("http")
+async def llm_cache_bypass_middleware(request: Request, call_next):
+    """バイパス用ヘッダーが付いたリクエストでは、LLM応答キャッシュを使わない"""
+    bypass = request.headers.get(LLM_CACHE_BYPASS_HEADER, "").lower() in ("1", "true", "yes")
+    token = llm_cache_bypass.set(bypass)
+    try:
+        return await call_next(request)
+    finally:
+        llm_cache_bypass.reset(token)
+
+# multipart の区切りやフォームの他の項目の分として、Content-Length の判定で上限に加える大きさ
+UPLOAD_FORM_OVERHEAD_BYTES = 64 * 1024
+
+@app.middleware("http")
+async def upload_size_limit_middleware(request: Request, call_next):
+    """
+    スキルシートと一括総合レビューのアップロードは、本文を受け取る前に Content-Length で大きさを確かめ、
+    上限を超えるものは断る（Content-Length が無い場合は、受信しながら receive_upload で判定する）
+    """
+    max_bytes = UPLOAD_MAX_BYTES_BY_PATH.get(request.url.path) if request.method == "POST" else None
+    if max_bytes is not None:
+        content_length = request.headers.get("content-length", "")
+        if content_length.isdigit() and int(content_length) > max_bytes + UPLOAD_FORM_OVERHEAD_BYTES:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"ファイルサイズが上限（{max_bytes} バイト）を超えています。"},
+            )
+    return await call_next(request)
+
+@app.middleware("http")
+async def request_metrics_middleware(request: Request, call_next):
+    """
+    エンドポイントごとのレスポンス時間を記録する。
+    ストリーミングのレスポンスは、ヘッダーを返すまでの時間になる。
+    """
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # ラベルの種類が増えすぎないよう、URLではなくルートのパスを使う
+        route = request.scope.get("route")
+        endpoint = getattr(route, "path", "unmatched")
+        REQUEST_LATENCY.labels(method=request.method, endpoint=endpoint, status=str(status)).observe(
+            time.perf_counter() - start
+        )
+
 # --- Pydantic モデル定義 ---
 
 class CompanyInfoRequest(BaseModel):
@@ -38,8 +190,34 @@ class AnswerRequest(BaseModel):
     """次の質問生成リクエスト"""
     user_answer: str
     current_question: str
-    company_info: str
+    company_info: str = ""
     skillsheet_info: Optional[str] = None  # 新規追加
+    session_id: Optional[str] = None  # "/" で発行されたセッションID
+    company_profile_id: Optional[str] = None  # /company_profiles で登録した企業情報のID（company_info の代わり）
+    skillsheet_id: Optional[str] = None  # /skillsheets で登録したスキルシートのID（skillsheet_info の代わり）
+
+class InterviewStartMessage(BaseModel):
+    """WebSocket の面接で、接続後に1度だけ送る面接の情報"""
+    company_info: str = ""
+    company_profile_id: Optional[str] = None  # /company_profiles で登録した企業情報のID（company_info の代わり）
+    skillsheet_info: Optional[str] = None  # 省略するとセッションのスキルシートから毎ターン関連部分を選ぶ
+    skillsheet_id: Optional[str] = None  # /skillsheets で登録したスキルシートのID（skillsheet_info の代わり）
+    session_id: Optional[str] = None  # 省略すると新しいセッションで面接を始める
+    current_question: Optional[str] = None  # 既存のセッションで続きから始める場合の、回答待ちの質問
+    stream: bool = False  # 次の質問を生成しながら "delta" で少しずつ送るかどうか
+
+class InterviewAnswerMessage(BaseModel):
+    """WebSocket の面接で、ターンごとに送る回答"""
+    answer: str
+    stream: Optional[bool] = None  # このターンだけストリーミングの有無を変える場合に指定
+
+class CompanyProfileRequest(BaseModel):
+    """企業情報の登録リクエスト"""
+    company_info: str
+
+class SkillsheetRegisterRequest(BaseModel):
+    """スキルシート情報（テキスト）の登録リクエスト"""
+    skillsheet_info: str
 
 class ConversationItem(BaseModel):
     """会話履歴の単一要素"""
@@ -49,53 +227,867 @@ class ConversationItem(BaseModel):
 class ConversationHistoryRequest(BaseModel):
     """全体レビューリクエスト"""
     conversation_history: List[ConversationItem]
+    session_id: Optional[str] = None  # 指定すると面接中に更新した要約を使い、直近の会話だけを送る
+    mode: Optional[str] = None  # "single"（1回の呼び出し）または "parallel"（項目ごとに並行）。省略時は FULL_REVIEW_MODE
+
+# セッションストア（面接ごとのステージとスキルシート情報を保持）
+session_store = create_session_store_from_env()
+
+# スキルシート解析結果のキャッシュ（ファイル内容のハッシュがキー）
+skillsheet_cache = create_skillsheet_cache_from_env()
+# 解析済みのスキルシートを構造化データのまま保存し、スキルで検索できるようにする（無効の場合は None）
+skillsheet_repository = create_skillsheet_repository_from_env()
+# 保存期間を過ぎたスキルシートを削除する間隔（秒）
+SKILLSHEET_REPOSITORY_PURGE_INTERVAL = float(os.getenv("SKILLSHEET_REPOSITORY_PURGE_INTERVAL", "3600"))
+
+# 登録済みの企業情報・スキルシート（IDで参照する。セッションと同じバックエンドに別テーブルで保存）
+PROFILE_TTL_SECONDS = float(os.getenv("PROFILE_TTL_SECONDS", str(30 * 24 * 3600)))
+profile_store = create_session_store_from_env(table="profiles", ttl_seconds=PROFILE_TTL_SECONDS)
+
+# 一括アップロードの上限（展開後のファイル数、ZIP内の1ファイルあたりの展開後サイズ、
+# アップロードの合計サイズと展開後の合計サイズ）
+BULK_MAX_FILES = int(os.getenv("BULK_MAX_FILES", "1000"))
+BULK_MAX_FILE_BYTES = int(os.getenv("BULK_MAX_FILE_BYTES", str(50 * 1024 * 1024)))
+BULK_MAX_TOTAL_BYTES = int(os.getenv("BULK_MAX_TOTAL_BYTES", str(1024 * 1024 * 1024)))
+# /upload_skillsheet で受け付けるファイルサイズの上限（バイト）
+SKILLSHEET_UPLOAD_MAX_BYTES = int(os.getenv("SKILLSHEET_UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+
+# 一括総合レビュー（バッチジョブ）に登録できる JSONL の大きさの上限（バイト）と、SSE で結果を確認する間隔（秒）
+BATCH_REVIEW_MAX_BYTES = int(os.getenv("BATCH_REVIEW_MAX_BYTES", str(100 * 1024 * 1024)))
+BATCH_REVIEW_POLL_SECONDS = float(os.getenv("BATCH_REVIEW_POLL_SECONDS", "1.0"))
+# アップロードを受け付けるパスごとの上限（バイト）
+UPLOAD_MAX_BYTES_BY_PATH = {
+    "/upload_skillsheet": SKILLSHEET_UPLOAD_MAX_BYTES,
+    "/batch_reviews": BATCH_REVIEW_MAX_BYTES,
+    "/upload_skillsheets_bulk": BULK_MAX_TOTAL_BYTES,
+}
+batch_job_store = create_batch_job_store_from_env()
+
+# 1ターンあたりのレイテンシ予算（秒）。質問生成と回答添削はこの時間内で並行して行う
+TURN_LATENCY_BUDGET = float(os.getenv("TURN_LATENCY_BUDGET", "15"))
+# 回答添削（review_answer）を行うかどうか
+ANSWER_REVIEW_ENABLED = os.getenv("ANSWER_REVIEW_ENABLED", "true").lower() == "true"
+RULES_FILE_PATH = os.getenv(
+    "REVIEW_RULES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "review_rules.txt")
+)
+# 面談ルール（ファイルが更新されたときだけ読み込み直す）
+review_rules = RuleFileLoader(RULES_FILE_PATH)
+
+# 起動時の準備（解析用のライブラリの読み込み・LLMへの接続）を行うかどうかと、LLMへの接続を待つ時間（秒）
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "10"))
+# ワーカーの状態（/readyz で返す）。起動時の準備が終わると ready になり、終了処理が始まると stopping になる
+worker_state: Dict = {"status": "starting", "warmup": None}
+
+# WebSocket の面接で、接続してから面接の情報（最初のメッセージ）を受け取るまで待つ時間（秒）
+INTERVIEW_WS_START_TIMEOUT = float(os.getenv("INTERVIEW_WS_START_TIMEOUT", "30"))
+
+# 深掘り質問のプロンプトに、スキルシートのうち回答に関連するプロジェクトだけを含めるかどうか
+SKILLSHEET_CONTEXT_SELECTION = os.getenv("SKILLSHEET_CONTEXT_SELECTION", "true").lower() == "true"
+
+# session_id を送らない旧クライアント用のセッションID
+DEFAULT_SESSION_ID = "default"
+
+# 面接中に会話の要約を更新し、総合レビューでは要約と直近の会話だけを使うかどうか
+ROLLING_SUMMARY_ENABLED = os.getenv("ROLLING_SUMMARY_ENABLED", "true").lower() == "true"
+# 総合レビューでそのまま使う直近のターン数（これより古いターンは、この数ずつまとめて要約に取り込む）
+ROLLING_SUMMARY_KEEP_TURNS = int(os.getenv("ROLLING_SUMMARY_KEEP_TURNS", "4"))
+# セッションごとの要約更新タスク（同じセッションで同時に1つだけ実行する）
+rolling_summary_tasks: Dict[str, asyncio.Task] = {}
+
+# 総合レビューの生成方法の既定値（"single" または "parallel"）
+FULL_REVIEW_MODE = os.getenv("FULL_REVIEW_MODE", "single").lower()
+# "parallel" のときの1項目あたりのタイムアウト（秒）。時間内に終わらなかった項目だけを欠落として返す
+FULL_REVIEW_SECTION_TIMEOUT = float(os.getenv("FULL_REVIEW_SECTION_TIMEOUT", "20"))
+
+# AIによる質問生成が失敗・期限切れ・停止中（サーキットブレーカーが開いている）の場合に、
+# エラーの代わりに質問バンクの深掘り質問を返すかどうか
+LLM_FALLBACK_ENABLED = os.getenv("LLM_FALLBACK_ENABLED", "true").lower() == "true"
+
+# スキルシートのアップロード後に深掘り質問の候補をバックグラウンドで作り、最初の数ターンは候補から返すかどうか
+QUESTION_POOL_ENABLED = os.getenv("QUESTION_POOL_ENABLED", "true").lower() == "true"
+# 候補から返すターン数の上限（以降は毎回AIで生成し、会話の流れに沿った質問にする）
+QUESTION_POOL_MAX_TURNS = int(os.getenv("QUESTION_POOL_MAX_TURNS", "3"))
+# セッションごとの候補作成タスク（同じセッションで同時に1つだけ実行する）
+question_pool_tasks: Dict[str, asyncio.Task] = {}
+
+
+def new_session_state() -> Dict:
+    """新しい面接セッションの初期状態"""
+    return {
+        "stage": 1,
+        "skillsheet": "",  # スキルシート情報を保持
+        "skillsheet_data": None,  # テキスト整形前の構造化データ
+        "skillsheet_hash": None,  # アップロードされたファイルの SHA-256
+        "summary": "",  # 面接中に更新する会話の要約
+        "summary_item_count": 0,  # 要約に取り込み済みの会話履歴の件数（質問と回答を1件ずつ数える）
+        "pending_turns": [],  # まだ要約に取り込んでいない会話履歴
+        "question_pool": [],  # スキルシートから事前に作った深掘り質問の候補
+        "question_pool_hash": None,  # 候補を作ったスキルシートの SHA-256
+        "question_pool_served": 0,  # 候補から返した質問の数
+    }
+
+
+def interview_progress_reset() -> Dict:
+    """面接をやり直すときに初期状態に戻すフィールド（スキルシートに関するフィールドは含めない）"""
+    initial = new_session_state()
+    return {key: initial[key] for key in ("stage", "summary", "summary_item_count", "pending_turns",
+                                          "question_pool_served")}
+
+
+def load_session(session_id: Optional[str]) -> tuple:
+    """
+    セッションIDに対応する状態を取得する。
+    session_id が無い場合は旧クライアント用の共有セッションを使う。
+    """
+    if not session_id:
+        state = session_store.get(DEFAULT_SESSION_ID)
+        if state is None:
+            state = new_session_state()
+            session_store.set(DEFAULT_SESSION_ID, state)
+        return DEFAULT_SESSION_ID, state
+
+    state = session_store.get(session_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="セッションが見つかりません。面接を最初からやり直してください。")
+    return session_id, state
+
+
+def stage_question(current_stage: int) -> Optional[str]:
+    """固定の質問を使うステージではその質問を、AIで質問を生成するステージでは None を返す"""
+    if current_stage == 1:
+        # ステージ1: 自己紹介の次の質問
+        return random.choice(questions_by_stage["stage_2_experience"])
+    return None
+
+
+def advance_stage(session_id: str, current_stage: int) -> None:
+    """面接のステージを1つ進める（ステージ1→2、2→3。ステージ3以降はそのまま）"""
+    if current_stage == 1:
+        # ステージ1: 自己紹介の次の質問（ステージ2へ移行）
+        session_store.update(session_id, stage=2)
+        STAGE_TRANSITIONS.labels(from_stage="1", to_stage="2").inc()
+    elif current_stage == 2:
+        # ステージ2: 職務経歴の次の質問（ステージ3へ移行）
+        session_store.update(session_id, stage=3)
+        STAGE_TRANSITIONS.labels(from_stage="2", to_stage="3").inc()
+
+
+def describe_validation_error(error: ValidationError) -> str:
+    """リクエストの形式の誤りを、最初の項目の場所とメッセージの1行にまとめる"""
+    first = error.errors()[0]
+    location = ".".join(str(part) for part in first["loc"])
+    return f"{location + ': ' if location else ''}{first['msg']}"
+
+
+def decode_llm_json(text: str) -> Dict:
+    """LLMの応答をJSONとしてデコードする（所要時間と失敗を記録する）"""
+    try:
+        with observe_latency(JSON_DECODE_LATENCY):
+            return json.loads(text)
+    except json.JSONDecodeError:
+        ERRORS.labels(type="json_decode").inc()
+        raise
+
+
+def read_upload_file(file) -> bytes:
+    """アップロードされたファイル（Starlette が一時ファイルに受信したもの）の内容を先頭から読み込む"""
+    file.seek(0)
+    return file.read()
+
+
+def expand_bulk_upload(filename: str, file) -> tuple:
+    """
+    一括アップロードされた1ファイルを (ファイル名, 内容を読み込む関数, エラー) の一覧に展開する。
+    ZIPの場合は中のExcelファイルを対象とする。内容はここでは読み込まず、解析の直前に読み込む関数を返す
+    （ZIPの中のファイルは、ZIPに記録された展開後の大きさまでしか読まない）。
+
+    Returns:
+        (一覧, 展開後の合計バイト数)
+    """
+    lower_name = filename.lower()
+    if lower_name.endswith(('.xlsx', '.xls')):
+        file.seek(0, os.SEEK_END)
+        return [(filename, functools.partial(read_upload_file, file), None)], file.tell()
+    if not lower_name.endswith('.zip'):
+        return [(filename, None, "Excel形式のファイル（.xlsx または .xls）またはZIPをアップロードしてください。")], 0
+
+    items = []
+    total_bytes = 0
+    try:
+        file.seek(0)
+        archive = zipfile.ZipFile(file)
+        for info in archive.infolist():
+            name = f"{filename}/{info.filename}"
+            base_name = os.path.basename(info.filename)
+            # ディレクトリや macOS のメタデータ、Excel の一時ファイルは対象外
+            if info.is_dir() or info.filename.startswith("__MACOSX/") or base_name.startswith(("~$", ".")):
+                continue
+            if not base_name.lower().endswith(('.xlsx', '.xls')):
+                continue
+            if info.file_size > BULK_MAX_FILE_BYTES:
+                items.append((name, None, f"ファイルサイズが上限（{BULK_MAX_FILE_BYTES} バイト）を超えています。"))
+                continue
+            items.append((name, functools.partial(archive.read, info), None))
+            total_bytes += info.file_size
+    except (zipfile.BadZipFile, OSError) as e:
+        return [(filename, None, f"ZIPファイルを展開できませんでした: {e}")], 0
+    return items, total_bytes
+
+
+def start_answer_review(user_answer: str) -> tuple:
+    """
+    回答を添削する。機械的に判定できるルールはその場でチェックし、
+    判断が必要なルールだけをLLMでの添削として質問生成と並行して開始する。
+
+    Returns:
+        (ルール違反の一覧, LLM添削のタスク または None)
+    """
+    rule_set = review_rules.get() if ANSWER_REVIEW_ENABLED else None
+    if rule_set is None:
+        return [], None
+    violations = rule_set.check(user_answer)
+    review_task = None
+    if rule_set.needs_judgment(user_answer):
+        review_task = asyncio.create_task(review_answer_async(rule_set.judgment_rules_text, user_answer))
+    return violations, review_task
+
+
+async def collect_answer_review(review: tuple, deadline: float) -> Optional[str]:
+    """
+    ルールチェックの結果とLLM添削の結果をまとめる。
+    LLM添削は期限まで待ち、期限切れやエラーの場合はルールチェックの結果だけを返す（質問の返却は妨げない）。
+    """
+    violations, review_task = review
+    llm_review = None
+    if review_task is not None:
+        remaining = deadline - asyncio.get_running_loop().time()
+        try:
+            llm_review = await asyncio.wait_for(review_task, max(remaining, 0))
+        except asyncio.TimeoutError:
+            ERRORS.labels(type="review_timeout").inc()
+            log_event("answer_review_skipped", logging.WARNING, reason="latency_budget_exceeded")
+        except Exception as e:
+            log_event("answer_review_failed", logging.WARNING, error=str(e))
+
+    sections = []
+    if violations:
+        sections.append("【ルールチェック】\n" + "\n".join(f"- {v['message']}（該当箇所: {v['match']}）" for v in violations))
+    if llm_review:
+        sections.append(llm_review)
+    return "\n\n".join(sections) if sections else None
+
+
+def cancel_answer_review(review: tuple) -> None:
+    """結果を受け取らなかったLLM添削のタスクを止める"""
+    review_task = review[1]
+    if review_task is not None and not review_task.done():
+        review_task.cancel()
+
 
-# グローバル変数
-current_stage = 1
-skillsheet_data = ""  # スキルシート情報を保持
+async def generate_followup_within(deadline: float, user_answer: str, current_question: str, context: str) -> str:
+    """期限までに深掘り質問を生成する（期限を過ぎた場合は asyncio.TimeoutError）"""
+    remaining = max(deadline - asyncio.get_running_loop().time(), 0.001)
+    return await asyncio.wait_for(
+        generate_followup_async(user_answer, current_question, context, timeout=remaining),
+        remaining,
+    )
+
+
+def _project_template_values(project: Dict) -> Dict[str, str]:
+    """質問テンプレートに埋め込む、プロジェクトの項目（空欄のものは含めない）"""
+    values = {}
+    for name, field in (("project", "プロジェクト名・業務概要"), ("language", "使用言語"), ("role", "役割/規模")):
+        text = str(project.get(field) or "").strip().splitlines()
+        if text and text[0].strip() not in ("", "ー", "-", "－"):
+            values[name] = text[0].strip()[:40]
+    return values
+
+
+def choose_fallback_question(session_id: str, session: Dict, current_question: str, user_answer: str,
+                             reason: str) -> Optional[str]:
+    """
+    AIの質問の代わりに使う深掘り質問を選ぶ（無効な場合は None）。
+    事前に作った候補が残っていれば、回答との関連の高さに関係なくその中から最も関連の高いものを返す。
+    無ければ、スキルシートのプロジェクトの情報を埋め込んだテンプレートの質問と、質問バンクの質問から選ぶ。
+    """
+    if not LLM_FALLBACK_ENABLED:
+        return None
+    pooled = take_pooled_question(session_id, f"{current_question}\n{user_answer}", current_question,
+                                  min_score=None)
+    if pooled is not None:
+        FALLBACK_QUESTIONS.labels(reason=reason).inc()
+        QUESTION_POOL_EVENTS.labels(event="fallback_served").inc()
+        log_event("fallback_question_served", logging.WARNING, reason=reason, source="question_pool")
+        return pooled
+    candidates = []
+    projects = (session.get("skillsheet_data") or {}).get("projects") or []
+    for project in projects:
+        values = _project_template_values(project)
+        for template in FALLBACK_QUESTION_TEMPLATES:
+            fields = {name for _, name, _, _ in string.Formatter().parse(template) if name}
+            if fields <= values.keys():
+                candidates.append(template.format(**values))
+    candidates += questions_by_stage["stage_3_fallback"]
+    # 直前と同じ質問は避ける
+    candidates = [q for q in candidates if q != current_question] or candidates
+    FALLBACK_QUESTIONS.labels(reason=reason).inc()
+    log_event("fallback_question_served", logging.WARNING, reason=reason, source="templates")
+    return random.choice(candidates)
+
+
+def start_question_pool(session_id: str, skillsheet_data: Dict, digest: str) -> None:
+    """スキルシートの深掘り質問の候補作成をバックグラウンドで開始する（同じスキルシートで作成済み・作成中なら何もしない）"""
+    if not QUESTION_POOL_ENABLED or not skillsheet_data.get("projects"):
+        return
+    running = question_pool_tasks.get(session_id)
+    if running is not None:
+        if getattr(running, "skillsheet_hash", None) == digest:
+            return
+        # 別のスキルシートがアップロードし直された場合は、前の作成を止める
+        running.cancel()
+    task = asyncio.create_task(prepare_question_pool(session_id, skillsheet_data, digest))
+    task.skillsheet_hash = digest
+    question_pool_tasks[session_id] = task
+
+    def done(finished: asyncio.Task) -> None:
+        if question_pool_tasks.get(session_id) is finished:
+            question_pool_tasks.pop(session_id, None)
+
+    task.add_done_callback(done)
+
+
+async def prepare_question_pool(session_id: str, skillsheet_data: Dict, digest: str) -> None:
+    """深掘り質問の候補を作り、セッションに保存する"""
+    pool = await generate_question_pool(skillsheet_data)
+
+    def apply(data: Dict) -> Optional[Dict]:
+        # 作成中に別のスキルシートがアップロードされていた場合は保存しない
+        if data.get("skillsheet_hash") != digest:
+            return None
+        return {"question_pool": pool, "question_pool_hash": digest, "question_pool_served": 0}
+
+    await asyncio.to_thread(session_store.update_with, session_id, apply)
+    log_event("question_pool_ready", session_id=session_id, questions=len(pool))
+
+
+def take_pooled_question(session_id: str, query: str, current_question: str,
+                         min_score: Optional[float] = QUESTION_POOL_MIN_SCORE) -> Optional[str]:
+    """
+    事前に作った候補から、直前の質問と回答に最も関連の高い質問を取り出す（取り出した候補は削除する）。
+    min_score 未満の候補しか無い場合や、候補から返したターン数が上限に達している場合は None。
+    min_score=None の場合（AIで生成できなかったときの代わり）は、関連の高さとターン数の上限を問わない。
+    """
+    if not QUESTION_POOL_ENABLED:
+        return None
+    # 取り出した質問と、探した結果（hit / miss / empty / limit）
+    result = {"question": None, "event": "empty"}
+
+    def take(data: Dict) -> Optional[Dict]:
+        pool = data.get("question_pool") or []
+        served = data.get("question_pool_served", 0)
+        if not pool:
+            return None
+        if min_score is not None and served >= QUESTION_POOL_MAX_TURNS:
+            result["event"] = "limit"
+            return None
+        ranked = rank_pooled_questions(pool, query, exclude=current_question)
+        if not ranked or (min_score is not None and ranked[0][1] < min_score):
+            result["event"] = "miss"
+            return None
+        position = ranked[0][0]
+        result.update(question=pool[position]["question"], event="hit")
+        return {
+            "question_pool": pool[:position] + pool[position + 1:],
+            "question_pool_served": served + (1 if min_score is not None else 0),
+        }
+
+    session_store.update_with(session_id, take)
+    if min_score is not None:
+        QUESTION_POOL_EVENTS.labels(event=result["event"]).inc()
+        if result["question"] is not None:
+            QUESTION_POOL_EVENTS.labels(event="served").inc()
+    return result["question"]
+
+
+def select_skillsheet_info(request_skillsheet: Optional[str], session: Dict, query: str) -> str:
+    """
+    深掘り質問のプロンプトに含めるスキルシート情報を決める。
+    リクエストに含まれていればそれを、なければセッションのスキルシートから
+    質問と回答に関連する部分を選んで使う。
+    """
+    if request_skillsheet:
+        return request_skillsheet
+    if SKILLSHEET_CONTEXT_SELECTION and session.get("skillsheet_data") and session.get("skillsheet_hash"):
+        return build_skillsheet_context(session["skillsheet_data"], query, session["skillsheet_hash"])
+    return session["skillsheet"]
+
+
+async def store_skillsheet(digest: str, skillsheet_data: Dict, filename: Optional[str]) -> None:
+    """
+    解析できたスキルシートを検索用の保存先に登録する（保存に失敗しても、アップロード自体は成功として扱う）。
+    SQLite の書き込みロックを待つ間にイベントループを止めないよう、別スレッドで書き込む
+    """
+    if skillsheet_repository is None:
+        return
+    try:
+        await asyncio.to_thread(skillsheet_repository.put, digest, skillsheet_data, filename)
+    except Exception as e:
+        ERRORS.labels(type="repository_error").inc()
+        log_event("skillsheet_store_failed", logging.WARNING, sha256=digest, error=str(e))
+
+
+def register_profile(kind: str, text: str) -> str:
+    """
+    企業情報・スキルシートのテキストを登録し、IDを返す。
+    IDは内容のハッシュから作るため、同じ内容を何度登録しても同じIDになる。
+    """
+    profile_id = f"{kind}_{hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]}"
+    profile_store.set(profile_id, {"kind": kind, "text": text})
+    return profile_id
+
+
+def load_profile(kind: str, profile_id: str) -> str:
+    """登録済みのテキストを返す（見つからない場合は 404）"""
+    entry = profile_store.get(profile_id)
+    if entry is None or entry.get("kind") != kind:
+        raise HTTPException(status_code=404, detail=f"登録された情報が見つかりません: {profile_id}")
+    return entry["text"]
+
+
+def resolve_interview_context(request: AnswerRequest, session: Dict, query: str) -> tuple:
+    """
+    深掘り質問のプロンプトに含める (企業情報, スキルシート情報) を決める。
+    IDで登録済みのものを参照した場合は、プロンプトの先頭部分が毎ターン同じ内容になり
+    プロバイダ側のプロンプトキャッシュが効くよう、スキルシートは関連部分の選択をせず全文を使う。
+    """
+    if request.company_profile_id:
+        company_info = load_profile("company", request.company_profile_id)
+    else:
+        company_info = request.company_info
+    if request.skillsheet_id:
+        skillsheet_info = load_profile("skillsheet", request.skillsheet_id)
+    else:
+        skillsheet_info = select_skillsheet_info(request.skillsheet_info, session, query)
+    return company_info, skillsheet_info
+
+
+async def complete_turn(session_id: str, current_stage: int, question: str, answer: str) -> None:
+    """
+    次の質問を返せたターンを確定する（ステージを進め、質問と回答を記録する）。
+    失敗したターンや、クライアントが受け取る前に切断したターンはクライアントがやり直すため、確定しない。
+    """
+    await asyncio.to_thread(advance_stage, session_id, current_stage)
+    await record_turn(session_id, question, answer)
+
+
+async def record_turn(session_id: str, question: str, answer: str) -> None:
+    """
+    1ターン分の質問と回答をセッションに記録する。
+    要約していないターンが一定数たまったら、古いものを要約に取り込む処理をバックグラウンドで開始する。
+    """
+    if not ROLLING_SUMMARY_ENABLED:
+        return
+    turn = [{"type": "question", "text": question}, {"type": "answer", "text": answer}]
+    state = await asyncio.to_thread(
+        session_store.update_with, session_id, lambda data: {"pending_turns": data.get("pending_turns", []) + turn}
+    )
+    if state is None or len(state["pending_turns"]) < ROLLING_SUMMARY_KEEP_TURNS * 2 * 2:
+        return
+    if session_id in rolling_summary_tasks:
+        # 実行中の更新が終わったあと、次のターンで残りを取り込む
+        return
+    task = asyncio.create_task(update_rolling_summary(session_id))
+    rolling_summary_tasks[session_id] = task
+    task.add_done_callback(lambda _: rolling_summary_tasks.pop(session_id, None))
+
+
+async def update_rolling_summary(session_id: str) -> None:
+    """直近のターンを残して、古いターンを要約に取り込む"""
+    state = await asyncio.to_thread(session_store.get, session_id)
+    if state is None:
+        return
+    keep_items = ROLLING_SUMMARY_KEEP_TURNS * 2
+    pending = state.get("pending_turns", [])
+    if len(pending) <= keep_items:
+        return
+    folded = pending[:-keep_items]
+    base_count = state.get("summary_item_count", 0)
+    try:
+        summary = await update_rolling_summary_async(state.get("summary", ""), folded)
+    except Exception as e:
+        log_event("rolling_summary_failed", logging.WARNING, session_id=session_id, error=str(e))
+        return
+
+    def apply(data: Dict) -> Optional[Dict]:
+        # 他のワーカーが先に要約を更新していた場合は何もしない
+        if data.get("summary_item_count", 0) != base_count:
+            return None
+        return {
+            "summary": summary,
+            "summary_item_count": base_count + len(folded),
+            "pending_turns": data.get("pending_turns", [])[len(folded):],
+        }
+
+    await asyncio.to_thread(session_store.update_with, session_id, apply)
+
+
+def split_history_by_summary(session_id: Optional[str], history: List[Dict]) -> tuple:
+    """
+    総合レビューに使う (要約, 要約より後の会話履歴) を返す。
+    要約が無い場合や、会話履歴が要約した件数より短い場合は (None, 全履歴) を返す。
+    """
+    if not (ROLLING_SUMMARY_ENABLED and session_id):
+        return None, history
+    state = session_store.get(session_id)
+    if state is None or not state.get("summary"):
+        return None, history
+    count = state.get("summary_item_count", 0)
+    if count > len(history):
+        return None, history
+    return state["summary"], history[count:]
+
+
+def resolve_full_review_mode(mode: Optional[str]) -> str:
+    """リクエストで指定された総合レビューの生成方法を確認する（省略時は既定値）"""
+    mode = (mode or FULL_REVIEW_MODE).lower()
+    if mode not in ("single", "parallel"):
+        raise HTTPException(status_code=400, detail="mode には single または parallel を指定してください。")
+    return mode
+
+
+async def review_section(criterion: str, title: str, history: List[Dict], summary: Optional[str],
+                         call: str = "criterion_review") -> Dict:
+    """
+    総合レビューの1項目を生成する。
+    タイムアウトやエラーの場合も例外にはせず、その項目だけをエラーとして返す（他の項目の結果は返せるように）。
+    """
+    # retryable: エラーの場合に、試し直せば生成できる可能性があるか（タイムアウトやバックエンドの一時的な障害）
+    section = {"criterion": criterion, "title": title, "text": "", "is_error": False, "retryable": False}
+    try:
+        section["text"] = await asyncio.wait_for(
+            review_conversation_criterion_async(history, title, timeout=FULL_REVIEW_SECTION_TIMEOUT,
+                                                rolling_summary=summary, call=call),
+            FULL_REVIEW_SECTION_TIMEOUT,
+        )
+    except asyncio.TimeoutError:
+        section["text"] = "この項目のレビューは時間内に生成できませんでした。"
+        section["is_error"] = True
+        section["retryable"] = True
+    except Exception as e:
+        section["text"] = f"この項目のレビュー生成でエラーが発生しました: {e}"
+        section["is_error"] = True
+        section["retryable"] = is_transient_llm_error(e)
+    return section
+
+
+def merge_review_sections(sections: List[Dict]) -> str:
+    """項目ごとのレビューを、1回の呼び出しで生成した場合と同じ番号付きの形式にまとめる"""
+    return "\n\n".join(f"{i}. {section['title']}\n{section['text']}" for i, section in enumerate(sections, 1))
+
+
+async def generate_full_review(conversation_list: List[Dict], session_id: Optional[str], mode: str,
+                               batch: bool = False) -> Dict:
+    """
+    総合レビューを生成する（/get_full_review と一括再レビューのジョブで共通）。
+    batch=True の場合は、面接中のリクエストより後に通すバッチ用の呼び出し種別を使う。
+    """
+    summary, recent = await asyncio.to_thread(split_history_by_summary, session_id, conversation_list)
+    if mode == "parallel":
+        # 項目ごとの短い呼び出しを並行して行い、出力トークンの逐次生成を待つ時間を短くする
+        call = "batch_criterion_review" if batch else "criterion_review"
+        sections = await asyncio.gather(
+            *(review_section(criterion, title, recent, summary, call=call) for criterion, title in FULL_REVIEW_CRITERIA)
+        )
+        return {"full_review": merge_review_sections(sections), "sections": sections}
+    review = await summarize_and_review_conversation_async(
+        recent, rolling_summary=summary, call="batch_review" if batch else "full_review"
+    )
+    return {"full_review": review}
+
+
+def sse_event(event: str, data: Dict) -> str:
+    """Server-Sent Events の1イベント分の文字列を組み立てる"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+# SSE レスポンス共通のヘッダー（プロキシでのバッファリングを無効化）
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
 
 # --- API エンドポイント ---
 
-@app.post("/upload_skillsheet", summary="スキルシート（Excel）をアップロード")
-async def upload_skillsheet(file: UploadFile = File(...)):
+def upload_form_schema(**fields: str) -> Dict:
     """
-    Excelファイルをアップロードし、スキルシート情報を解析・保存
+    receive_upload で受け取るエンドポイントの、OpenAPI のリクエスト本文の定義
+    （UploadFile を引数にしないため、フォームの項目をここで定義する）
     """
-    global skillsheet_data
-    
+    properties = {"file": {"type": "string", "format": "binary"}}
+    properties.update({name: {"type": "string", "description": description} for name, description in fields.items()})
+    return {"requestBody": {"required": True, "content": {"multipart/form-data": {
+        "schema": {"type": "object", "properties": properties, "required": ["file"]}}}}}
+
+
+async def receive_upload_or_raise(request: Request, max_bytes: int) -> tuple:
+    """receive_upload の例外を HTTP のエラーにする（上限超過は 413、形式の誤りは 400）"""
     try:
+        return await receive_upload(request, max_bytes)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except InvalidUploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/upload_skillsheet", summary="スキルシート（Excel）をアップロード",
+          openapi_extra=upload_form_schema(session_id="セッションID（省略時は共有セッション）"))
+async def upload_skillsheet(request: Request):
+    """
+    Excelファイルをアップロードし、スキルシート情報を解析・セッションに保存
+    """
+    # 本文を受信しながらハッシュを計算する（上限を超えた時点で受信を打ち切り、
+    # 大きいファイルはメモリに置かずに一時ファイルに書き出す）
+    spool, filename, fields = await receive_upload_or_raise(request, SKILLSHEET_UPLOAD_MAX_BYTES)
+
+    try:
+        session_id, _ = await asyncio.to_thread(load_session, fields.get("session_id"))
+
         # ファイルの拡張子チェック
-        if not (file.filename.endswith('.xlsx') or file.filename.endswith('.xls')):
+        if not (filename.endswith('.xlsx') or filename.endswith('.xls')):
             raise HTTPException(status_code=400, detail="Excel形式のファイル（.xlsx または .xls）をアップロードしてください。")
         
-        # ファイルを読み込む
-        contents = await file.read()
-        
-        # スキルシートを解析
-        skillsheet_data = parse_skillsheet(contents)
+        # スキルシートを解析（同じファイルの解析結果はキャッシュから再利用し、
+        # 解析そのものはイベントループを止めないよう解析用プールで実行する。一時ファイルはパスのまま渡す）
+        digest = spool.sha256
+        cache_hit = False
+        try:
+            entry, cache_hit = await skillsheet_cache.get_or_parse_async(spool.source(), digest)
+            skillsheet_data = entry["text"]
+            structured_data = entry["data"]
+        except Exception as e:
+            skillsheet_data = f"スキルシート解析エラー: {str(e)}"
+            structured_data = None
+        await asyncio.to_thread(session_store.update, session_id, skillsheet=skillsheet_data,
+                                skillsheet_data=structured_data, skillsheet_hash=digest)
+        if structured_data is not None:
+            await store_skillsheet(digest, structured_data, filename)
+            # 面接の深掘り質問の候補を、面接が進む間にバックグラウンドで作っておく
+            start_question_pool(session_id, structured_data, digest)
+        # 解析できたスキルシートは登録し、以降のリクエストでは skillsheet_id で参照できるようにする
+        skillsheet_id = None
+        if structured_data is not None:
+            skillsheet_id = await asyncio.to_thread(register_profile, "skillsheet", skillsheet_data)
         
-        print(f"--- Skillsheet Uploaded: {file.filename} ---")
-        print(f"Parsed Data:\n{skillsheet_data[:500]}...")  # デバッグ用（最初の500文字）
+        log_event("skillsheet_uploaded", session_id=session_id, filename=filename, size=spool.size,
+                  cache_hit=cache_hit, parsed=structured_data is not None, text_chars=len(skillsheet_data))
         
         return {
             "message": "スキルシートのアップロードが完了しました",
-            "filename": file.filename,
+            "filename": filename,
+            "session_id": session_id,
+            "skillsheet_id": skillsheet_id,
+            "sha256": digest,
+            "cache_hit": cache_hit,
             "preview": skillsheet_data[:200] + "..." if len(skillsheet_data) > 200 else skillsheet_data
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"スキルシートの解析に失敗しました: {str(e)}")
+    finally:
+        spool.close()
+
+
+@app.post("/upload_skillsheets_bulk", summary="スキルシートを一括アップロード（複数のExcelまたはZIP）")
+async def upload_skillsheets_bulk(files: List[UploadFile] = File(...)):
+    """
+    複数のExcelファイル、またはExcelファイルをまとめたZIPを受け取り、プロセスプールで並列に解析する。
+    結果は解析が終わったファイルから順に、1行1ファイルのJSON（NDJSON）で返し、最後に集計行を返す。
+    破損したファイルがあってもそのファイルだけをエラーとして扱い、残りの解析は続ける。
+    """
+    # ZIPの展開（中のファイルの一覧の読み込み）はイベントループの外で行い、内容は解析の直前に1件ずつ読み込む
+    items = []
+    total_bytes = 0
+    for file in files:
+        expanded, expanded_bytes = await asyncio.to_thread(expand_bulk_upload, file.filename, file.file)
+        items.extend(expanded)
+        total_bytes += expanded_bytes
+    if len(items) > BULK_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"一度にアップロードできるファイルは {BULK_MAX_FILES} 件までです。")
+    if total_bytes > BULK_MAX_TOTAL_BYTES:
+        raise HTTPException(status_code=413,
+                            detail=f"展開後のファイルサイズの合計が上限（{BULK_MAX_TOTAL_BYTES} バイト）を超えています。")
+
+    log_event("bulk_upload_started", files=len(items), total_bytes=total_bytes)
+
+    # プロセスプールへ一度に渡すファイル数を制限する。内容の読み込みもこの範囲で行い、
+    # メモリ上に置くファイルを解析中・解析待ちの分だけにする
+    semaphore = asyncio.Semaphore(SKILLSHEET_PARSE_WORKERS * 2)
+
+    def load(read: Callable[[], bytes]) -> tuple:
+        contents = read()
+        return contents, skillsheet_cache.hash_bytes(contents)
+
+    async def process(filename: str, read: Optional[Callable[[], bytes]], error: Optional[str]) -> Dict:
+        if error is not None:
+            return {"filename": filename, "status": "error", "error": error, "elapsed_ms": None}
+
+        async with semaphore:
+            try:
+                contents, digest = await asyncio.to_thread(load, read)
+            except (zipfile.BadZipFile, OSError, zlib.error, EOFError) as e:
+                return {"filename": filename, "status": "error", "error": f"ZIPファイルを展開できませんでした: {e}",
+                        "elapsed_ms": None}
+            entry = await skillsheet_cache.get_async(digest)
+            if entry is not None:
+                await store_skillsheet(digest, entry["data"], filename)
+                return {"filename": filename, "status": "ok", "sha256": digest, "cache_hit": True,
+                        "elapsed_ms": 0.0, "preview": entry["text"][:200]}
+
+            result = await parse_skillsheet_job_async(filename, contents)
+        if result["status"] != "ok":
+            return result
+        await skillsheet_cache.put_async(digest, result["data"], result["text"])
+        await store_skillsheet(digest, result["data"], filename)
+        return {"filename": filename, "status": "ok", "sha256": digest, "cache_hit": False,
+                "elapsed_ms": result["elapsed_ms"], "preview": result["text"][:200]}
+
+    async def result_stream():
+        start = time.perf_counter()
+        tasks = [asyncio.create_task(process(*item)) for item in items]
+        counts = {"ok": 0, "error": 0}
+        try:
+            for task in asyncio.as_completed(tasks):
+                result = await task
+                counts[result["status"]] += 1
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+        finally:
+            # クライアントが切断した場合は残りの解析を中止する
+            for task in tasks:
+                task.cancel()
+        summary = {
+            "total": len(items),
+            "ok": counts["ok"],
+            "error": counts["error"],
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+        yield json.dumps({"summary": summary}, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(result_stream(), media_type="application/x-ndjson")
+
+
+@app.post("/company_profiles", summary="企業情報を登録")
+def create_company_profile(request: CompanyProfileRequest):
+    """
+    企業情報を登録し、IDを返す。以降の /generate_next_question では company_info の代わりに
+    company_profile_id を送ることで、毎ターン同じ企業情報を送り直さずに済む。
+    """
+    return {"company_profile_id": register_profile("company", request.company_info)}
+
+
+@app.post("/skillsheets", summary="スキルシート情報（テキスト）を登録")
+def create_skillsheet(request: SkillsheetRegisterRequest):
+    """
+    スキルシート情報のテキストを登録し、IDを返す（Excelの場合は /upload_skillsheet が skillsheet_id を返す）。
+    """
+    return {"skillsheet_id": register_profile("skillsheet", request.skillsheet_info)}
+
+
+def require_skillsheet_repository():
+    if skillsheet_repository is None:
+        raise HTTPException(status_code=503, detail="スキルシートの保存は無効になっています（SKILLSHEET_REPOSITORY_ENABLED）。")
+    return skillsheet_repository
+
+
+@app.get("/skillsheet_repository/search", summary="保存済みのスキルシートをスキルで検索")
+def search_skillsheets(
+    language: List[str] = Query([], description="使用言語（例: Java）"),
+    db: List[str] = Query([], description="DB（例: Oracle）"),
+    os_name: List[str] = Query([], alias="os", description="サーバーOS（例: Linux）"),
+    tool: List[str] = Query([], description="FW/MW/ツール（例: Spring）"),
+    phase: List[str] = Query([], description="担当工程（例: 詳細設計）"),
+    certification: List[str] = Query([], description="資格（例: 基本情報技術者）"),
+    within_years: Optional[float] = Query(None, gt=0, description="直近この年数以内の経験に限る"),
+    same_project: bool = Query(False, description="プロジェクトの条件を全て同じプロジェクトで満たすものに限る"),
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+):
+    """
+    アップロード（一括アップロードを含む）で解析したスキルシートを、転置索引を使って検索する。
+    同じ項目を複数指定した場合や、複数の項目を指定した場合は全てを満たすものを返す。
+
+    例: /skillsheet_repository/search?language=Java&db=Oracle&phase=詳細設計&within_years=5
+    """
+    repository = require_skillsheet_repository()
+    criteria = {"language": language, "db": db, "os": os_name, "tool": tool, "phase": phase,
+                CERTIFICATION_FIELD: certification}
+    start = time.perf_counter()
+    try:
+        result = repository.search({k: v for k, v in criteria.items() if v}, within_years=within_years,
+                                   same_project=same_project, limit=limit, offset=offset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {**result, "elapsed_ms": round((time.perf_counter() - start) * 1000, 2)}
+
+
+@app.get("/skillsheet_repository/stats", summary="保存済みのスキルシートの件数")
+def get_skillsheet_repository_stats():
+    return require_skillsheet_repository().stats()
+
+
+@app.get("/skillsheet_repository/terms/{key}", summary="検索条件に使える語の一覧")
+def get_skillsheet_terms(key: str, limit: int = Query(100, ge=1, le=1000)):
+    """
+    language / db / os / tool / phase / certification ごとに、登録されている語と
+    それを含むスキルシート数を多い順に返す
+    """
+    return {"key": key, "terms": require_skillsheet_repository().terms(key, limit)}
+
+
+@app.get("/skillsheet_repository/{sha256}", summary="保存済みのスキルシートの構造化データを取得")
+def get_stored_skillsheet(sha256: str):
+    """アップロード時に返した sha256（ファイル内容のハッシュ）で、解析済みの構造化データを返す"""
+    stored = require_skillsheet_repository().get(sha256)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="スキルシートが見つかりません。")
+    return stored
+
+
+@app.delete("/skillsheet_repository/{sha256}", summary="保存済みのスキルシートを削除")
+def delete_stored_skillsheet(sha256: str):
+    """候補者からの削除依頼などで、保存済みのスキルシートと検索用の索引を削除する"""
+    if not require_skillsheet_repository().delete(sha256):
+        raise HTTPException(status_code=404, detail="スキルシートが見つかりません。")
+    log_event("skillsheet_deleted", sha256=sha256)
+    return {"deleted": sha256}
+
+
+async def purge_skillsheet_repository() -> None:
+    """保存期間を過ぎたスキルシートを定期的に削除する（アプリの起動時に開始する）"""
+    while True:
+        try:
+            purged = await asyncio.to_thread(skillsheet_repository.purge_expired)
+            if purged:
+                log_event("skillsheet_repository_purged", skillsheets=purged)
+        except Exception as e:
+            log_event("skillsheet_repository_purge_failed", logging.WARNING, error=str(e))
+        await asyncio.sleep(SKILLSHEET_REPOSITORY_PURGE_INTERVAL)
 
 
 @app.post("/", response_model=dict, summary="面接開始時の最初の質問を生成")
 def get_initial_question(request: CompanyInfoRequest):
     """
     面接開始時に、設定情報を受け取りますが、既存のINITIAL_QUESTIONを返します。
+    新しいセッションIDを発行し、以降のリクエストではこのIDを送ってもらう。
     """
-    global current_stage
-    current_stage = 1
-    print(f"--- API Call: / --- Current Stage: {current_stage}, Received Info: {request.company_info}")
-    return {"question": INITIAL_QUESTION}
+    session_id = session_store.create(new_session_state())
+    # session_id を送らない旧クライアントのために共有セッションの面接の進行状況もリセットする
+    # （面接の前にアップロードされたスキルシートと、そこから作った質問の候補は残す）
+    session_store.update_with(DEFAULT_SESSION_ID, lambda data: interview_progress_reset())
+    log_event("interview_started", session_id=session_id, company_info_chars=len(request.company_info))
+    return {"question": INITIAL_QUESTION, "session_id": session_id}
 
 
 @app.post("/generate_next_question")
@@ -103,27 +1095,35 @@ async def generate_next_question(request: AnswerRequest):
     """
     ユーザーの回答、前回の質問、企業設定情報、スキルシート情報に基づき、次の質問を生成します。
     """
-    global current_stage, skillsheet_data
+    session_id, session = await asyncio.to_thread(load_session, request.session_id)
+    return await run_next_question_turn(session_id, session, request)
+
+
+async def run_next_question_turn(session_id: str, session: Dict, request: AnswerRequest) -> Dict:
+    """
+    1ターン分の処理（ステージの遷移・質問の生成・回答の添削）を行い、次の質問を返す
+    （/generate_next_question と WebSocket の面接で共通）
+    """
+    current_stage = session["stage"]
     user_answer = request.user_answer
     current_question = request.current_question
-    company_info = request.company_info
     
-    # スキルシート情報を取得（リクエストに含まれていればそれを、なければグローバル変数を使用）
-    skillsheet_info = request.skillsheet_info if request.skillsheet_info else skillsheet_data
+    # 企業情報とスキルシート情報を取得（登録済みのIDが指定されていればその内容を、
+    # スキルシートがリクエストに含まれていなければセッションの情報から関連部分を選んで使用）
+    company_info, skillsheet_info = await asyncio.to_thread(
+        resolve_interview_context, request, session, f"{current_question}\n{user_answer}"
+    )
 
-    print(f"--- API Call: /generate_next_question --- Stage: {current_stage}")
-    print(f"Answer: {user_answer[:20]}..., Has Skillsheet: {bool(skillsheet_info)}")
+    log_event("next_question_requested", session_id=session_id, stage=current_stage,
+              answer_chars=len(user_answer), has_skillsheet=bool(skillsheet_info))
 
     if not user_answer:
         return {"error": "回答が空です。テキストを入力してください。", "is_error": True}
 
-    # 添削ロジック
+    # 添削ロジック（質問生成と並行して実行し、ターン全体のレイテンシ予算内で待つ）
+    deadline = asyncio.get_running_loop().time() + TURN_LATENCY_BUDGET
+    review = start_answer_review(user_answer)
     review_result = None
-    rules_file_path = "review_rules.txt"
-    if os.path.exists(rules_file_path):
-        with open(rules_file_path, "r", encoding="utf-8") as f:
-            rules_content = f.read().strip()
-            # review_result = review_answer(rules_content, user_answer)
 
     # 企業情報とスキルシート情報を統合
     combined_context = company_info
@@ -133,90 +1133,626 @@ async def generate_next_question(request: AnswerRequest):
     # 質問生成ロジック
     next_question = ""
     is_error = False
+    fallback_question = None
+    pooled_question = None
     
     try:
-        if current_stage == 1:
-            # ステージ1: 自己紹介の次の質問（ステージ2へ移行）
-            current_stage = 2
-            next_question = random.choice(questions_by_stage["stage_2_experience"])
-            
-        elif current_stage == 2:
-            # ステージ2: 職務経歴の次の質問（ステージ3へ移行）
-            if current_question in questions_by_stage["stage_2_experience"]:
-                current_stage = 3
-                # スキルシート情報を含めてAI質問を生成
-                ai_response_json = generate_followup(user_answer, current_question, combined_context)
-                ai_data = json.loads(ai_response_json)
-                next_question = ai_data.get("question", "AIが質問を生成できませんでした。")
-            else:
-                current_stage = 3
-                ai_response_json = generate_followup(user_answer, current_question, combined_context)
-                ai_data = json.loads(ai_response_json)
-                next_question = ai_data.get("question", "AIが質問を生成できませんでした。")
-
-        elif current_stage >= 3:
-            # ステージ3以降: AIによる深堀り質問（スキルシート情報を活用）
-            ai_response_json = generate_followup(user_answer, current_question, combined_context)
-            ai_data = json.loads(ai_response_json)
-            
-            if ai_data.get("is_error", False):
-                raise Exception(ai_data.get("question", "AI質問生成エラー：詳細不明"))
-
-            next_question = ai_data.get("question", "AIが質問を生成できませんでした。")
-            
-        else:
+        if current_stage < 1:
             next_question = "面接の流れに問題が発生しました。"
             is_error = True
+        else:
+            fixed_question = stage_question(current_stage)
+            # 事前に作った候補に回答と関連の高い質問があれば、AIを呼び出さずにそれを返す
+            if fixed_question is None:
+                pooled_question = await asyncio.to_thread(
+                    take_pooled_question, session_id, f"{current_question}\n{user_answer}", current_question
+                )
+            if fixed_question is not None:
+                next_question = fixed_question
+            elif pooled_question is not None:
+                next_question = pooled_question
+            else:
+                # ステージ2以降: AIによる深堀り質問（スキルシート情報を活用）
+                ai_response_json = await generate_followup_within(
+                    deadline, user_answer, current_question, combined_context
+                )
+                ai_data = decode_llm_json(ai_response_json)
+
+                if ai_data.get("is_error", False):
+                    reason = "circuit_open" if ai_data.get("circuit_open") else "llm_error"
+                    fallback_question = await asyncio.to_thread(
+                        choose_fallback_question, session_id, session, current_question, user_answer, reason
+                    )
+                if fallback_question is None and current_stage >= 3 and ai_data.get("is_error", False):
+                    raise Exception(ai_data.get("question", "AI質問生成エラー：詳細不明"))
+
+                next_question = fallback_question or ai_data.get("question", "AIが質問を生成できませんでした。")
 
     except json.JSONDecodeError:
-        next_question = "AIからのレスポンスが不正なJSON形式です。"
-        is_error = True
+        fallback_question = await asyncio.to_thread(
+            choose_fallback_question, session_id, session, current_question, user_answer, "json_decode"
+        )
+        next_question = fallback_question or "AIからのレスポンスが不正なJSON形式です。"
+        is_error = fallback_question is None
+    except asyncio.TimeoutError:
+        # 期限内に応答しなかったデプロイメントは、ai_question 側で障害として数える
+        ERRORS.labels(type="turn_timeout").inc()
+        fallback_question = await asyncio.to_thread(
+            choose_fallback_question, session_id, session, current_question, user_answer, "timeout"
+        )
+        next_question = fallback_question or "質問生成が時間内に完了しませんでした。もう一度お試しください。"
+        is_error = fallback_question is None
     except Exception as e:
         next_question = f"質問生成でエラーが発生しました: {str(e)}"
         is_error = True
+        review_result = await collect_answer_review(review, deadline)
         
         return {
             "current_question": current_question,
             "user_answer": user_answer,
             "next_question": next_question,
             "review": review_result,
+            "rule_violations": review[0],
             "is_error": is_error,
+            "fallback": False,
+            "pooled": False,
             "error_message": str(e)
         }
 
+    if not is_error:
+        # 失敗したターンはクライアントがやり直すため、次の質問を返せたターンだけを確定する
+        await complete_turn(session_id, current_stage, current_question, user_answer)
+    review_result = await collect_answer_review(review, deadline)
+
     return {
         "current_question": current_question,
         "user_answer": user_answer,
         "next_question": next_question,
         "review": review_result,
-        "is_error": is_error
+        "rule_violations": review[0],
+        "is_error": is_error,
+        "fallback": fallback_question is not None,
+        "pooled": pooled_question is not None
     }
 
 
+@app.post("/generate_next_question_stream", summary="次の質問をSSEでストリーミング生成")
+async def generate_next_question_stream(request: AnswerRequest):
+    """
+    /generate_next_question のストリーミング版（Server-Sent Events）。
+    生成中の質問文を "delta" イベントで少しずつ送り、最後に "done" イベントで
+    /generate_next_question と同じ形式の結果を送る。
+    """
+    session_id, session = await asyncio.to_thread(load_session, request.session_id)
+    events = await start_next_question_stream(session_id, session, request)
+    if events is None:
+        return {"error": "回答が空です。テキストを入力してください。", "is_error": True}
+
+    async def event_stream():
+        async with aclosing(events):
+            async for event, data in events:
+                yield sse_event(event, data)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+async def start_next_question_stream(session_id: str, session: Dict, request: AnswerRequest):
+    """
+    1ターン分の処理を始め、次の質問を少しずつ返す非同期ジェネレーターを返す（回答が空の場合は None）。
+    ジェネレーターは ("delta", {"text": ...}) を繰り返し、最後に ("done", 結果) を返す
+    （/generate_next_question_stream と WebSocket の面接で共通）。
+    ステージの遷移と会話の記録は、次の質問を最後まで送れた場合にだけ行う。
+    """
+    current_stage = session["stage"]
+    user_answer = request.user_answer
+    current_question = request.current_question
+    company_info, skillsheet_info = await asyncio.to_thread(
+        resolve_interview_context, request, session, f"{current_question}\n{user_answer}"
+    )
+
+    log_event("next_question_stream_requested", session_id=session_id, stage=current_stage,
+              answer_chars=len(user_answer), has_skillsheet=bool(skillsheet_info))
+
+    if not user_answer:
+        return None
+
+    combined_context = company_info
+    if skillsheet_info:
+        combined_context += "\n\n" + skillsheet_info
+
+    fixed_question = stage_question(current_stage)
+    pooled_question = None
+    if fixed_question is None and current_stage >= 1:
+        pooled_question = await asyncio.to_thread(
+            take_pooled_question, session_id, f"{current_question}\n{user_answer}", current_question
+        )
+    deadline = asyncio.get_running_loop().time() + TURN_LATENCY_BUDGET
+
+    async def event_stream():
+        # 添削はジェネレーターを読み始めてから開始し、クライアントの切断などで読み終わらなかった場合は止める
+        review = start_answer_review(user_answer)
+        deltas = None
+        try:
+            result = {
+                "current_question": current_question,
+                "user_answer": user_answer,
+                "next_question": "",
+                "review": None,
+                "rule_violations": review[0],
+                "is_error": False,
+            }
+            if current_stage < 1:
+                result.update(next_question="面接の流れに問題が発生しました。", is_error=True, fallback=False,
+                              pooled=False)
+                result["review"] = await collect_answer_review(review, deadline)
+                yield "done", result
+                return
+            if fixed_question is not None or pooled_question is not None:
+                # 固定の質問や事前に作った候補は、生成を待たずにまとめて送る
+                result["next_question"] = fixed_question or pooled_question
+                result["pooled"] = pooled_question is not None
+                yield "delta", {"text": result["next_question"]}
+                await complete_turn(session_id, current_stage, current_question, user_answer)
+                result["review"] = await collect_answer_review(review, deadline)
+                yield "done", result
+                return
+
+            streamed = False
+            try:
+                # 最初の差分が届くまでをターン全体のレイテンシ予算内に収める（それ以降は届いた順に送る）
+                remaining = max(deadline - asyncio.get_running_loop().time(), 0.001)
+                first, deltas = await asyncio.wait_for(
+                    open_followup_stream(user_answer, current_question, combined_context, timeout=remaining),
+                    remaining,
+                )
+                if first is not None:
+                    result["next_question"] += first
+                    streamed = True
+                    yield "delta", {"text": first}
+                    async for delta in deltas:
+                        result["next_question"] += delta
+                        yield "delta", {"text": delta}
+                if not result["next_question"]:
+                    result["next_question"] = "AIが質問を生成できませんでした。"
+                    yield "delta", {"text": result["next_question"]}
+            except json.JSONDecodeError:
+                ERRORS.labels(type="json_decode").inc()
+                result["next_question"] = "AIからのレスポンスが不正なJSON形式です。"
+                result["is_error"] = True
+                fallback_reason = "json_decode"
+            except asyncio.TimeoutError:
+                ERRORS.labels(type="turn_timeout").inc()
+                result["next_question"] = "質問生成が時間内に完了しませんでした。もう一度お試しください。"
+                result["is_error"] = True
+                fallback_reason = "timeout"
+            except Exception as e:
+                result["next_question"] = f"質問生成でエラーが発生しました: {str(e)}"
+                result["is_error"] = True
+                result["error_message"] = str(e)
+                fallback_reason = "circuit_open" if isinstance(e, CircuitOpenError) else "llm_error"
+            else:
+                fallback_reason = None
+
+            # 質問文をまだ1文字も送っていなければ、エラーの代わりに質問バンクの質問を送る
+            fallback_question = None
+            if fallback_reason is not None and not streamed:
+                fallback_question = await asyncio.to_thread(
+                    choose_fallback_question, session_id, session, current_question, user_answer, fallback_reason
+                )
+            if fallback_question is not None:
+                result.update(next_question=fallback_question, is_error=False)
+                result.pop("error_message", None)
+                yield "delta", {"text": fallback_question}
+            result["fallback"] = fallback_question is not None
+            result["pooled"] = False
+            if not result["is_error"]:
+                await complete_turn(session_id, current_stage, current_question, user_answer)
+            result["review"] = await collect_answer_review(review, deadline)
+            yield "done", result
+        finally:
+            cancel_answer_review(review)
+            # 読み終わる前に閉じられた場合は、生成中のストリームも閉じる（デプロイメントの処理中の件数を戻す）
+            if deltas is not None:
+                await deltas.aclose()
+
+    return event_stream()
+
+
+def open_interview(start: InterviewStartMessage) -> tuple:
+    """
+    WebSocket の面接を始める。登録済みの企業情報・スキルシートはここで1度だけ読み込み、
+    毎ターンのリクエストの元になる AnswerRequest（回答と質問は空）を作る。
+
+    Returns:
+        (セッションID, AnswerRequest の元, 回答待ちの質問)
+    """
+    company_info = load_profile("company", start.company_profile_id) if start.company_profile_id else start.company_info
+    skillsheet_info = load_profile("skillsheet", start.skillsheet_id) if start.skillsheet_id else start.skillsheet_info
+
+    if start.session_id:
+        session_id, session = load_session(start.session_id)
+        question = start.current_question or (INITIAL_QUESTION if session["stage"] == 1 else None)
+        if question is None:
+            raise HTTPException(status_code=400, detail="続きから始める場合は current_question を指定してください。")
+    else:
+        session_id = session_store.create(new_session_state())
+        question = INITIAL_QUESTION
+    log_event("interview_started", session_id=session_id, company_info_chars=len(company_info), channel="websocket",
+              resumed=bool(start.session_id))
+    template = AnswerRequest(user_answer="", current_question="", company_info=company_info,
+                             skillsheet_info=skillsheet_info or None, session_id=session_id)
+    return session_id, template, question
+
+
+async def run_interview_turn(websocket: WebSocket, session_id: str, request: AnswerRequest, stream: bool) -> Dict:
+    """WebSocket の面接の1ターン。stream の場合は生成中の質問文を "delta" で送り、最後の結果を返す"""
+    _, session = await asyncio.to_thread(load_session, session_id)
+    if not stream:
+        return await run_next_question_turn(session_id, session, request)
+    events = await start_next_question_stream(session_id, session, request)
+    if events is None:
+        return {"error": "回答が空です。テキストを入力してください。", "is_error": True}
+    result = {}
+    async with aclosing(events):
+        async for event, data in events:
+            if event == "delta":
+                await websocket.send_json({"type": "delta", **data})
+            else:
+                result = data
+    return result
+
+
+@app.websocket("/ws/interview")
+async def interview_websocket(websocket: WebSocket):
+    """
+    1つの接続で面接全体を行う WebSocket。
+    接続後に企業情報・スキルシート情報（InterviewStartMessage）を1度だけ送り、以降は回答
+    （InterviewAnswerMessage）だけを送る。回答待ちの質問は接続ごとにサーバー側で保持し、
+    /generate_next_question と同じステージの遷移で次の質問を返す。
+
+    サーバーから送るメッセージ:
+        {"type": "started", "session_id": ..., "question": 最初の質問}
+        {"type": "delta", "text": ...}  生成中の質問文（stream が有効な場合）
+        {"type": "question", ...}       /generate_next_question と同じ形式の結果
+        {"type": "error", "detail": ...} メッセージの形式の誤りなど（面接の情報の誤りの場合は接続を閉じる）
+    """
+    await websocket.accept()
+    INTERVIEW_WS_CONNECTIONS.inc()
+    try:
+        try:
+            start = InterviewStartMessage.model_validate_json(
+                await asyncio.wait_for(websocket.receive_text(), INTERVIEW_WS_START_TIMEOUT)
+            )
+            session_id, template, question = await asyncio.to_thread(open_interview, start)
+        except (ValidationError, HTTPException, asyncio.TimeoutError) as e:
+            if isinstance(e, ValidationError):
+                detail = describe_validation_error(e)
+            else:
+                detail = getattr(e, "detail", None) or "面接の情報が送られませんでした。"
+            await websocket.send_json({"type": "error", "detail": detail})
+            await websocket.close(code=1008)
+            return
+        await websocket.send_json({"type": "started", "session_id": session_id, "question": question})
+
+        while True:
+            try:
+                turn = InterviewAnswerMessage.model_validate_json(await websocket.receive_text())
+            except ValidationError as e:
+                await websocket.send_json({"type": "error", "detail": describe_validation_error(e)})
+                continue
+            request = template.model_copy(update={"user_answer": turn.answer, "current_question": question})
+            stream = start.stream if turn.stream is None else turn.stream
+            try:
+                with observe_latency(INTERVIEW_WS_TURN_LATENCY) as outcome:
+                    result = await run_interview_turn(websocket, session_id, request, stream)
+                    if result.get("is_error"):
+                        outcome["outcome"] = "error"
+            except HTTPException as e:
+                # セッションの有効期限が切れた場合など
+                await websocket.send_json({"type": "error", "detail": e.detail})
+                await websocket.close(code=1008)
+                return
+            if "error" in result:
+                await websocket.send_json({"type": "error", "detail": result["error"]})
+                continue
+            # 質問を生成できなかった場合は、同じ質問への回答を待ち続ける
+            if not result.get("is_error"):
+                question = result["next_question"]
+            await websocket.send_json({"type": "question", **result})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        INTERVIEW_WS_CONNECTIONS.dec()
+
+
 @app.post("/get_full_review")
 async def get_full_review(request: ConversationHistoryRequest):
     """
     全会話履歴のリストを受け取り、総合レビューを生成します。
     """
-    print("--- API Call: /get_full_review ---")
+    log_event("full_review_requested", items=len(request.conversation_history), session_id=request.session_id)
+    mode = resolve_full_review_mode(request.mode)
     try:
         conversation_list = [item.model_dump() for item in request.conversation_history]
-        review = summarize_and_review_conversation(conversation_list) 
-        
+        return await generate_full_review(conversation_list, request.session_id, mode)
     except Exception as e:
-        review = f"レビュー生成でエラーが発生しました: {e}"
+        return {"full_review": f"レビュー生成でエラーが発生しました: {e}"}
+
+
+@app.post("/get_full_review_stream", summary="総合レビューをSSEでストリーミング生成")
+async def get_full_review_stream(request: ConversationHistoryRequest):
+    """
+    /get_full_review のストリーミング版（Server-Sent Events）。
+    レビュー本文を "delta" イベントで少しずつ送り、最後に "done" イベントで全文を送る。
+    mode が "parallel" の場合は、項目ごとのレビューを完成した順に "section" イベントで送る。
+    """
+    log_event("full_review_stream_requested", items=len(request.conversation_history),
+              session_id=request.session_id)
+    mode = resolve_full_review_mode(request.mode)
+    conversation_list = [item.model_dump() for item in request.conversation_history]
+    summary, recent = await asyncio.to_thread(split_history_by_summary, request.session_id, conversation_list)
+
+    async def section_stream():
+        tasks = [asyncio.create_task(review_section(criterion, title, recent, summary))
+                 for criterion, title in FULL_REVIEW_CRITERIA]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield sse_event("section", await task)
+        finally:
+            for task in tasks:
+                task.cancel()
+        sections = [task.result() for task in tasks]
+        yield sse_event("done", {"full_review": merge_review_sections(sections), "sections": sections})
+
+    if mode == "parallel":
+        return StreamingResponse(section_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+    async def event_stream():
+        review = ""
+        try:
+            async for delta in stream_full_review_async(recent, rolling_summary=summary):
+                review += delta
+                yield sse_event("delta", {"text": delta})
+            review = review.strip()
+        except Exception as e:
+            review = f"レビュー生成でエラーが発生しました: {e}"
+        yield sse_event("done", {"full_review": review})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+class IncompleteReviewError(RuntimeError):
+    """総合レビューの一部の項目を生成できなかった（retryable: 全ての項目が一時的な失敗で、試し直す価値がある）"""
+
+    def __init__(self, message: str, retryable: bool):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+async def run_batch_review_item(item: Dict) -> Dict:
+    """一括再レビューのジョブの1件（ConversationHistoryRequest と同じ形）を総合レビューする"""
+    request = ConversationHistoryRequest.model_validate(item)
+    conversation_list = [entry.model_dump() for entry in request.conversation_history]
+    result = await generate_full_review(conversation_list, request.session_id,
+                                        resolve_full_review_mode(request.mode), batch=True)
+    failed = [section for section in result.get("sections", []) if section["is_error"]]
+    if failed:
+        raise IncompleteReviewError(
+            f"レビューを生成できなかった項目があります: {', '.join(section['title'] for section in failed)}",
+            retryable=all(section["retryable"] for section in failed),
+        )
+    return result
+
+
+def is_retryable_batch_error(error: Exception) -> bool:
+    """
+    一括再レビューの1件の失敗を試し直すか。LLMの一時的な失敗（タイムアウト・接続エラー・レート制限・5xx）だけを試し直し、
+    入力の検証エラーやコンテンツフィルターなど、何度送っても同じ結果になる失敗は試し直さない
+    """
+    if isinstance(error, IncompleteReviewError):
+        return error.retryable
+    return is_transient_llm_error(error)
+
+
+batch_runner = BatchReviewRunner(batch_job_store, run_batch_review_item, retryable=is_retryable_batch_error)
+
+
+def load_batch_job(job_id: str) -> Dict:
+    job = batch_job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="ジョブが見つかりません。")
+    return job
+
+
+def read_batch_review_items(source, default_mode: Optional[str]) -> List[Dict]:
+    """
+    JSONL（1行に1つの ConversationHistoryRequest）を読み込む。
+    形式の誤りがある場合は、行番号を付けて 400 を返す（ジョブは登録しない）
+    """
+    lines = open(source, "rb") if isinstance(source, str) else io.BytesIO(source)
+    items, errors = [], []
+    with lines:
+        for line_no, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                request = ConversationHistoryRequest.model_validate_json(line)
+                if request.mode is None and default_mode is not None:
+                    request.mode = default_mode
+                resolve_full_review_mode(request.mode)
+                items.append(request.model_dump(exclude_none=True))
+            except ValidationError as e:
+                errors.append(f"{line_no}行目: {describe_validation_error(e)}")
+            except HTTPException as e:
+                errors.append(f"{line_no}行目: {e.detail}")
+            if len(errors) >= 10:
+                break
+    if errors:
+        raise HTTPException(status_code=400, detail={"message": "JSONL の形式が正しくありません。", "errors": errors})
+    if not items:
+        raise HTTPException(status_code=400, detail="会話履歴が1件もありません。")
+    return items
+
+
+@app.post("/batch_reviews", status_code=202, summary="会話履歴（JSONL）の一括総合レビューのジョブを登録",
+          openapi_extra=upload_form_schema(mode="各行で mode を省略した場合の生成方法"))
+async def create_batch_review(request: Request):
+    """
+    1行に1つの会話履歴（/get_full_review のリクエストと同じ形）を書いた JSONL を受け取り、
+    総合レビューを並行して生成するジョブを登録して、ジョブIDを返す。
+    mode は各行で mode を省略した場合の生成方法。
+
+    結果は1件ずつ記録するため、処理が中断しても再開時には続きから処理する。
+    進捗は GET /batch_reviews/{job_id}、結果は /results（ポーリング）または /stream（SSE）で取得する。
+    """
+    spool, filename, fields = await receive_upload_or_raise(request, BATCH_REVIEW_MAX_BYTES)
+    try:
+        mode = fields.get("mode") or None
+        if mode is not None:
+            resolve_full_review_mode(mode)
+        items = await asyncio.to_thread(read_batch_review_items, spool.source(), mode)
+    finally:
+        spool.close()
 
+    job_id = await asyncio.to_thread(batch_job_store.create, items, {"mode": mode, "filename": filename})
+    await batch_runner.start(job_id)
+    log_event("batch_review_created", job_id=job_id, items=len(items), filename=filename)
+    return {"job_id": job_id, "total": len(items), "status": JOB_RUNNING}
+
+
+@app.get("/batch_reviews/{job_id}", summary="一括総合レビューのジョブの進捗")
+def get_batch_review(job_id: str):
+    return load_batch_job(job_id)
+
+
+@app.get("/batch_reviews/{job_id}/results", summary="一括総合レビューの結果（ポーリング用）")
+def get_batch_review_results(job_id: str, after: int = Query(-1, description="前回の応答の next（初回は省略）"),
+                             limit: int = Query(100, ge=1, le=1000)):
+    """
+    記録された結果を記録順に返す。応答の next を次の after に指定すると、その後の結果だけを取得できる
+    """
+    job = load_batch_job(job_id)
+    results = batch_job_store.results(job_id, after, limit)
+    return {"job": job, "results": results, "next": results[-1]["seq"] if results else after}
+
+
+@app.get("/batch_reviews/{job_id}/stream", summary="一括総合レビューの結果をSSEで受け取る")
+async def stream_batch_review(job_id: str, after: int = Query(-1)):
+    """
+    結果を記録された順に "result" イベントで送り、進捗を "progress" イベントで送る。
+    ジョブが終わったら（完了・キャンセル）"done" イベントを送る。
+    他のワーカーが処理しているジョブでも受け取れるよう、ストアを一定間隔で確認する。
+    """
+    await asyncio.to_thread(load_batch_job, job_id)
+
+    async def event_stream():
+        last_seq = after
+        while True:
+            job = await asyncio.to_thread(batch_job_store.get, job_id)
+            results = await asyncio.to_thread(batch_job_store.results, job_id, last_seq)
+            for result in results:
+                yield sse_event("result", result)
+            if results:
+                last_seq = results[-1]["seq"]
+                yield sse_event("progress", job)
+            if job["status"] != JOB_RUNNING and not results:
+                yield sse_event("done", job)
+                return
+            await asyncio.sleep(BATCH_REVIEW_POLL_SECONDS)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@app.post("/batch_reviews/{job_id}/resume", summary="一括総合レビューのジョブを再開")
+async def resume_batch_review(job_id: str):
+    """失敗した会話履歴を未処理に戻し、キャンセルしたジョブも含めて続きから処理する"""
+    await asyncio.to_thread(load_batch_job, job_id)
+    reset = await asyncio.to_thread(batch_job_store.resume, job_id)
+    await batch_runner.start(job_id)
+    return {"reset": reset, **await asyncio.to_thread(load_batch_job, job_id)}
+
+
+@app.delete("/batch_reviews/{job_id}", summary="一括総合レビューのジョブをキャンセル")
+async def cancel_batch_review(job_id: str):
+    """処理中のジョブを止める（記録済みの結果は残り、/resume で続きから再開できる）"""
+    await asyncio.to_thread(load_batch_job, job_id)
+    await batch_runner.cancel(job_id)
+    return await asyncio.to_thread(load_batch_job, job_id)
+
+
+@app.get("/healthz", summary="ワーカーが動作しているか（liveness）")
+def get_healthz():
+    return {"status": "ok"}
+
+
+@app.get("/readyz", summary="ワーカーがリクエストを受け付けられるか（readiness）")
+def get_readyz():
+    """
+    起動時の準備（ライブラリの読み込み・LLMへの接続）が終わるまでと、終了処理が始まった後は 503 を返す。
+    ロードバランサーはこのエンドポイントが 200 を返すワーカーにだけリクエストを振り分ける
+    """
+    if worker_state["status"] != "ready":
+        return JSONResponse(status_code=503, content=worker_state)
+    return worker_state
+
+
+@app.get("/skillsheet_cache_stats", summary="スキルシート解析キャッシュの統計")
+def get_skillsheet_cache_stats():
+    """
+    スキルシート解析キャッシュのヒット数・ミス数などを返す
+    """
+    return skillsheet_cache.stats()
+
+
+@app.get("/llm_cache_stats", summary="LLM応答キャッシュの統計")
+def get_llm_cache_stats():
+    """
+    LLM応答キャッシュのヒット数・ミス数などを返す（キャッシュが無効の場合は enabled: false）
+    """
+    llm_cache = get_llm_cache()
+    if llm_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **llm_cache.stats()}
+
+
+@app.get("/llm_usage_stats", summary="LLMのトークン使用量とプロンプトキャッシュの統計")
+def get_llm_usage_stats():
+    """
+    LLM呼び出しのトークン使用量と、プロバイダ側でキャッシュされたプロンプトトークン数を返す
+    """
+    return llm_usage.stats()
+
+
+@app.get("/llm_health", summary="LLMバックエンドの状態（デプロイメント・ヘッジリクエスト・流量制御）")
+def get_llm_health():
+    """
+    デプロイメントごとのサーキットブレーカーの状態・応答時間・処理中の件数・流量制御の待ち行列の長さ（優先度別）と、
+    深掘り質問のヘッジリクエストの基準になるレイテンシを返す。待ち時間の分布は /metrics を参照
+    """
     return {
-        "full_review": review
+        "deployments": get_llm_pool().stats(),
+        "hedge_enabled": LLM_HEDGE_ENABLED,
+        "followup_latency_percentile_s": llm_latency["followup"].percentile(LLM_HEDGE_PERCENTILE),
+        "fallback_enabled": LLM_FALLBACK_ENABLED,
     }
 
 
+@app.get("/metrics", summary="Prometheus 形式のメトリクス")
+def get_metrics():
+    """
+    エンドポイント・スキルシート解析・LLM呼び出しごとのレイテンシ、トークン数、ステージ遷移、エラー件数を返す
+    """
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 @app.get("/get_skillsheet_info", summary="現在保存されているスキルシート情報を取得")
-def get_skillsheet_info():
+def get_skillsheet_info(session_id: Optional[str] = None):
     """
-    現在メモリに保存されているスキルシート情報を返す（デバッグ用）
+    セッションに保存されているスキルシート情報を返す（デバッグ用）
     """
-    global skillsheet_data
+    _, session = load_session(session_id)
+    skillsheet_data = session["skillsheet"]
     return {
         "has_skillsheet": bool(skillsheet_data),
         "preview": skillsheet_data[:300] + "..." if len(skillsheet_data) > 300 else skillsheet_data
@@ -224,4 +1760,6 @@ def get_skillsheet_info():
 
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(app, host="0.0.0.0", port=8000)
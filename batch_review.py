@@ -0,0 +1,373 @@
+"""
+過去の面接の会話履歴をまとめて総合レビューし直すバッチジョブ。
+
+ジョブの入力（会話履歴ごとの1件）と結果は SQLite に1件ずつ記録し（チェックポイント）、
+処理が中断しても、再開時には結果が無いものだけを処理する。
+ジョブを処理するワーカーはリース（一定時間ごとの更新）で決め、更新が途切れたジョブは
+再起動後のプロセスや他のワーカーが引き継ぐ。
+"""
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from observability import BATCH_REVIEW_ITEMS, log_event
+
+# 1つのジョブで同時に処理する会話履歴の数（LLMの流量制御の範囲内で、できるだけ多く並行させる）
+BATCH_REVIEW_CONCURRENCY = int(os.getenv("BATCH_REVIEW_CONCURRENCY", "8"))
+# 1件あたりの試行回数（失敗した場合は間を空けて試し直す）
+BATCH_REVIEW_MAX_ATTEMPTS = int(os.getenv("BATCH_REVIEW_MAX_ATTEMPTS", "3"))
+BATCH_REVIEW_RETRY_BACKOFF = float(os.getenv("BATCH_REVIEW_RETRY_BACKOFF", "2.0"))
+# ジョブを処理しているワーカーが、この秒数を超えて更新しなかった場合は他のワーカーが引き継ぐ
+BATCH_REVIEW_LEASE_SECONDS = float(os.getenv("BATCH_REVIEW_LEASE_SECONDS", "60"))
+
+# ジョブの状態
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_CANCELLED = "cancelled"
+
+
+class BatchJobStore:
+    """バッチジョブと、その会話履歴ごとの入力・結果を保持するストア（SQLite）"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        # テーブルは最初に接続したときに作る（インポートや生成の時点ではファイルを作らない）
+        self._schema_ready = False
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 の接続はスレッドをまたいで共有できないため、スレッドごとに保持する
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if not self._schema_ready:
+                self._create_schema(conn)
+                self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _create_schema(conn: sqlite3.Connection) -> None:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS batch_jobs ("
+            " id TEXT PRIMARY KEY, status TEXT NOT NULL, total INTEGER NOT NULL,"
+            " succeeded INTEGER NOT NULL DEFAULT 0, failed INTEGER NOT NULL DEFAULT 0,"
+            " next_seq INTEGER NOT NULL DEFAULT 0, options TEXT NOT NULL,"
+            " owner TEXT, heartbeat_at REAL, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        # seq は結果を記録した順の番号（ポーリングやストリーミングで、前回以降の結果だけを返すのに使う）
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS batch_job_items ("
+            " job_id TEXT NOT NULL, idx INTEGER NOT NULL, input TEXT NOT NULL, status TEXT NOT NULL,"
+            " result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, elapsed_ms REAL, seq INTEGER,"
+            " PRIMARY KEY (job_id, idx)) WITHOUT ROWID"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_batch_job_items_seq ON batch_job_items (job_id, seq)")
+
+    def _transaction(self, func: Callable[[sqlite3.Connection], Any]) -> Any:
+        conn = self._conn()
+        # BEGIN IMMEDIATE で書き込みロックを先に取り、他のワーカーとの競合を防ぐ
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = func(conn)
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def create(self, items: List[Dict[str, Any]], options: Dict[str, Any]) -> str:
+        """ジョブを登録し、ジョブIDを返す（全ての会話履歴を未処理として登録する）"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+
+        def insert(conn: sqlite3.Connection) -> None:
+            conn.execute(
+                "INSERT INTO batch_jobs (id, status, total, options, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, JOB_RUNNING, len(items), json.dumps(options, ensure_ascii=False), now, now),
+            )
+            conn.executemany(
+                "INSERT INTO batch_job_items (job_id, idx, input, status) VALUES (?, ?, ?, 'pending')",
+                ((job_id, idx, json.dumps(item, ensure_ascii=False)) for idx, item in enumerate(items)),
+            )
+
+        self._transaction(insert)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """ジョブの状態と進捗を返す（無ければ None）"""
+        row = self._conn().execute(
+            "SELECT id, status, total, succeeded, failed, options, owner, created_at, updated_at"
+            " FROM batch_jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job_id, status, total, succeeded, failed, options, owner, created_at, updated_at = row
+        return {
+            "job_id": job_id,
+            "status": status,
+            "total": total,
+            "succeeded": succeeded,
+            "failed": failed,
+            "pending": total - succeeded - failed,
+            "options": json.loads(options),
+            "owner": owner,
+            "created_at": created_at,
+            "updated_at": updated_at,
+        }
+
+    def status(self, job_id: str) -> Optional[str]:
+        row = self._conn().execute("SELECT status FROM batch_jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def pending_indexes(self, job_id: str) -> List[int]:
+        rows = self._conn().execute(
+            "SELECT idx FROM batch_job_items WHERE job_id = ? AND status = 'pending' ORDER BY idx", (job_id,)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def load_input(self, job_id: str, idx: int) -> Dict[str, Any]:
+        row = self._conn().execute(
+            "SELECT input FROM batch_job_items WHERE job_id = ? AND idx = ?", (job_id, idx)
+        ).fetchone()
+        return json.loads(row[0])
+
+    def record_result(self, job_id: str, idx: int, result: Optional[Dict[str, Any]], error: Optional[str],
+                      attempts: int, elapsed_ms: float) -> bool:
+        """
+        1件の結果を記録し、ジョブの進捗を更新する（チェックポイント）。
+        既に他のワーカーが記録していた場合は何もせず False を返す。
+        """
+        def update(conn: sqlite3.Connection) -> bool:
+            seq = conn.execute("SELECT next_seq FROM batch_jobs WHERE id = ?", (job_id,)).fetchone()[0]
+            updated = conn.execute(
+                "UPDATE batch_job_items SET status = ?, result = ?, error = ?, attempts = ?, elapsed_ms = ?, seq = ?"
+                " WHERE job_id = ? AND idx = ? AND status = 'pending'",
+                ("ok" if error is None else "error",
+                 json.dumps(result, ensure_ascii=False) if result is not None else None,
+                 error, attempts, elapsed_ms, seq, job_id, idx),
+            ).rowcount
+            if not updated:
+                return False
+            column = "succeeded" if error is None else "failed"
+            now = time.time()
+            conn.execute(
+                f"UPDATE batch_jobs SET {column} = {column} + 1, next_seq = next_seq + 1, updated_at = ?,"
+                " heartbeat_at = ? WHERE id = ?",
+                (now, now, job_id),
+            )
+            return True
+
+        return self._transaction(update)
+
+    def results(self, job_id: str, after_seq: int = -1, limit: int = 1000) -> List[Dict[str, Any]]:
+        """after_seq より後に記録された結果を、記録した順に返す"""
+        rows = self._conn().execute(
+            "SELECT idx, status, result, error, attempts, elapsed_ms, seq FROM batch_job_items"
+            " WHERE job_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+            (job_id, after_seq, limit),
+        ).fetchall()
+        return [
+            {"index": idx, "status": status, "result": json.loads(result) if result else None, "error": error,
+             "attempts": attempts, "elapsed_ms": elapsed_ms, "seq": seq}
+            for idx, status, result, error, attempts, elapsed_ms, seq in rows
+        ]
+
+    def claim(self, job_id: str, owner: str) -> bool:
+        """処理中のジョブを担当する（他のワーカーのリースが有効な場合は False）"""
+        now = time.time()
+        cursor = self._conn().execute(
+            "UPDATE batch_jobs SET owner = ?, heartbeat_at = ? WHERE id = ? AND status = ?"
+            " AND (owner IS NULL OR owner = ? OR heartbeat_at < ?)",
+            (owner, now, job_id, JOB_RUNNING, owner, now - BATCH_REVIEW_LEASE_SECONDS),
+        )
+        return cursor.rowcount == 1
+
+    def heartbeat(self, job_ids: List[str], owner: str) -> None:
+        if job_ids:
+            self._conn().execute(
+                f"UPDATE batch_jobs SET heartbeat_at = ? WHERE owner = ? AND id IN ({','.join('?' * len(job_ids))})",
+                [time.time(), owner] + job_ids,
+            )
+
+    def release(self, job_ids: List[str], owner: str) -> None:
+        """担当をやめる（プロセスの終了時。処理中のジョブはすぐに他のワーカーが引き継げる）"""
+        if job_ids:
+            self._conn().execute(
+                f"UPDATE batch_jobs SET owner = NULL WHERE owner = ? AND id IN ({','.join('?' * len(job_ids))})",
+                [owner] + job_ids,
+            )
+
+    def orphaned_jobs(self) -> List[str]:
+        """担当のいない（またはリースが切れた）処理中のジョブ"""
+        rows = self._conn().execute(
+            "SELECT id FROM batch_jobs WHERE status = ? AND (owner IS NULL OR heartbeat_at < ?) ORDER BY created_at",
+            (JOB_RUNNING, time.time() - BATCH_REVIEW_LEASE_SECONDS),
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def finish(self, job_id: str) -> Optional[str]:
+        """未処理が残っていなければ完了にする。ジョブの状態を返す"""
+        def update(conn: sqlite3.Connection) -> Optional[str]:
+            conn.execute(
+                "UPDATE batch_jobs SET status = ?, owner = NULL, updated_at = ? WHERE id = ? AND status = ?"
+                " AND NOT EXISTS (SELECT 1 FROM batch_job_items WHERE job_id = ? AND status = 'pending')",
+                (JOB_COMPLETED, time.time(), job_id, JOB_RUNNING, job_id),
+            )
+            row = conn.execute("SELECT status FROM batch_jobs WHERE id = ?", (job_id,)).fetchone()
+            return row[0] if row else None
+
+        return self._transaction(update)
+
+    def cancel(self, job_id: str) -> bool:
+        cursor = self._conn().execute(
+            "UPDATE batch_jobs SET status = ?, owner = NULL, updated_at = ? WHERE id = ? AND status = ?",
+            (JOB_CANCELLED, time.time(), job_id, JOB_RUNNING),
+        )
+        return cursor.rowcount == 1
+
+    def resume(self, job_id: str) -> int:
+        """
+        失敗した会話履歴を未処理に戻し、ジョブを処理中に戻す（キャンセルしたジョブの再開にも使う）。
+        未処理に戻した件数を返す。
+        """
+        def update(conn: sqlite3.Connection) -> int:
+            reset = conn.execute(
+                "UPDATE batch_job_items SET status = 'pending', error = NULL, seq = NULL"
+                " WHERE job_id = ? AND status = 'error'", (job_id,)
+            ).rowcount
+            conn.execute(
+                "UPDATE batch_jobs SET status = ?, failed = failed - ?, owner = NULL, updated_at = ? WHERE id = ?",
+                (JOB_RUNNING, reset, time.time(), job_id),
+            )
+            return reset
+
+        return self._transaction(update)
+
+
+class BatchReviewRunner:
+    """
+    ジョブを処理する。review_fn は会話履歴1件（ConversationHistoryRequest と同じ形の dict）を受け取り、
+    レビュー結果の dict を返す非同期関数。
+    retryable は review_fn の例外が一時的な失敗（試し直せば成功しうるもの）かを返す関数で、
+    それ以外の失敗（入力の検証エラーなど）は試し直さずにその場でエラーとして記録する。
+    ストア（SQLite）の読み書きは、イベントループを止めないようスレッドで実行する。
+    """
+
+    def __init__(self, store: BatchJobStore, review_fn: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+                 concurrency: int = BATCH_REVIEW_CONCURRENCY,
+                 retryable: Callable[[Exception], bool] = lambda error: True):
+        self.store = store
+        self.review_fn = review_fn
+        self.concurrency = concurrency
+        self.retryable = retryable
+        # ワーカー（プロセス）ごとに一意な担当者名
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    async def start(self, job_id: str) -> bool:
+        """ジョブの処理を始める（既にこのプロセスで処理中、または他のワーカーが担当している場合は False）"""
+        if job_id in self._tasks or not await asyncio.to_thread(self.store.claim, job_id, self.owner):
+            return False
+        # 担当を確認している間に、同じジョブの処理を始めていた場合
+        if job_id in self._tasks:
+            return False
+        task = asyncio.create_task(self._run(job_id))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+        return True
+
+    async def _run(self, job_id: str) -> None:
+        pending = await asyncio.to_thread(self.store.pending_indexes, job_id)
+        log_event("batch_review_started", job_id=job_id, pending=len(pending), owner=self.owner)
+        # 全ワーカーで1つの一覧を順に取り出す（未処理の件数が多くてもタスクを作りすぎない）
+        queue = iter(pending)
+
+        async def worker() -> None:
+            for idx in queue:
+                if await asyncio.to_thread(self.store.status, job_id) != JOB_RUNNING:
+                    return
+                await self._process(job_id, idx)
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(pending)) or 1)))
+            status = await asyncio.to_thread(self.store.finish, job_id)
+            log_event("batch_review_finished", job_id=job_id, status=status)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # 記録に失敗した場合などはリースを手放し、次の確認で（このプロセスまたは他のワーカーが）再開する
+            log_event("batch_review_failed", logging.ERROR, job_id=job_id, error=str(e))
+            await asyncio.to_thread(self.store.release, [job_id], self.owner)
+
+    async def _process(self, job_id: str, idx: int) -> None:
+        item = await asyncio.to_thread(self.store.load_input, job_id, idx)
+        start = time.perf_counter()
+        error = None
+        result = None
+        for attempt in range(1, BATCH_REVIEW_MAX_ATTEMPTS + 1):
+            try:
+                result = await self.review_fn(item)
+                error = None
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = str(e) or type(e).__name__
+                if attempt == BATCH_REVIEW_MAX_ATTEMPTS or not self.retryable(e):
+                    break
+                BATCH_REVIEW_ITEMS.labels(outcome="retry").inc()
+                await asyncio.sleep(BATCH_REVIEW_RETRY_BACKOFF * 2 ** (attempt - 1))
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+        if await asyncio.to_thread(self.store.record_result, job_id, idx, result, error, attempt, elapsed_ms):
+            BATCH_REVIEW_ITEMS.labels(outcome="ok" if error is None else "error").inc()
+
+    async def cancel(self, job_id: str) -> bool:
+        cancelled = await asyncio.to_thread(self.store.cancel, job_id)
+        task = self._tasks.get(job_id)
+        if task is not None:
+            task.cancel()
+        return cancelled
+
+    def stats(self) -> Dict[str, Any]:
+        return {"owner": self.owner, "running_jobs": list(self._tasks), "concurrency": self.concurrency}
+
+    async def run_forever(self) -> None:
+        """
+        担当中のジョブのリースを更新し、担当のいないジョブ（中断されたもの）を引き継ぎ続ける
+        （アプリの起動時に開始する）
+        """
+        while True:
+            try:
+                await asyncio.to_thread(self.store.heartbeat, list(self._tasks), self.owner)
+                for job_id in await asyncio.to_thread(self.store.orphaned_jobs):
+                    if await self.start(job_id):
+                        log_event("batch_review_resumed", job_id=job_id, owner=self.owner)
+            except Exception as e:
+                log_event("batch_review_heartbeat_failed", logging.WARNING, error=str(e))
+            await asyncio.sleep(BATCH_REVIEW_LEASE_SECONDS / 3)
+
+    def shutdown(self) -> None:
+        """処理中のジョブを止めて担当を手放す（記録済みの結果はそのまま残り、再起動後に続きから処理する）"""
+        job_ids = list(self._tasks)
+        for task in list(self._tasks.values()):
+            task.cancel()
+        self.store.release(job_ids, self.owner)
+
+
+def create_batch_job_store_from_env() -> BatchJobStore:
+    """
+    環境変数からバッチジョブのストアを生成する。
+
+    BATCH_REVIEW_DB_PATH: SQLite ファイルのパス（複数ワーカーで共有）
+    """
+    return BatchJobStore(os.getenv("BATCH_REVIEW_DB_PATH", "batch_reviews.db"))
@@ -0,0 +1,312 @@
+"""
+面接APIの負荷試験。
+
+N 人の模擬候補者が並行して / → /upload_skillsheet → /generate_next_question（複数ターン）
+→ /get_full_review の順に面接を進め、エンドポイントごとのスループットと
+p50/p95/p99 のレイテンシを計測する。結果は JSON で保存し、--compare で以前の結果と比較できる。
+
+実行例（fake_azure_openai.py と組み合わせて、実際のクォータを使わずに計測する）:
+    python fake_azure_openai.py --port 8100
+    AZURE_OPENAI_ENDPOINT=http://127.0.0.1:8100 AZURE_OPENAI_API_KEY=dummy uvicorn api:app --port 8000
+    python benchmark.py --base-url http://127.0.0.1:8000 --candidates 50 --turns 5
+    python benchmark.py --candidates 50 --turns 5 --compare benchmark_results/<前回の結果>.json
+"""
+import io
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import datetime
+import subprocess
+from collections import defaultdict
+from typing import Dict, Any, List, Optional
+
+import httpx
+
+SAMPLE_COMPANY_INFO = "企業名: サンプル株式会社\n業種: SES\n募集職種: Javaエンジニア\n面接形式: 一次面接（技術）"
+SAMPLE_ANSWERS = [
+    "前職では保険会社向けの基幹システム開発で、詳細設計から結合テストまでを担当しました。",
+    "Spring Boot と Oracle を使い、バッチ処理の性能改善に取り組みました。処理時間を約40%短縮しました。",
+    "5名のチームでサブリーダーとして、進捗管理と新人のレビューを担当しました。",
+    "障害対応では、ログの調査から原因を特定し、再発防止策を手順書にまとめました。",
+    "新しい技術は業務外でも検証環境を作って試すようにしています。",
+]
+
+# 比較時に悪化とみなす p95 の増加率
+REGRESSION_THRESHOLD = 0.10
+
+
+SAMPLE_HEADERS = ["No.", "期間", "プロジェクト名・業務概要", "役割/規模", "サーバーOS", "DB", "FW,MW,ツール等", "使用言語",
+                  "作業工程"]
+SAMPLE_PHASES = ["要件定義", "基本設計", "詳細設計", "実装/テスト", "結合テスト", "保守/運用"]
+
+
+def sample_projects(n_projects: int) -> List[tuple]:
+    """計測用のプロジェクト（No., 期間, 概要, 役割/規模, OS, DB, FW, 言語, ●を付ける工程の番号）を乱数で作る"""
+    rng = random.Random(0)
+    projects = []
+    for p in range(n_projects):
+        year = 2012 + p
+        projects.append((
+            p + 1,
+            f"{year}/04～{year + 1}/03",
+            f"{rng.choice(['保険', '銀行', '物流', '小売'])}業界向けシステム開発 {p + 1}",
+            rng.choice(["PG/5名", "SE/10名", "PL/3名"]),
+            rng.choice(["Linux", "Windows"]),
+            rng.choice(["Oracle", "PostgreSQL", "MySQL"]),
+            rng.choice(["Spring", "Django", "Struts"]),
+            rng.choice(["Java", "Python", "C#"]),
+            [i for i in range(len(SAMPLE_PHASES)) if rng.random() < 0.5],
+        ))
+    return projects
+
+
+def build_sample_skillsheet(n_projects: int = 8, projects: Optional[List[tuple]] = None, row_shift: int = 0,
+                            col_shift: int = 0, certifications=((8, "基本情報技術者"),), phase_names: bool = True) -> bytes:
+    """
+    skillsheet_parser が前提とするレイアウトの、計測用のスキルシート（.xlsx）を作る（テストでも同じものを使う）。
+    projects を省略した場合は sample_projects(n_projects) を使う。
+    プロジェクト欄は row_shift 行下、col_shift 列右にずらし、phase_names=False の場合は工程名の行を省く
+    """
+    import openpyxl
+
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "スキルシート"
+    ws.cell(1, 2, "スキルシート")
+    for col, value in ((2, "やまだ たろう"), (4, "男"), (6, 30), (8, "1995/04/01")):
+        ws.cell(3, col, value)
+    for col, value in ((2, "山田 太郎"), (4, "日本"), (6, "無"), (8, "渋谷駅")):
+        ws.cell(4, col, value)
+    ws.cell(5, 2, "○○大学 情報工学科 卒業")
+    for col, value in certifications:
+        ws.cell(5, col, value)
+    ws.cell(7, 2, "設計から運用まで一貫して担当してきました。")
+
+    top, left = 10 + row_shift, 2 + col_shift
+    for i, header in enumerate(SAMPLE_HEADERS):
+        ws.cell(top, left + i, header)
+    if phase_names:
+        for i, phase in enumerate(SAMPLE_PHASES):
+            ws.cell(top + 1, left + 8 + i, phase)
+    first = top + (2 if phase_names else 1)
+    for p, (*fields, phases) in enumerate(sample_projects(n_projects) if projects is None else projects):
+        for i, value in enumerate(fields):
+            ws.cell(first + p, left + i, value)
+        for i in phases:
+            ws.cell(first + p, left + 8 + i, "●")
+
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """線形補間でパーセンタイルを求める（sorted_values は昇順）"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+class Recorder:
+    """エンドポイントごとのレイテンシとエラー数を記録する"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def call(self, endpoint: str, request) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            response = await request
+        except httpx.HTTPError:
+            self.latencies[endpoint].append((time.perf_counter() - start) * 1000)
+            self.errors[endpoint] += 1
+            return None
+        self.latencies[endpoint].append((time.perf_counter() - start) * 1000)
+        if response.status_code != 200 or self._is_error_body(response):
+            self.errors[endpoint] += 1
+        return response
+
+    @staticmethod
+    def _is_error_body(response: httpx.Response) -> bool:
+        # API はエラー時も 200 で is_error を返すことがある
+        try:
+            body = response.json()
+        except ValueError:
+            return False
+        return isinstance(body, dict) and bool(body.get("is_error"))
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        endpoints = {}
+        for endpoint, values in self.latencies.items():
+            ordered = sorted(values)
+            endpoints[endpoint] = {
+                "count": len(ordered),
+                "errors": self.errors[endpoint],
+                "throughput_rps": round(len(ordered) / elapsed, 3) if elapsed else 0.0,
+                "mean_ms": round(sum(ordered) / len(ordered), 1),
+                "p50_ms": round(percentile(ordered, 0.50), 1),
+                "p95_ms": round(percentile(ordered, 0.95), 1),
+                "p99_ms": round(percentile(ordered, 0.99), 1),
+                "max_ms": round(ordered[-1], 1),
+            }
+        total = sum(len(values) for values in self.latencies.values())
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "total_requests": total,
+            "total_errors": sum(self.errors.values()),
+            "throughput_rps": round(total / elapsed, 3) if elapsed else 0.0,
+            "endpoints": endpoints,
+        }
+
+
+async def run_candidate(client: httpx.AsyncClient, recorder: Recorder, skillsheet: bytes, turns: int,
+                        rng: random.Random) -> None:
+    """1人分の面接を最初から最後まで進める"""
+    response = await recorder.call("/", client.post("/", json={"company_info": SAMPLE_COMPANY_INFO}))
+    if response is None or response.status_code != 200:
+        return
+    started = response.json()
+    session_id = started.get("session_id")
+    question = started["question"]
+
+    await recorder.call("/upload_skillsheet", client.post(
+        "/upload_skillsheet",
+        files={"file": ("skillsheet.xlsx", skillsheet,
+                        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")},
+        data={"session_id": session_id},
+    ))
+
+    history = []
+    for _ in range(turns):
+        answer = rng.choice(SAMPLE_ANSWERS)
+        history += [{"type": "question", "text": question}, {"type": "answer", "text": answer}]
+        response = await recorder.call("/generate_next_question", client.post("/generate_next_question", json={
+            "user_answer": answer,
+            "current_question": question,
+            "company_info": SAMPLE_COMPANY_INFO,
+            "session_id": session_id,
+        }))
+        if response is None or response.status_code != 200:
+            return
+        question = response.json().get("next_question") or question
+
+    await recorder.call("/get_full_review", client.post("/get_full_review", json={
+        "conversation_history": history,
+        "session_id": session_id,
+    }))
+
+
+async def run_benchmark(base_url: str, candidates: int, concurrency: int, turns: int,
+                        timeout: float, seed: int) -> Dict[str, Any]:
+    recorder = Recorder()
+    skillsheet = build_sample_skillsheet()
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        async def candidate(index: int) -> None:
+            async with semaphore:
+                await run_candidate(client, recorder, skillsheet, turns, random.Random(seed + index))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(candidate(i) for i in range(candidates)))
+        elapsed = time.perf_counter() - start
+
+    result = recorder.summary(elapsed)
+    result["candidates_per_s"] = round(candidates / elapsed, 3) if elapsed else 0.0
+    return result
+
+
+def current_version() -> str:
+    """結果に記録するバージョン（git のコミット。取得できない場合は unknown）"""
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_result(result: Dict[str, Any]) -> None:
+    print(f"version: {result['version']}  elapsed: {result['elapsed_s']}s  "
+          f"requests: {result['total_requests']}  errors: {result['total_errors']}  "
+          f"throughput: {result['throughput_rps']} req/s  candidates: {result['candidates_per_s']}/s")
+    print(f"{'endpoint':<26}{'count':>7}{'errors':>8}{'rps':>9}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for endpoint, stats in result["endpoints"].items():
+        print(f"{endpoint:<26}{stats['count']:>7}{stats['errors']:>8}{stats['throughput_rps']:>9.2f}"
+              f"{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}")
+
+
+def compare_results(baseline: Dict[str, Any], result: Dict[str, Any]) -> bool:
+    """以前の結果と比較して表示する。p95 が閾値以上に悪化したエンドポイントがあれば True を返す"""
+    print(f"\ncompare: {baseline.get('version')} -> {result['version']}")
+    regressed = False
+    for endpoint, stats in result["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(endpoint)
+        if not before:
+            continue
+        parts = []
+        for key in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps"):
+            change = (stats[key] - before[key]) / before[key] if before[key] else 0.0
+            parts.append(f"{key} {before[key]} -> {stats[key]} ({change:+.1%})")
+        p95_change = (stats["p95_ms"] - before["p95_ms"]) / before["p95_ms"] if before["p95_ms"] else 0.0
+        mark = ""
+        if p95_change > REGRESSION_THRESHOLD:
+            regressed = True
+            mark = "  <-- regression"
+        print(f"  {endpoint}: " + ", ".join(parts) + mark)
+    return regressed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="面接APIの負荷試験")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--candidates", type=int, default=20, help="模擬候補者の数")
+    parser.add_argument("--concurrency", type=int, default=20, help="同時に面接を進める候補者の数")
+    parser.add_argument("--turns", type=int, default=5, help="1人あたりの /generate_next_question の回数")
+    parser.add_argument("--timeout", type=float, default=120, help="1リクエストあたりのタイムアウト（秒）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--label", default=None, help="結果に記録する名前（省略時は git のコミット）")
+    parser.add_argument("--output-dir", default="benchmark_results")
+    parser.add_argument("--compare", default=None, help="比較する以前の結果ファイル")
+    args = parser.parse_args()
+
+    result = asyncio.run(run_benchmark(args.base_url, args.candidates, args.concurrency, args.turns,
+                                       args.timeout, args.seed))
+    result = {
+        "version": args.label or current_version(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "base_url": args.base_url,
+            "candidates": args.candidates,
+            "concurrency": args.concurrency,
+            "turns": args.turns,
+            "seed": args.seed,
+        },
+        **result,
+    }
+    print_result(result)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(args.output_dir, f"{stamp}-{result['version']}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"\nsaved: {path}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            if compare_results(json.load(f), result):
+                raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+負荷試験用の Azure OpenAI（chat completions）の代替サーバー。
+
+実際のクォータを使わずに api.py の挙動を計測するためのもの。応答までの待ち時間の分布、
+出力トークンの生成速度、エラーの発生率を指定でき、JSONモードとストリーミングにも対応する。
+
+起動例:
+    python fake_azure_openai.py --port 8100 --latency lognormal --latency-median-ms 800 --tokens-per-second 60
+
+api.py 側は AZURE_OPENAI_ENDPOINT=http://127.0.0.1:8100 AZURE_OPENAI_API_KEY=dummy で起動する。
+"""
+import os
+import json
+import time
+import uuid
+import random
+import asyncio
+import hashlib
+import argparse
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, Any, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from token_estimate import estimate_tokens
+
+# 生成する質問・レビューの文例
+SAMPLE_QUESTIONS = [
+    "そのプロジェクトで最も苦労した点と、どのように解決したかを教えてください。",
+    "チーム内でのあなたの役割と、メンバーとの連携方法について詳しく教えてください。",
+    "使用していた技術を選定した理由と、実際に使ってみての評価を教えてください。",
+    "詳細設計の工程で、品質を担保するために工夫したことはありますか？",
+    "障害が発生した際の対応経験について、具体的に教えてください。",
+]
+SAMPLE_REVIEW_SENTENCE = "回答は具体的な経験に基づいており、説得力があります。一方で、結論を先に述べるとより分かりやすくなります。"
+
+# プロンプトキャッシュの対象になる最小トークン数と、キャッシュされる単位
+PROMPT_CACHE_MIN_TOKENS = 1024
+PROMPT_CACHE_BLOCK_TOKENS = 128
+
+
+class FakeConfig:
+    """代替サーバーの設定（コマンドライン引数、または環境変数 FAKE_AOAI_* で指定）"""
+
+    def __init__(self, latency: str = "lognormal", latency_median_ms: float = 500, latency_sigma: float = 0.5,
+                 latency_min_ms: float = 200, latency_max_ms: float = 1500, tokens_per_second: float = 80,
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0, timeout_rate: float = 0.0,
+                 invalid_json_rate: float = 0.0, hang_seconds: float = 120, seed: Optional[int] = None):
+        self.latency = latency
+        self.latency_median_ms = latency_median_ms
+        self.latency_sigma = latency_sigma
+        self.latency_min_ms = latency_min_ms
+        self.latency_max_ms = latency_max_ms
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.timeout_rate = timeout_rate
+        self.invalid_json_rate = invalid_json_rate
+        self.hang_seconds = hang_seconds
+        self.random = random.Random(seed)
+
+    def sample_latency(self) -> float:
+        """最初のトークンまでの待ち時間（秒）を分布から取り出す"""
+        if self.latency == "constant":
+            ms = self.latency_median_ms
+        elif self.latency == "uniform":
+            ms = self.random.uniform(self.latency_min_ms, self.latency_max_ms)
+        elif self.latency == "lognormal":
+            ms = self.latency_median_ms * self.random.lognormvariate(0, self.latency_sigma)
+        else:
+            raise ValueError(f"未対応の分布です: {self.latency}")
+        return ms / 1000
+
+    def token_delay(self) -> float:
+        return 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+
+class PromptCacheSimulator:
+    """
+    プロバイダ側のプロンプトキャッシュを模擬する。
+    最後のメッセージを除いた先頭部分が以前と同じで、一定以上の長さがあればキャッシュされたとみなす。
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._prefixes: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def cached_tokens(self, messages: List[Dict[str, Any]]) -> int:
+        prefix = messages[:-1]
+        prefix_tokens = sum(estimate_tokens(str(m.get("content", ""))) for m in prefix)
+        if prefix_tokens < PROMPT_CACHE_MIN_TOKENS:
+            return 0
+        key = hashlib.sha256(json.dumps(prefix, ensure_ascii=False).encode("utf-8")).hexdigest()
+        with self._lock:
+            hit = key in self._prefixes
+            self._prefixes[key] = None
+            self._prefixes.move_to_end(key)
+            while len(self._prefixes) > self.max_entries:
+                self._prefixes.popitem(last=False)
+        return (prefix_tokens // PROMPT_CACHE_BLOCK_TOKENS) * PROMPT_CACHE_BLOCK_TOKENS if hit else 0
+
+
+def build_output(config: FakeConfig, json_mode: bool, max_tokens: int, messages: List[Dict[str, Any]]) -> str:
+    """
+    応答本文を組み立てる（JSONモードでは {"question": ...} の形式。
+    質問の候補を求めるプロンプトには {"questions": [...]} の形式）
+    """
+    if json_mode:
+        if config.random.random() < config.invalid_json_rate:
+            return '{"question": "途中で途切れた'
+        if messages and '"questions"' in str(messages[0].get("content", "")):
+            count = config.random.randint(2, len(SAMPLE_QUESTIONS))
+            return json.dumps({"questions": config.random.sample(SAMPLE_QUESTIONS, count)}, ensure_ascii=False)
+        return json.dumps({"question": config.random.choice(SAMPLE_QUESTIONS)}, ensure_ascii=False)
+    target = config.random.randint(max(1, max_tokens // 3), max(1, max_tokens))
+    text = ""
+    while estimate_tokens(text) < target:
+        text += SAMPLE_REVIEW_SENTENCE
+    return text[:target]
+
+
+def split_tokens(text: str) -> List[str]:
+    """ストリーミング用に、おおよそ1トークンずつに分割する"""
+    return [text[i:i + 2] for i in range(0, len(text), 2)]
+
+
+def error_response(status: int, code: str, message: str, headers: Optional[Dict[str, str]] = None) -> JSONResponse:
+    return JSONResponse({"error": {"code": code, "message": message}}, status_code=status, headers=headers)
+
+
+def create_app(config: FakeConfig) -> FastAPI:
+    app = FastAPI(title="Fake Azure OpenAI")
+    prompt_cache = PromptCacheSimulator()
+    counters: Counter = Counter()
+
+    @app.post("/openai/deployments/{deployment}/chat/completions")
+    async def chat_completions(deployment: str, request: Request):
+        body = await request.json()
+        counters["requests"] += 1
+
+        # エラーの注入（レート制限、サーバーエラー、応答しない）
+        roll = config.random.random()
+        if roll < config.rate_limit_rate:
+            counters["rate_limited"] += 1
+            return error_response(429, "429", "Rate limit is exceeded.", {"Retry-After": "1"})
+        roll -= config.rate_limit_rate
+        if roll < config.error_rate:
+            counters["errors"] += 1
+            return error_response(500, "InternalServerError", "The server had an error processing your request.")
+        roll -= config.error_rate
+        if roll < config.timeout_rate:
+            counters["timeouts"] += 1
+            await asyncio.sleep(config.hang_seconds)
+
+        messages = body.get("messages", [])
+        json_mode = (body.get("response_format") or {}).get("type") == "json_object"
+        content = build_output(config, json_mode, int(body.get("max_tokens") or 256), messages)
+        prompt_tokens = sum(estimate_tokens(str(m.get("content", ""))) for m in messages)
+        completion_tokens = estimate_tokens(content)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": prompt_cache.cached_tokens(messages)},
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+
+        await asyncio.sleep(config.sample_latency())
+
+        if not body.get("stream"):
+            await asyncio.sleep(config.token_delay() * completion_tokens)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": deployment,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            }
+
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+            data = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": deployment,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+        async def stream():
+            yield chunk({"role": "assistant", "content": ""})
+            for token in split_tokens(content):
+                await asyncio.sleep(config.token_delay())
+                yield chunk({"content": token})
+            yield chunk({}, "stop")
+            if include_usage:
+                data = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                        "model": deployment, "choices": [], "usage": usage}
+                yield f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.get("/fake/stats")
+    def stats():
+        """受け付けたリクエスト数と、注入したエラーの件数"""
+        return dict(counters)
+
+    return app
+
+
+def main() -> None:
+    env = os.getenv
+    parser = argparse.ArgumentParser(description="Azure OpenAI chat completions の負荷試験用代替サーバー")
+    parser.add_argument("--host", default=env("FAKE_AOAI_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(env("FAKE_AOAI_PORT", "8100")))
+    parser.add_argument("--latency", choices=["constant", "uniform", "lognormal"],
+                        default=env("FAKE_AOAI_LATENCY", "lognormal"), help="最初のトークンまでの待ち時間の分布")
+    parser.add_argument("--latency-median-ms", type=float, default=float(env("FAKE_AOAI_LATENCY_MEDIAN_MS", "500")),
+                        help="constant の値、または lognormal の中央値")
+    parser.add_argument("--latency-sigma", type=float, default=float(env("FAKE_AOAI_LATENCY_SIGMA", "0.5")),
+                        help="lognormal のばらつき")
+    parser.add_argument("--latency-min-ms", type=float, default=float(env("FAKE_AOAI_LATENCY_MIN_MS", "200")))
+    parser.add_argument("--latency-max-ms", type=float, default=float(env("FAKE_AOAI_LATENCY_MAX_MS", "1500")))
+    parser.add_argument("--tokens-per-second", type=float, default=float(env("FAKE_AOAI_TOKENS_PER_SECOND", "80")),
+                        help="出力トークンの生成速度（0 で待ち時間なし）")
+    parser.add_argument("--error-rate", type=float, default=float(env("FAKE_AOAI_ERROR_RATE", "0")),
+                        help="500 エラーを返す割合")
+    parser.add_argument("--rate-limit-rate", type=float, default=float(env("FAKE_AOAI_RATE_LIMIT_RATE", "0")),
+                        help="429 エラーを返す割合")
+    parser.add_argument("--timeout-rate", type=float, default=float(env("FAKE_AOAI_TIMEOUT_RATE", "0")),
+                        help="hang-seconds の間応答しない割合")
+    parser.add_argument("--invalid-json-rate", type=float, default=float(env("FAKE_AOAI_INVALID_JSON_RATE", "0")),
+                        help="JSONモードで不正なJSONを返す割合")
+    parser.add_argument("--hang-seconds", type=float, default=float(env("FAKE_AOAI_HANG_SECONDS", "120")))
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = FakeConfig(
+        latency=args.latency,
+        latency_median_ms=args.latency_median_ms,
+        latency_sigma=args.latency_sigma,
+        latency_min_ms=args.latency_min_ms,
+        latency_max_ms=args.latency_max_ms,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        timeout_rate=args.timeout_rate,
+        invalid_json_rate=args.invalid_json_rate,
+        hang_seconds=args.hang_seconds,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
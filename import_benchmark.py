@@ -0,0 +1,154 @@
+"""
+api.py のインポート時間（ワーカーの起動時間）の計測。
+
+新しい Python プロセスで api をインポートする処理を繰り返し、所要時間の中央値・p95 と、
+インポートに時間がかかったモジュールの上位（-X importtime）を表示する。
+初回の利用時に読み込むはずの重いライブラリ（numpy・pandas・openpyxl・xlrd・openai）が
+インポート時に読み込まれていた場合は失敗にする。結果は JSON で保存し、--compare で以前の結果と比較できる。
+
+実行例:
+    python import_benchmark.py --runs 10
+    python import_benchmark.py --runs 10 --compare benchmark_results/<前回の結果>.json
+    python import_benchmark.py --budget-ms 1500   # 中央値が上限を超えたら失敗（CI 用）
+"""
+import os
+import sys
+import json
+import argparse
+import datetime
+import tempfile
+import subprocess
+from typing import Dict, Any, List
+
+from benchmark import REGRESSION_THRESHOLD, current_version, percentile
+
+# インポート時に読み込んではいけないモジュール（最初の解析・LLM呼び出し、または起動時の準備で読み込む）
+LAZY_MODULES = ["numpy", "pandas", "openpyxl", "xlrd", "openai"]
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 子プロセスで実行するコード（インポートの所要時間と、読み込まれた遅延読み込みのモジュールを JSON で出力する）
+_MEASURE_CODE = """
+import sys, json, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"import_ms": elapsed * 1000, "loaded": [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+
+def _run_child(args: List[str], workdir: str) -> subprocess.CompletedProcess:
+    """リポジトリのモジュールを読み込める状態で、作業ディレクトリを分けて Python を実行する（SQLite のファイルを作らないため）"""
+    env = dict(os.environ, PYTHONPATH=REPO_DIR, PYTHONDONTWRITEBYTECODE="1")
+    return subprocess.run([sys.executable, *args], capture_output=True, text=True, cwd=workdir, env=env, check=True)
+
+
+def measure_import(module: str, workdir: str) -> Dict[str, Any]:
+    """新しいプロセスで1回インポートする"""
+    code = _MEASURE_CODE.format(module=module, lazy=LAZY_MODULES)
+    output = _run_child(["-c", code], workdir).stdout.strip().splitlines()
+    return json.loads(output[-1])
+
+
+def slowest_imports(module: str, workdir: str, top: int) -> List[Dict[str, Any]]:
+    """
+    -X importtime の結果から、module が直接インポートしたモジュールを、
+    インポートにかかった時間（そのモジュールがインポートしたものを含む）の長い順に返す
+    """
+    stderr = _run_child(["-X", "importtime", "-c", f"import {module}"], workdir).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # モジュール名の前の空白の数で、インポートの階層がわかる（module 自身が 0、直接インポートしたものが 1）
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            rows.append({"module": name.strip(), "self_ms": int(self_us) / 1000,
+                         "cumulative_ms": int(cumulative_us) / 1000})
+    return sorted(rows, key=lambda row: row["cumulative_ms"], reverse=True)[:top]
+
+
+def run_import_benchmark(module: str, runs: int, top: int) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as workdir:
+        # 1回目は .pyc の作成などを含むため計測に含めない
+        measure_import(module, workdir)
+        samples = [measure_import(module, workdir) for _ in range(runs)]
+        slowest = slowest_imports(module, workdir, top)
+    times = sorted(sample["import_ms"] for sample in samples)
+    loaded = sorted({name for sample in samples for name in sample["loaded"]})
+    return {
+        "module": module,
+        "runs": runs,
+        "import_ms": {
+            "min": round(times[0], 1),
+            "p50": round(percentile(times, 0.50), 1),
+            "p95": round(percentile(times, 0.95), 1),
+            "max": round(times[-1], 1),
+        },
+        "eagerly_loaded": loaded,
+        "slowest_imports": slowest,
+    }
+
+
+def print_result(result: Dict[str, Any]) -> None:
+    stats = result["import_ms"]
+    print(f"version: {result['version']}  module: {result['module']}  runs: {result['runs']}")
+    print(f"import time: p50 {stats['p50']} ms  p95 {stats['p95']} ms  min {stats['min']} ms  max {stats['max']} ms")
+    print(f"{'module':<40}{'cumulative':>12}{'self':>10}")
+    for row in result["slowest_imports"]:
+        print(f"{row['module']:<40}{row['cumulative_ms']:>10.1f}ms{row['self_ms']:>8.1f}ms")
+    if result["eagerly_loaded"]:
+        print(f"\nインポート時に読み込まれた遅延読み込みのモジュール: {', '.join(result['eagerly_loaded'])}")
+
+
+def compare_results(baseline: Dict[str, Any], result: Dict[str, Any]) -> bool:
+    """以前の結果と比較して表示する。中央値が閾値以上に悪化していれば True を返す"""
+    before = baseline["import_ms"]["p50"]
+    after = result["import_ms"]["p50"]
+    change = (after - before) / before if before else 0.0
+    regressed = change > REGRESSION_THRESHOLD
+    print(f"\ncompare: {baseline.get('version')} -> {result['version']}")
+    print(f"  p50 {before} -> {after} ms ({change:+.1%})" + ("  <-- regression" if regressed else ""))
+    return regressed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="api.py のインポート時間の計測")
+    parser.add_argument("--module", default="api")
+    parser.add_argument("--runs", type=int, default=10, help="計測の回数（それぞれ新しいプロセスでインポートする）")
+    parser.add_argument("--top", type=int, default=10, help="表示する、時間がかかったモジュールの数")
+    parser.add_argument("--budget-ms", type=float, default=None, help="中央値の上限（超えたら終了コード 1）")
+    parser.add_argument("--label", default=None, help="結果に記録する名前（省略時は git のコミット）")
+    parser.add_argument("--output-dir", default="benchmark_results")
+    parser.add_argument("--compare", default=None, help="比較する以前の結果ファイル")
+    args = parser.parse_args()
+
+    result = {
+        "version": args.label or current_version(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        **run_import_benchmark(args.module, args.runs, args.top),
+    }
+    print_result(result)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(args.output_dir, f"import-{stamp}-{result['version']}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"\nsaved: {path}")
+
+    failed = bool(result["eagerly_loaded"])
+    if args.budget_ms is not None and result["import_ms"]["p50"] > args.budget_ms:
+        print(f"import time p50 {result['import_ms']['p50']} ms exceeds budget {args.budget_ms} ms")
+        failed = True
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            failed = compare_results(json.load(f), result) or failed
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
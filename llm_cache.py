@@ -0,0 +1,202 @@
+import os
+import re
+import json
+import asyncio
+import time
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from typing import List, Dict, Any, Optional
+
+
+def _normalize_text(text: str) -> str:
+    """全角・半角や空白の違いだけのプロンプトが同じキーになるよう正規化する"""
+    text = unicodedata.normalize("NFKC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def make_cache_key(messages: List[Dict[str, str]], params: Dict[str, Any]) -> str:
+    """正規化したプロンプトとモデルのパラメータからキャッシュキーを作る"""
+    payload = {
+        "messages": [{"role": m["role"], "content": _normalize_text(m["content"])} for m in messages],
+        "params": params,
+    }
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """LLM応答キャッシュの共通インターフェース（TTL と件数の上限を持つ）"""
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        self._set(key, value)
+        self._writes += 1
+        # 上限の確認は書き込みのたびではなく、一定回数ごとに行う
+        if self._writes % 100 == 1:
+            self._prune()
+
+    async def get_async(self, key: str) -> Optional[str]:
+        """get の非同期版（ファイルや SQLite の読み込みはイベントループの外で行う）"""
+        return await asyncio.to_thread(self.get, key)
+
+    async def set_async(self, key: str, value: str) -> None:
+        """set の非同期版（書き込みと上限超過分の削除はイベントループの外で行う）"""
+        await asyncio.to_thread(self.set, key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "ttl_seconds": self.ttl_seconds,
+            "max_entries": self.max_entries,
+        }
+
+    def _get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def _set(self, key: str, value: str) -> None:
+        raise NotImplementedError
+
+    def _prune(self) -> None:
+        raise NotImplementedError
+
+
+class SQLiteLLMCache(LLMResponseCache):
+    """SQLite に保存するキャッシュ（複数ワーカーで共有できる）"""
+
+    def __init__(self, db_path: str, ttl_seconds: float = 86400, max_entries: int = 10000):
+        super().__init__(ttl_seconds, max_entries)
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_created_at ON llm_cache (created_at)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _get(self, key: str) -> Optional[str]:
+        row = self._conn().execute(
+            "SELECT value FROM llm_cache WHERE key = ? AND created_at > ?",
+            (key, time.time() - self.ttl_seconds),
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set(self, key: str, value: str) -> None:
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at) VALUES (?, ?, ?)",
+                (key, value, time.time()),
+            )
+
+    def _prune(self) -> None:
+        with self._conn() as conn:
+            conn.execute("DELETE FROM llm_cache WHERE created_at <= ?", (time.time() - self.ttl_seconds,))
+            conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                " SELECT key FROM llm_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats["backend"] = "sqlite"
+        stats["entries"] = self._conn().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        return stats
+
+
+class FileLLMCache(LLMResponseCache):
+    """ディレクトリにキーごとのファイルとして保存するキャッシュ"""
+
+    def __init__(self, directory: str, ttl_seconds: float = 86400, max_entries: int = 10000):
+        super().__init__(ttl_seconds, max_entries)
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.txt")
+
+    def _get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            if os.path.getmtime(path) <= time.time() - self.ttl_seconds:
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _set(self, key: str, value: str) -> None:
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(value)
+        os.replace(tmp_path, path)
+
+    def _entries(self) -> List[os.DirEntry]:
+        return [e for e in os.scandir(self.directory) if e.name.endswith(".txt")]
+
+    def _prune(self) -> None:
+        entries = sorted(self._entries(), key=lambda e: e.stat().st_mtime, reverse=True)
+        expire_before = time.time() - self.ttl_seconds
+        for i, entry in enumerate(entries):
+            if i >= self.max_entries or entry.stat().st_mtime <= expire_before:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats["backend"] = "file"
+        stats["entries"] = len(self._entries())
+        return stats
+
+
+def create_llm_cache_from_env() -> Optional[LLMResponseCache]:
+    """
+    環境変数からLLM応答キャッシュを生成する（既定では無効）。
+
+    LLM_CACHE_ENABLED:     "true" で有効化（負荷試験・デモ用）
+    LLM_CACHE_BACKEND:     "sqlite"（既定）または "file"
+    LLM_CACHE_PATH:        SQLite ファイル、またはキャッシュ用ディレクトリのパス
+    LLM_CACHE_TTL_SECONDS: 有効期限（秒）
+    LLM_CACHE_MAX_ENTRIES: 保持する件数の上限
+    """
+    if os.getenv("LLM_CACHE_ENABLED", "false").lower() != "true":
+        return None
+    backend = os.getenv("LLM_CACHE_BACKEND", "sqlite").lower()
+    ttl_seconds = float(os.getenv("LLM_CACHE_TTL_SECONDS", "86400"))
+    max_entries = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+    if backend == "file":
+        return FileLLMCache(os.getenv("LLM_CACHE_PATH", "llm_cache"), ttl_seconds, max_entries)
+    if backend == "sqlite":
+        return SQLiteLLMCache(os.getenv("LLM_CACHE_PATH", "llm_cache.db"), ttl_seconds, max_entries)
+    raise ValueError(f"未対応のLLMキャッシュです: {backend}")
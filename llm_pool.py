@@ -0,0 +1,200 @@
+"""
+複数の Azure OpenAI デプロイメント（リージョン・モデル）への振り分け。
+
+デプロイメントごとにサーキットブレーカーと流量制御（TPM/RPM）を持ち、呼び出しのたびに
+指定されたクラス（例: 深掘り質問用の小さいモデル "fast"、総合レビュー用の大きいモデル "large"）の中から、
+正常で、応答時間と処理中の件数から見て最も空いているデプロイメントを選ぶ。
+失敗が続いたデプロイメントは切り離し、一定時間ごとに試しに呼び出して、成功すれば戻す。
+
+設定例（負荷試験用の代替サーバーを2つ起動した場合）:
+    AZURE_OPENAI_DEPLOYMENTS='[
+      {"name": "fake-a", "endpoint": "http://127.0.0.1:8101", "api_key": "dummy", "deployment": "gpt-4o-mini", "class": "fast"},
+      {"name": "fake-b", "endpoint": "http://127.0.0.1:8102", "api_key": "dummy", "deployment": "gpt-4o-mini", "class": "fast"},
+      {"name": "fake-c", "endpoint": "http://127.0.0.1:8103", "api_key": "dummy", "deployment": "gpt-4o", "class": "large"}
+    ]'
+"""
+import os
+import json
+import random
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from llm_resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    TokenBucketLimiter,
+    LLM_CIRCUIT_FAILURE_THRESHOLD,
+    LLM_CIRCUIT_RECOVERY_SECONDS,
+    LLM_RATE_BURST_SECONDS,
+    LLM_RPM_LIMIT,
+    LLM_TPM_LIMIT,
+    per_worker_limit,
+)
+
+# 応答時間の移動平均で、新しい値に掛ける重み
+LLM_POOL_EWMA_ALPHA = float(os.getenv("LLM_POOL_EWMA_ALPHA", "0.2"))
+# どのデプロイメントもまだ応答が無い場合の仮の応答時間（秒）
+LLM_POOL_INITIAL_LATENCY = float(os.getenv("LLM_POOL_INITIAL_LATENCY", "1.0"))
+# 障害とみなせる失敗（接続エラー・429・5xx）の場合に、別のデプロイメントで試す回数の上限（最初の1回を含む）
+LLM_POOL_MAX_ATTEMPTS = int(os.getenv("LLM_POOL_MAX_ATTEMPTS", "2"))
+
+
+class Deployment:
+    """振り分け先の1つのデプロイメントと、その状態（正常性・応答時間・処理中の件数）"""
+
+    def __init__(self, name: str, endpoint: str, api_key: Optional[str], deployment: str,
+                 deployment_class: str = "default", tokens_per_minute: int = 0, requests_per_minute: int = 0):
+        self.name = name
+        self.endpoint = endpoint
+        self.api_key = api_key
+        self.deployment = deployment
+        self.deployment_class = deployment_class
+        self.breaker = CircuitBreaker(name, LLM_CIRCUIT_FAILURE_THRESHOLD, LLM_CIRCUIT_RECOVERY_SECONDS)
+        # クォータはデプロイメントごとに割り当てられるため、流量制御もデプロイメントごとに行う
+        # （クォータは全ワーカーで共有するため、ワーカーの数で割った分をこのプロセスの上限にする）
+        self.limiter = TokenBucketLimiter(per_worker_limit(tokens_per_minute), per_worker_limit(requests_per_minute),
+                                          LLM_RATE_BURST_SECONDS)
+        self.client: Any = None
+        self.in_flight = 0
+        self.latency_ewma: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def score(self, default_latency: float) -> float:
+        """小さいほど空いている（応答時間の移動平均 ×（処理中と待機中の件数 + 1））"""
+        latency = self.latency_ewma if self.latency_ewma is not None else default_latency
+        queued = sum(self.limiter.queue_depth().values())
+        return latency * (self.in_flight + queued + 1)
+
+    def observe_latency(self, seconds: float) -> None:
+        with self._lock:
+            if self.latency_ewma is None:
+                self.latency_ewma = seconds
+            else:
+                self.latency_ewma += LLM_POOL_EWMA_ALPHA * (seconds - self.latency_ewma)
+
+    def begin(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+
+    def end(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "class": self.deployment_class,
+            "deployment": self.deployment,
+            "endpoint": self.endpoint,
+            "in_flight": self.in_flight,
+            "latency_ewma_s": round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+            "circuit_breaker": self.breaker.stats(),
+            "rate_limiter": self.limiter.stats(),
+        }
+
+
+class DeploymentPool:
+    """
+    デプロイメントの集合。choose() で呼び出し先を1つ選ぶ。
+    client_factory はデプロイメントを受け取り、そのデプロイメント用の非同期クライアントを返す（初回の選択時に生成）。
+    """
+
+    def __init__(self, deployments: List[Deployment], client_factory: Callable[[Deployment], Any]):
+        if not deployments:
+            raise ValueError("デプロイメントが1つも設定されていません")
+        self.deployments = deployments
+        self.client_factory = client_factory
+        self._lock = threading.Lock()
+
+    def _candidates(self, deployment_class: Optional[str], exclude: List[Deployment]) -> List[Deployment]:
+        # 指定したクラスのデプロイメントが無い場合（単一デプロイメントの構成など）は全体から選ぶ
+        matched = [d for d in self.deployments if d.deployment_class == deployment_class] or self.deployments
+        return [d for d in matched if d not in exclude]
+
+    def models(self, deployment_class: Optional[str] = None) -> List[str]:
+        """そのクラスの呼び出しを振り分けうるデプロイメント名（重複を除いて昇順）。LLM応答キャッシュのキーに使う"""
+        return sorted({d.deployment for d in self._candidates(deployment_class, [])})
+
+    def prepare(self, deployment: Deployment) -> Deployment:
+        """デプロイメントのクライアントを（まだ無ければ）生成する。起動時に接続を開いておく場合に使う"""
+        return self._with_client(deployment)
+
+    def _with_client(self, deployment: Deployment) -> Deployment:
+        if deployment.client is None:
+            with self._lock:
+                if deployment.client is None:
+                    deployment.client = self.client_factory(deployment)
+        return deployment
+
+    def choose(self, deployment_class: Optional[str] = None, exclude: Optional[List[Deployment]] = None) -> Deployment:
+        """
+        呼び出し先を選ぶ（exclude は失敗したため別のデプロイメントで試す場合に、除外するもの）。
+        切り離し中のデプロイメントは、回復を確認する時刻になったら優先して試しに使う。
+        それ以外は正常なもののうち最も空いているものを選ぶ。全て切り離し中の場合は CircuitOpenError。
+        """
+        candidates = self._candidates(deployment_class, exclude or [])
+        for deployment in candidates:
+            if deployment.breaker.probe_due() and deployment.breaker.allow():
+                return self._with_client(deployment)
+
+        healthy = [d for d in candidates if d.breaker.state == "closed"]
+        if healthy:
+            # 応答時間が未計測のものは、計測済みで最も速いものと同じとみなして振り分ける（計測の機会を作る）。
+            # 同じスコアの場合に特定のデプロイメントへ偏らないよう、乱数で順番を決める
+            measured = [d.latency_ewma for d in healthy if d.latency_ewma is not None]
+            default_latency = min(measured) if measured else LLM_POOL_INITIAL_LATENCY
+            return self._with_client(min(healthy, key=lambda d: (d.score(default_latency), random.random())))
+
+        for deployment in candidates:
+            if deployment.breaker.allow():
+                return self._with_client(deployment)
+        raise CircuitOpenError(
+            f"LLMの呼び出しを一時的に停止しています（{deployment_class or 'default'} の全デプロイメントで障害）"
+        )
+
+    async def close(self) -> None:
+        for deployment in self.deployments:
+            if deployment.client is not None:
+                await deployment.client.close()
+                deployment.client = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {d.name: d.stats() for d in self.deployments}
+
+
+def load_deployments_from_env() -> List[Deployment]:
+    """
+    環境変数からデプロイメントの一覧を読み込む。
+
+    AZURE_OPENAI_DEPLOYMENTS: デプロイメントの一覧（JSON、または JSON ファイルのパス）。各要素のキーは
+        name, endpoint, deployment, class（既定 "default"）, tpm, rpm（既定 0 = 制限なし）,
+        api_key（省略時は api_key_env で指定した環境変数、それも無ければ AZURE_OPENAI_API_KEY）
+    未設定の場合は AZURE_OPENAI_ENDPOINT / AZURE_OPENAI_API_KEY / AZURE_OPENAI_DEPLOYMENT の1つだけを使い、
+    流量制御の上限は LLM_TPM_LIMIT / LLM_RPM_LIMIT とする。
+    """
+    config = os.getenv("AZURE_OPENAI_DEPLOYMENTS", "").strip()
+    if not config:
+        return [Deployment(
+            name="default",
+            endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+            api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+            deployment=os.getenv("AZURE_OPENAI_DEPLOYMENT", "gpt-4o-mini"),
+            tokens_per_minute=LLM_TPM_LIMIT,
+            requests_per_minute=LLM_RPM_LIMIT,
+        )]
+
+    if not config.startswith("["):
+        with open(config, "r", encoding="utf-8") as f:
+            config = f.read()
+    deployments = []
+    for index, item in enumerate(json.loads(config)):
+        api_key = item.get("api_key") or os.getenv(item.get("api_key_env", "AZURE_OPENAI_API_KEY"))
+        deployments.append(Deployment(
+            name=item.get("name") or f"deployment-{index}",
+            endpoint=item["endpoint"],
+            api_key=api_key,
+            deployment=item["deployment"],
+            deployment_class=item.get("class", "default"),
+            tokens_per_minute=int(item.get("tpm", 0)),
+            requests_per_minute=int(item.get("rpm", 0)),
+        ))
+    return deployments
@@ -0,0 +1,363 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from observability import CIRCUIT_STATE, HEDGED_REQUESTS, LLM_QUEUE_DEPTH, LLM_QUEUE_WAIT
+from token_estimate import estimate_tokens
+
+# 連続して失敗したらLLMの呼び出しを止める回数と、止めてから試しに呼び出すまでの秒数
+LLM_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5"))
+LLM_CIRCUIT_RECOVERY_SECONDS = float(os.getenv("LLM_CIRCUIT_RECOVERY_SECONDS", "30"))
+
+# ヘッジリクエスト（応答が遅いときに同じ呼び出しをもう1つ送り、早く返った方を使う）
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+# これまでのレイテンシのこのパーセンタイルを超えたら、2つ目の呼び出しを送る
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+# 2つ目を送るまでの最短の待ち時間（秒）と、パーセンタイルを計算するのに必要な件数
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1.0"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+
+_STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class CircuitOpenError(Exception):
+    """サーキットブレーカーが開いているため、LLMを呼び出さなかった"""
+
+
+class CircuitBreaker:
+    """
+    LLMバックエンドのサーキットブレーカー。
+
+    closed    … 通常どおり呼び出す。連続で failure_threshold 回失敗したら open にする
+    open      … 呼び出さずに CircuitOpenError にする。recovery_seconds 経過後に half_open にする
+    half_open … recovery_seconds ごとに1回だけ試しに呼び出し、成功したら closed、失敗したら open に戻す
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_seconds: float = 30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self._state = "closed"
+        self._consecutive_failures = 0
+        self._next_attempt_at = 0.0
+        self._lock = threading.Lock()
+        self.opened_count = 0
+        self.rejected_count = 0
+        CIRCUIT_STATE.labels(name=name).set(0)
+
+    def _set_state(self, state: str) -> None:
+        self._state = state
+        CIRCUIT_STATE.labels(name=self.name).set(_STATE_VALUES[state])
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def allow(self) -> bool:
+        """呼び出してよいかどうか（half_open では試しの呼び出しを一定間隔で1回だけ許可する）"""
+        with self._lock:
+            if self._state == "closed":
+                return True
+            now = time.monotonic()
+            if now >= self._next_attempt_at:
+                self._set_state("half_open")
+                self._next_attempt_at = now + self.recovery_seconds
+                return True
+            self.rejected_count += 1
+            return False
+
+    def probe_due(self) -> bool:
+        """open の状態で、試しの呼び出しを送ってよい時刻を過ぎているか（状態は変えない）"""
+        with self._lock:
+            return self._state != "closed" and time.monotonic() >= self._next_attempt_at
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._consecutive_failures = 0
+            if self._state != "closed":
+                self._set_state("closed")
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._state == "half_open" or (
+                self._state == "closed" and self._consecutive_failures >= self.failure_threshold
+            ):
+                self._set_state("open")
+                self._next_attempt_at = time.monotonic() + self.recovery_seconds
+                self.opened_count += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._state,
+                "consecutive_failures": self._consecutive_failures,
+                "opened_count": self.opened_count,
+                "rejected_count": self.rejected_count,
+            }
+
+
+class LatencyTracker:
+    """直近の呼び出しのレイテンシを保持し、パーセンタイルを返す"""
+
+    def __init__(self, window: int = 200):
+        self._samples: "deque[float]" = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float, min_samples: int = 1) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < max(min_samples, 1):
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+def hedge_delay(tracker: LatencyTracker) -> Optional[float]:
+    """ヘッジリクエストを送るまでの待ち時間（無効な場合や、計測件数が足りない場合は None）"""
+    if not LLM_HEDGE_ENABLED:
+        return None
+    threshold = tracker.percentile(LLM_HEDGE_PERCENTILE, LLM_HEDGE_MIN_SAMPLES)
+    if threshold is None:
+        return None
+    return max(threshold, LLM_HEDGE_MIN_DELAY)
+
+
+async def run_hedged(factory: Callable[[], Awaitable[Any]], delay: Optional[float],
+                     discard: Optional[Callable[[Any], Awaitable[None]]] = None) -> Any:
+    """
+    factory() の呼び出しが delay 秒以内に終わらなければ、もう1つ同じ呼び出しを送り、先に成功した方を返す。
+    両方失敗した場合は最後の例外を送出する。delay が None の場合はそのまま1回だけ呼び出す。
+    discard を指定すると、成功したが使わなかった結果（ほぼ同時に両方成功した場合や、呼び出し元がキャンセルされた場合）を
+    それに渡して後始末させる（ストリームを閉じるなど）。
+    """
+    if delay is None:
+        return await factory()
+
+    tasks = [asyncio.ensure_future(factory())]
+    winner: Optional[asyncio.Future] = None
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done:
+            winner = tasks[0]
+            return winner.result()
+
+        tasks.append(asyncio.ensure_future(factory()))
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    HEDGED_REQUESTS.labels(winner="hedge" if task is tasks[1] else "primary").inc()
+                    winner = task
+                    return task.result()
+                error = task.exception()
+        HEDGED_REQUESTS.labels(winner="none").inc()
+        raise error
+    finally:
+        # 使わなかった方（呼び出し元がキャンセルされた場合は両方）を止める
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+            elif task is not winner and discard is not None and not task.cancelled() and task.exception() is None:
+                await discard(task.result())
+
+
+# ----------------------------------------------------
+# トークン数を考慮した流量制御（Azure の TPM/RPM クォータ内に収める）
+# ----------------------------------------------------
+# 1分あたりのトークン数・リクエスト数の上限（0 の場合は制限しない）。デプロイメントのクォータに合わせる。
+# 流量制御の状態はプロセスごとに持つため、gunicorn などで複数ワーカーを起動する場合は、
+# 上限を LLM_RATE_LIMIT_WORKERS（既定は WEB_CONCURRENCY、無ければ 1）で割った値を各ワーカーの上限とする
+LLM_TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", "0"))
+LLM_RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", "0"))
+LLM_RATE_LIMIT_WORKERS = max(int(os.getenv("LLM_RATE_LIMIT_WORKERS") or os.getenv("WEB_CONCURRENCY") or "1"), 1)
+# 一度に使える量（バースト）を何秒分にするか。Azure は短い区間でも上限を確認するため、1分より短くする
+LLM_RATE_BURST_SECONDS = float(os.getenv("LLM_RATE_BURST_SECONDS", "10"))
+
+# 優先度（小さいほど先に処理する）
+PRIORITY_INTERACTIVE = 0  # 面接中のターン（深掘り質問・回答の添削）
+PRIORITY_BATCH = 1  # 総合レビュー
+PRIORITY_BACKGROUND = 2  # 会話の要約など、バックグラウンドの処理
+
+
+class _Bucket:
+    """一定の速度で補充されるトークンバケット"""
+
+    def __init__(self, per_minute: int, burst_seconds: float):
+        self.rate = per_minute / 60
+        self.capacity = max(self.rate * burst_seconds, 1.0)
+        self.level = self.capacity
+
+    def refill(self, elapsed: float) -> None:
+        self.level = min(self.capacity, self.level + elapsed * self.rate)
+
+    def wait_time(self, amount: float) -> float:
+        # バケットの容量を超える要求は、満杯になれば通す（永久に待たないように）
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+
+class TokenBucketLimiter:
+    """
+    LLM呼び出しの流量制御。トークン数（TPM）とリクエスト数（RPM）の2つのバケットを持ち、
+    足りない場合は優先度順のキューで待たせる。429 を受けてから再送するのではなく、
+    送る前に待つことで、クォータの上限付近でも一定のスループットを保つ。
+    """
+
+    def __init__(self, tokens_per_minute: int, requests_per_minute: int, burst_seconds: float = 10):
+        self._buckets = []
+        if tokens_per_minute > 0:
+            self._token_bucket = _Bucket(tokens_per_minute, burst_seconds)
+            self._buckets.append(self._token_bucket)
+        else:
+            self._token_bucket = None
+        if requests_per_minute > 0:
+            self._request_bucket = _Bucket(requests_per_minute, burst_seconds)
+            self._buckets.append(self._request_bucket)
+        else:
+            self._request_bucket = None
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        # (優先度, 到着順, 推定トークン数, 待機中の Future)
+        self._waiters: list = []
+        self._sequence = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._buckets)
+
+    def _refill(self) -> float:
+        now = time.monotonic()
+        for bucket in self._buckets:
+            bucket.refill(now - self._updated)
+        self._updated = now
+        return now
+
+    def _wait_time(self, tokens: float, now: float) -> float:
+        wait = max(self._paused_until - now, 0.0)
+        if self._token_bucket is not None:
+            wait = max(wait, self._token_bucket.wait_time(tokens))
+        if self._request_bucket is not None:
+            wait = max(wait, self._request_bucket.wait_time(1))
+        return wait
+
+    def _take(self, tokens: float) -> None:
+        if self._token_bucket is not None:
+            self._token_bucket.level -= min(tokens, self._token_bucket.capacity)
+        if self._request_bucket is not None:
+            self._request_bucket.level -= 1
+
+    def queue_depth(self) -> Dict[int, int]:
+        """優先度ごとの待機中のリクエスト数"""
+        depth: Dict[int, int] = {}
+        for priority, _, _, future in self._waiters:
+            if not future.done():
+                depth[priority] = depth.get(priority, 0) + 1
+        return depth
+
+    def _update_depth_gauge(self) -> None:
+        depth = self.queue_depth()
+        for priority in (PRIORITY_INTERACTIVE, PRIORITY_BATCH, PRIORITY_BACKGROUND):
+            LLM_QUEUE_DEPTH.labels(priority=str(priority)).set(depth.get(priority, 0))
+
+    async def acquire(self, tokens: float, priority: int = PRIORITY_BACKGROUND) -> float:
+        """推定トークン数分の枠が空くまで待つ。待った秒数を返す"""
+        if not self.enabled:
+            return 0.0
+        now = self._refill()
+        if not self._waiters and self._wait_time(tokens, now) <= 0:
+            self._take(tokens)
+            LLM_QUEUE_WAIT.labels(priority=str(priority)).observe(0.0)
+            return 0.0
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), tokens, future))
+        self._update_depth_gauge()
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+        start = time.monotonic()
+        try:
+            await future
+        finally:
+            # 呼び出し元がキャンセルされた場合、枠は使わずにキューから外す（_dispatch が読み飛ばす）
+            future.cancel()
+            self._update_depth_gauge()
+        waited = time.monotonic() - start
+        LLM_QUEUE_WAIT.labels(priority=str(priority)).observe(waited)
+        return waited
+
+    async def _dispatch(self) -> None:
+        """キューの先頭（最も優先度が高く、最も早く到着したもの）から順に枠を割り当てる"""
+        while self._waiters:
+            _, _, tokens, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            now = self._refill()
+            wait = self._wait_time(tokens, now)
+            if wait <= 0:
+                heapq.heappop(self._waiters)
+                self._take(tokens)
+                future.set_result(None)
+                continue
+            # 待っている間に優先度の高いリクエストが来たら、先頭を確認し直す
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+        self._update_depth_gauge()
+
+    def adjust(self, estimated: float, actual: Optional[int]) -> None:
+        """応答の実際のトークン数で、推定との差を戻す（または追加で使う）"""
+        if self._token_bucket is None or actual is None:
+            return
+        self._refill()
+        self._token_bucket.level = min(self._token_bucket.capacity,
+                                       self._token_bucket.level + min(estimated, self._token_bucket.capacity) - actual)
+
+    def pause(self, seconds: float) -> None:
+        """429 を受けた場合、指定された秒数は新しいリクエストを送らない"""
+        if self.enabled:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        self._refill()
+        return {
+            "enabled": self.enabled,
+            "queue_depth": {str(priority): count for priority, count in sorted(self.queue_depth().items())},
+            "available_tokens": round(self._token_bucket.level, 1) if self._token_bucket else None,
+            "available_requests": round(self._request_bucket.level, 1) if self._request_bucket else None,
+            "paused_for_s": round(max(self._paused_until - time.monotonic(), 0.0), 3),
+        }
+
+
+def per_worker_limit(per_minute: int) -> int:
+    """デプロイメント全体の1分あたりの上限を、このワーカープロセスの上限にする（0 は制限なしのまま）"""
+    if per_minute <= 0:
+        return per_minute
+    return max(per_minute // LLM_RATE_LIMIT_WORKERS, 1)
+
+
+def estimate_request_tokens(messages: List[Dict[str, str]], max_tokens: int) -> int:
+    """
+    リクエストが消費するトークン数を送信前に見積もる。
+    Azure のレート制限はプロンプトのトークン数に max_tokens を加えた値で数えるため、同じように数える。
+    """
+    return sum(estimate_tokens(message["content"]) + 4 for message in messages) + max_tokens
@@ -16,8 +16,26 @@ questions_by_stage = {
     # これは例であり、AIのプロンプトで制御されますが、必要に応じてリストも使えます。
     "stage_3_ai_driven": [
         # AIが回答に沿って生成するため、ここではリストは空です
+    ],
+
+    # ステージ3の予備: AIによる質問生成が失敗・遅延した場合に使う深掘り質問
+    "stage_3_fallback": [
+        "先ほどのお話について、ご自身が特に工夫された点を具体的に教えていただけますか？",
+        "その取り組みの中で直面した課題と、どのように乗り越えたかをお聞かせください。",
+        "チームの中でのご自身の役割と、周囲との連携で意識していたことを教えてください。",
+        "その経験から学んだことを、今後どのように活かしたいとお考えですか？",
+        "振り返ってみて、もう一度取り組むとしたら改善したい点はありますか？",
     ]
 }
 
+# スキルシートのプロジェクト情報から作る深掘り質問のテンプレート（ステージ3の予備）
+# {project}: プロジェクト名・業務概要、{language}: 使用言語、{role}: 役割/規模
+FALLBACK_QUESTION_TEMPLATES = [
+    "スキルシートにある「{project}」について、ご担当された範囲と特に工夫された点を教えてください。",
+    "「{project}」では{language}を使われていますが、実務での習熟度や活用方法を具体的に教えてください。",
+    "「{project}」での{role}というお立場で、チーム内で意識されていたことをお聞かせください。",
+    "{language}を使った開発で、苦労された点とその解決方法を教えていただけますか？",
+]
+
 # 最初の質問として使用する固定の質問
 INITIAL_QUESTION = "本日はありがとうございます。まずは簡単に自己紹介をお願いできますでしょうか。"
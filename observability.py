@@ -0,0 +1,212 @@
+import os
+import sys
+import json
+import time
+import queue
+import asyncio
+import atexit
+import logging
+import logging.handlers
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+)
+
+# ----------------------------------------------------
+# Prometheus メトリクス
+# ----------------------------------------------------
+# LLM呼び出しは数秒かかることがあるため、既定より長い区間まで用意する
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+REQUEST_LATENCY = Histogram(
+    "interview_api_request_duration_seconds",
+    "エンドポイントごとのレスポンス時間",
+    ["method", "endpoint", "status"],
+    buckets=_LATENCY_BUCKETS,
+)
+SKILLSHEET_PARSE_LATENCY = Histogram(
+    "interview_skillsheet_parse_duration_seconds",
+    "スキルシートの解析時間（解析用プールでの待ち時間を含む）",
+    ["outcome"],
+    buckets=_LATENCY_BUCKETS,
+)
+LLM_CALL_LATENCY = Histogram(
+    "interview_llm_call_duration_seconds",
+    "LLM呼び出しの所要時間（ストリーミングは最後のチャンクまで）",
+    ["call", "outcome"],
+    buckets=_LATENCY_BUCKETS,
+)
+JSON_DECODE_LATENCY = Histogram(
+    "interview_llm_json_decode_duration_seconds",
+    "LLMの応答（JSON）のデコード時間",
+    ["outcome"],
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01),
+)
+LLM_TOKENS = Counter(
+    "interview_llm_tokens",
+    "LLMのトークン数（kind: prompt / completion / cached）",
+    ["call", "kind"],
+)
+STAGE_TRANSITIONS = Counter(
+    "interview_stage_transitions",
+    "面接ステージの遷移回数",
+    ["from_stage", "to_stage"],
+)
+ERRORS = Counter(
+    "interview_errors",
+    "種類別のエラー件数（json_decode / llm_error / llm_timeout / parse_error など）",
+    ["type"],
+)
+CIRCUIT_STATE = Gauge(
+    "interview_llm_circuit_state",
+    "LLMのサーキットブレーカーの状態（0: closed, 1: half_open, 2: open）",
+    ["name"],
+    multiprocess_mode="max",
+)
+DEPLOYMENT_REQUESTS = Counter(
+    "interview_llm_deployment_requests",
+    "デプロイメントごとのLLM呼び出しの件数（outcome: ok / error / cancelled）",
+    ["deployment", "outcome"],
+)
+HEDGED_REQUESTS = Counter(
+    "interview_llm_hedged_requests",
+    "ヘッジリクエストを送った回数（winner: 先に成功した方。none は両方失敗）",
+    ["winner"],
+)
+LLM_QUEUE_DEPTH = Gauge(
+    "interview_llm_queue_depth",
+    "流量制御で待機中のLLM呼び出しの数（priority: 0=面接中のターン, 1=総合レビュー, 2=バックグラウンド）",
+    ["priority"],
+    multiprocess_mode="livesum",
+)
+LLM_QUEUE_WAIT = Histogram(
+    "interview_llm_queue_wait_seconds",
+    "流量制御でLLM呼び出しが待った時間",
+    ["priority"],
+    buckets=(0, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+QUESTION_POOL_EVENTS = Counter(
+    "interview_question_pool_events",
+    "事前に作った深掘り質問の候補の件数（event: generated / served / fallback_served）と、"
+    "候補を探した結果（event: hit / miss / empty / limit）、候補作成の失敗（event: generation_failed）",
+    ["event"],
+)
+BATCH_REVIEW_ITEMS = Counter(
+    "interview_batch_review_items",
+    "一括再レビューのジョブで処理した会話履歴の件数（outcome: ok / error / retry）",
+    ["outcome"],
+)
+INTERVIEW_WS_CONNECTIONS = Gauge(
+    "interview_ws_connections",
+    "WebSocket で面接中の接続の数",
+)
+INTERVIEW_WS_TURN_LATENCY = Histogram(
+    "interview_ws_turn_duration_seconds",
+    "WebSocket の面接で、回答を受け取ってから次の質問を送り終えるまでの時間",
+    ["outcome"],
+    buckets=_LATENCY_BUCKETS,
+)
+FALLBACK_QUESTIONS = Counter(
+    "interview_fallback_questions",
+    "AIの質問の代わりに質問バンクの質問を返した回数",
+    ["reason"],
+)
+
+
+@contextmanager
+def observe_latency(histogram: Histogram, **labels: str) -> Iterator[Dict[str, str]]:
+    """
+    ブロックの所要時間を、outcome ラベルを持つヒストグラムに記録する。
+    yield した dict の "outcome" を書き換えると、結果のラベルを変えられる
+    （例外時は "error"、期限切れなどでキャンセルされた場合は "cancelled"）。
+    """
+    outcome = {"outcome": "ok"}
+    start = time.perf_counter()
+    try:
+        yield outcome
+    except asyncio.CancelledError:
+        outcome["outcome"] = "cancelled"
+        raise
+    except BaseException:
+        outcome["outcome"] = "error"
+        raise
+    finally:
+        histogram.labels(outcome=outcome["outcome"], **labels).observe(time.perf_counter() - start)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    /metrics の本文と Content-Type を返す。
+    gunicorn などで複数ワーカーを使う場合は PROMETHEUS_MULTIPROC_DIR を設定すると、全ワーカー分を集計する。
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+# ----------------------------------------------------
+# 構造化ログ（1行1JSON）
+# ----------------------------------------------------
+# リクエストを処理するスレッドはキューに積むだけにし、書き出しは別スレッドで行う
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+logger = logging.getLogger("interview_api")
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JSONFormatter(logging.Formatter):
+    """ログを {"ts", "level", "event", ...} の1行のJSONにする"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "event": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging() -> None:
+    """構造化ログの出力を開始する（何度呼んでも1回だけ設定する）"""
+    global _listener
+    if _listener is not None:
+        return
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JSONFormatter())
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    logger.handlers = [logging.handlers.QueueHandler(log_queue)]
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """キューに残っているログを書き出して、出力用のスレッドを止める"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def log_event(event: str, level: int = logging.INFO, **fields: Any) -> None:
+    """イベント名と付随する値を構造化ログとして記録する"""
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields})
@@ -0,0 +1,72 @@
+import os
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from ai_question import generate_question_candidates_async
+from observability import QUESTION_POOL_EVENTS, log_event
+from skillsheet_index import BM25Index, project_keywords
+from skillsheet_parser import format_profile_for_ai, format_project_for_ai
+
+# 質問の候補を作るプロジェクト数の上限（スキルシートの先頭から）と、1件あたりの候補数
+QUESTION_POOL_MAX_PROJECTS = int(os.getenv("QUESTION_POOL_MAX_PROJECTS", "5"))
+QUESTION_POOL_PER_SOURCE = int(os.getenv("QUESTION_POOL_PER_SOURCE", "3"))
+# 1セッションで保持する候補の上限
+QUESTION_POOL_MAX_QUESTIONS = int(os.getenv("QUESTION_POOL_MAX_QUESTIONS", "20"))
+# 候補を作るLLM呼び出しの同時実行数（1つのスキルシートあたり）
+QUESTION_POOL_CONCURRENCY = int(os.getenv("QUESTION_POOL_CONCURRENCY", "2"))
+# 回答との関連の高さ（BM25 のスコア）がこれ未満の候補は使わない
+QUESTION_POOL_MIN_SCORE = float(os.getenv("QUESTION_POOL_MIN_SCORE", "1.0"))
+
+
+def _pool_sources(skillsheet_data: Dict[str, Any]) -> List[Dict[str, str]]:
+    """候補を作る元にする、スキルシートの部分（プロジェクトごと、と経験技術のまとめ）"""
+    projects = (skillsheet_data.get("projects") or [])[:QUESTION_POOL_MAX_PROJECTS]
+    sources = [
+        {"source": f"project:{i}", "text": format_project_for_ai(project, i), "keywords": project_keywords(project)}
+        for i, project in enumerate(projects, 1)
+    ]
+    profile = format_profile_for_ai(skillsheet_data)
+    if profile.strip():
+        sources.append({"source": "skills", "text": profile, "keywords": ""})
+    return sources
+
+
+async def generate_question_pool(skillsheet_data: Dict[str, Any]) -> List[Dict[str, str]]:
+    """
+    スキルシートから深掘り質問の候補を作る。
+    各候補は {"question", "source", "keywords"} で、keywords は回答との関連の高さを測るのに使う
+    （一部の呼び出しが失敗しても、作れた分だけを返す）。
+    """
+    semaphore = asyncio.Semaphore(QUESTION_POOL_CONCURRENCY)
+
+    async def generate(source: Dict[str, str]) -> List[Dict[str, str]]:
+        async with semaphore:
+            try:
+                questions = await generate_question_candidates_async(source["text"], QUESTION_POOL_PER_SOURCE)
+            except Exception as e:
+                QUESTION_POOL_EVENTS.labels(event="generation_failed").inc()
+                log_event("question_pool_generation_failed", logging.WARNING, source=source["source"], error=str(e))
+                return []
+        return [{"question": q, "source": source["source"], "keywords": source["keywords"]} for q in questions]
+
+    results = await asyncio.gather(*(generate(source) for source in _pool_sources(skillsheet_data)))
+    # プロジェクトごとの候補が偏らないよう、各ソースから1つずつ順に取り出して上限まで詰める
+    # （別のプロジェクトから同じ文面の質問ができた場合は1つにする）
+    pool: List[Dict[str, str]] = []
+    seen = set()
+    for position in range(QUESTION_POOL_PER_SOURCE):
+        for candidates in results:
+            if position < len(candidates) and len(pool) < QUESTION_POOL_MAX_QUESTIONS:
+                if candidates[position]["question"] not in seen:
+                    seen.add(candidates[position]["question"])
+                    pool.append(candidates[position])
+    QUESTION_POOL_EVENTS.labels(event="generated").inc(len(pool))
+    return pool
+
+
+def rank_pooled_questions(pool: List[Dict[str, str]], query: str,
+                          exclude: Optional[str] = None) -> List[Tuple[int, float]]:
+    """候補を、直前の質問と回答との関連の高い順に (候補の位置, スコア) で返す（exclude と同じ質問は除く）"""
+    index = BM25Index([f"{item['question']} {item.get('keywords', '')}" for item in pool])
+    return [(i, score) for i, score in index.search(query, len(pool)) if pool[i]["question"] != exclude]
@@ -0,0 +1,134 @@
+import os
+import re
+import threading
+from typing import List, Dict, Optional
+
+# 判断が必要なルール（LLMでの添削が必要なルール）を適用する回答の最小文字数
+REVIEW_JUDGMENT_MIN_CHARS = int(os.getenv("REVIEW_JUDGMENT_MIN_CHARS", "80"))
+
+# 「〜は出さない」「〜は言わない」など、特定の語の使用を禁止するルールの言い回し
+_FORBID_PHRASES = ("出さない", "言わない", "使わない", "口にしない", "触れない")
+
+# 括弧書き（（X）や「X」）で示された語を取り出す
+_QUOTED_TERMS = re.compile(r"[（(「『]([^）)」』]+)[）)」』]")
+
+# 自社の人間に「さん」が付いているもの。
+# 「弊社の（部署や役職の）名前さん」か「上司・先輩・後輩・同僚の名前さん」の形だけを対象にし、
+# 「弊社のお客様の田中さん」「先方の上司の田中さん」のような顧客・取引先の人は対象にしない
+_PERSON_WITH_SAN = r"(?!皆さん)[一-龥ァ-ヶー]{1,6}さん"
+_OWN_COMPANY_HONORIFIC = re.compile(
+    r"(?:弊社|当社|自社|社内|うちの会社|私どもの会社)の?"
+    r"(?!顧客|取引先|お客|客先|クライアント|先方|ユーザー|発注元|元請|協力会社|パートナー|他社)"
+    r"(?:[一-龥ァ-ヶー]{1,8}の)?" + _PERSON_WITH_SAN +
+    r"|(?<!先方の)(?<!顧客の)(?<!お客様の)(?<!取引先の)(?<!客先の)"
+    r"(?:上司|先輩|後輩|同僚)の?" + _PERSON_WITH_SAN
+)
+
+# 勤務環境・待遇についての質問
+_WORK_CONDITION_QUESTION = re.compile(
+    r"(?:残業|勤務時間|休日|休暇|有給|福利厚生|リモート|在宅|テレワーク|給与|年収|手当)"
+    r"[^。\n]{0,20}?(?:ですか|ますか|でしょうか|ありますか|？|\?)"
+)
+
+
+class Rule:
+    """
+    review_rules.txt の1行分のルール。
+
+    kind:
+        "keyword"  … 指定した語が含まれていれば違反
+        "regex"    … 正規表現に一致すれば違反
+        "judgment" … 機械的に判定できないため、LLMで添削する
+    """
+
+    def __init__(self, text: str, kind: str, patterns: Optional[List["re.Pattern"]] = None, message: str = ""):
+        self.text = text
+        self.kind = kind
+        self.patterns = patterns or []
+        self.message = message or text
+
+    def check(self, answer: str) -> List[Dict[str, str]]:
+        violations = []
+        for pattern in self.patterns:
+            match = pattern.search(answer)
+            if match:
+                violations.append({"rule": self.text, "match": match.group(0), "message": self.message})
+        return violations
+
+
+def compile_rule(line: str) -> Rule:
+    """ルール1行を、判定できる形に変換する（判定できないものは judgment ルールにする）"""
+    # 自社の人間に「さん」を付けない
+    if "さん" in line and "付けない" in line and "自社" in line:
+        return Rule(line, "regex", [_OWN_COMPANY_HONORIFIC],
+                    "自社の人間に「さん」を付けないでください。")
+
+    # 特定の語（会社名など）を出さない
+    if any(phrase in line for phrase in _FORBID_PHRASES):
+        terms = [t.strip() for quoted in _QUOTED_TERMS.findall(line) for t in re.split(r"[、・/]", quoted)]
+        terms = [t for t in terms if t]
+        if terms:
+            return Rule(line, "keyword", [re.compile(re.escape(t)) for t in terms],
+                        f"「{'」「'.join(terms)}」は出さないでください。")
+
+    # 勤務環境などを質問しない
+    if "勤務環境" in line and "質問しない" in line:
+        return Rule(line, "regex", [_WORK_CONDITION_QUESTION],
+                    "勤務環境や待遇についての質問は控えてください。")
+
+    return Rule(line, "judgment")
+
+
+class RuleSet:
+    """コンパイル済みのルール一覧"""
+
+    def __init__(self, rules: List[Rule]):
+        self.rules = rules
+        self.local_rules = [rule for rule in rules if rule.kind != "judgment"]
+        self.judgment_rules = [rule for rule in rules if rule.kind == "judgment"]
+        # LLMに渡すのは機械的に判定できないルールだけ
+        self.judgment_rules_text = "\n".join(rule.text for rule in self.judgment_rules)
+
+    def check(self, answer: str) -> List[Dict[str, str]]:
+        """機械的に判定できるルールで回答をチェックし、違反の一覧を返す"""
+        violations = []
+        for rule in self.local_rules:
+            violations.extend(rule.check(answer))
+        return violations
+
+    def needs_judgment(self, answer: str) -> bool:
+        """LLMでの添削が必要かどうか（判断が必要なルールがあり、回答に一定の分量がある場合）"""
+        return bool(self.judgment_rules) and len(answer.strip()) >= REVIEW_JUDGMENT_MIN_CHARS
+
+
+def compile_rules(text: str) -> RuleSet:
+    lines = [line.strip() for line in text.splitlines()]
+    return RuleSet([compile_rule(line) for line in lines if line and not line.startswith("#")])
+
+
+class RuleFileLoader:
+    """
+    ルールファイルを読み込み、コンパイル済みのルールを保持する。
+    ファイルの更新日時（またはサイズ）が変わったときだけ読み込み直す。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._signature = None
+        self._rule_set: Optional[RuleSet] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Optional[RuleSet]:
+        """現在のルールを返す（ファイルが無い場合は None）"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature != self._signature:
+            with self._lock:
+                if signature != self._signature:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        self._rule_set = compile_rules(f.read())
+                    self._signature = signature
+        return self._rule_set
@@ -0,0 +1,256 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple, Callable
+
+
+class SessionStore:
+    """
+    面接セッションの状態を保持するストアの共通インターフェース。
+    状態は JSON にシリアライズ可能な dict で表現する。
+    """
+
+    def create(self, data: Dict[str, Any]) -> str:
+        """新しいセッションを作成し、セッションIDを返す"""
+        session_id = uuid.uuid4().hex
+        self.set(session_id, data)
+        return session_id
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def set(self, session_id: str, data: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def update(self, session_id: str, **fields: Any) -> Optional[Dict[str, Any]]:
+        """
+        指定したフィールドだけを上書きする（存在しないセッションの場合は None）。
+        読み込みと書き込みの間に他のリクエストが割り込まないよう、各実装でアトミックに行う。
+        """
+        return self.update_with(session_id, lambda data: fields)
+
+    def update_with(self, session_id: str,
+                    func: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """
+        現在の状態を func に渡し、func が返したフィールドで上書きする（None を返した場合は変更しない）。
+        リストへの追加など、現在の値に依存する更新をアトミックに行うために使う。
+        """
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> None:
+        raise NotImplementedError
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    プロセス内メモリに保持するLRUストア。
+    TTL（最終アクセスからの秒数）、最大セッション数、合計サイズ（バイト）の上限を持つ。
+    """
+
+    def __init__(self, ttl_seconds: float = 3600, max_sessions: int = 10000, max_bytes: int = 256 * 1024 * 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        # session_id -> (有効期限, データ, 推定サイズ)
+        self._items: "OrderedDict[str, Tuple[float, Dict[str, Any], int]]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _estimate_size(data: Dict[str, Any]) -> int:
+        return len(json.dumps(data, ensure_ascii=False).encode("utf-8"))
+
+    def _pop(self, session_id: str) -> None:
+        _, _, size = self._items.pop(session_id)
+        self._total_bytes -= size
+
+    def _evict(self) -> None:
+        # 期限切れを先に削除し、その後は上限内に収まるまで古いものから削除
+        now = time.time()
+        for session_id in [sid for sid, (expires_at, _, _) in self._items.items() if expires_at <= now]:
+            self._pop(session_id)
+        while self._items and (len(self._items) > self.max_sessions or self._total_bytes > self.max_bytes):
+            self._pop(next(iter(self._items)))
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._items.get(session_id)
+            if item is None:
+                return None
+            expires_at, data, size = item
+            if expires_at <= time.time():
+                self._pop(session_id)
+                return None
+            # アクセスされたセッションは末尾へ移動し、有効期限を延長する
+            self._items[session_id] = (time.time() + self.ttl_seconds, data, size)
+            self._items.move_to_end(session_id)
+            return dict(data)
+
+    def set(self, session_id: str, data: Dict[str, Any]) -> None:
+        size = self._estimate_size(data)
+        with self._lock:
+            if session_id in self._items:
+                self._pop(session_id)
+            self._items[session_id] = (time.time() + self.ttl_seconds, dict(data), size)
+            self._total_bytes += size
+            self._evict()
+
+    def update_with(self, session_id: str,
+                    func: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._items.get(session_id)
+            if item is None or item[0] <= time.time():
+                return None
+            data = dict(item[1])
+            fields = func(dict(data))
+            if fields is None:
+                return data
+            data.update(fields)
+            size = self._estimate_size(data)
+            self._pop(session_id)
+            self._items[session_id] = (time.time() + self.ttl_seconds, data, size)
+            self._total_bytes += size
+            self._evict()
+            return dict(data)
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            if session_id in self._items:
+                self._pop(session_id)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    SQLite に保持するストア。複数のワーカープロセスから同じファイルを共有できる。
+    WALモードで開き、書き込みの競合は busy_timeout で待機する
+    （待機中は呼び出したスレッドが止まるため、非同期の処理からは asyncio.to_thread で呼び出す）。
+    """
+
+    def __init__(self, db_path: str, ttl_seconds: float = 3600, max_sessions: Optional[int] = None,
+                 table: str = "sessions"):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        # テーブル名は呼び出し側の固定値のみを想定（ユーザー入力を渡さないこと）
+        self.table = table
+        self._local = threading.local()
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                " id TEXT PRIMARY KEY,"
+                " data TEXT NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_expires_at ON {table} (expires_at)")
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 の接続はスレッドをまたいで共有できないため、スレッドごとに保持する
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _purge(self, conn: sqlite3.Connection) -> None:
+        conn.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (time.time(),))
+        if self.max_sessions:
+            conn.execute(
+                f"DELETE FROM {self.table} WHERE id IN ("
+                f" SELECT id FROM {self.table} ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_sessions,),
+            )
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        conn = self._conn()
+        now = time.time()
+        row = conn.execute(
+            f"SELECT data FROM {self.table} WHERE id = ? AND expires_at > ?", (session_id, now)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute(f"UPDATE {self.table} SET expires_at = ? WHERE id = ?", (now + self.ttl_seconds, session_id))
+        return json.loads(row[0])
+
+    def set(self, session_id: str, data: Dict[str, Any]) -> None:
+        conn = self._conn()
+        conn.execute(
+            f"INSERT OR REPLACE INTO {self.table} (id, data, expires_at) VALUES (?, ?, ?)",
+            (session_id, json.dumps(data, ensure_ascii=False), time.time() + self.ttl_seconds),
+        )
+        # 新しい行が増えるのは set()（create() も set() を呼ぶ）だけなので、ここで期限切れと上限超過の行を削除する。
+        # 登録済みの企業情報（profiles テーブル）のように create() を通さないデータもこれで削除される
+        self._purge(conn)
+
+    def update_with(self, session_id: str,
+                    func: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        conn = self._conn()
+        # BEGIN IMMEDIATE で書き込みロックを先に取り、他プロセスとの読み書きの競合を防ぐ
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute(
+                f"SELECT data FROM {self.table} WHERE id = ? AND expires_at > ?", (session_id, now)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            data = json.loads(row[0])
+            fields = func(dict(data))
+            if fields is None:
+                conn.execute("COMMIT")
+                return data
+            data.update(fields)
+            conn.execute(
+                f"UPDATE {self.table} SET data = ?, expires_at = ? WHERE id = ?",
+                (json.dumps(data, ensure_ascii=False), now + self.ttl_seconds, session_id),
+            )
+            conn.execute("COMMIT")
+            return data
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, session_id: str) -> None:
+        self._conn().execute(f"DELETE FROM {self.table} WHERE id = ?", (session_id,))
+
+
+def create_session_store_from_env(table: str = "sessions", ttl_seconds: Optional[float] = None) -> SessionStore:
+    """
+    環境変数からセッションストアを生成する。
+    table と ttl_seconds を指定すると、セッション以外のデータ（登録済みの企業情報など）の保存にも使える。
+
+    SESSION_STORE_BACKEND: "memory"（既定）または "sqlite"
+    SESSION_TTL_SECONDS:   最終アクセスからの有効期限（秒）
+    SESSION_MAX_SESSIONS:  保持するセッション数の上限
+    SESSION_MAX_BYTES:     メモリストアの合計サイズ上限（バイト）
+    SESSION_DB_PATH:       SQLite ファイルのパス（複数ワーカーで共有）
+    """
+    backend = os.getenv("SESSION_STORE_BACKEND", "memory").lower()
+    if ttl_seconds is None:
+        ttl_seconds = float(os.getenv("SESSION_TTL_SECONDS", "3600"))
+    max_sessions = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+
+    if backend == "sqlite":
+        return SQLiteSessionStore(
+            os.getenv("SESSION_DB_PATH", "sessions.db"),
+            ttl_seconds=ttl_seconds,
+            max_sessions=max_sessions,
+            table=table,
+        )
+    if backend == "memory":
+        return InMemorySessionStore(
+            ttl_seconds=ttl_seconds,
+            max_sessions=max_sessions,
+            max_bytes=int(os.getenv("SESSION_MAX_BYTES", str(256 * 1024 * 1024))),
+        )
+    raise ValueError(f"未対応のセッションストアです: {backend}")
@@ -0,0 +1,165 @@
+import os
+import json
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple, Union
+
+from observability import log_event
+from skillsheet_parser import PARSER_VERSION, parse_skillsheet_data, parse_skillsheet_data_async, format_skillsheet_for_ai
+
+
+class SkillsheetCache:
+    """
+    スキルシートの解析結果キャッシュ。ファイル内容の SHA-256 をキーにする。
+
+    各エントリは {"data": 構造化データ, "text": AI向けテキスト} を保持し、
+    メモリ上では LRU で件数を制限する。cache_dir を指定するとディスクにも保存し、
+    再起動後や他のワーカーでも再利用できる。
+    """
+
+    def __init__(self, max_entries: int = 256, cache_dir: Optional[str] = None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def hash_bytes(file_bytes: bytes) -> str:
+        return hashlib.sha256(file_bytes).hexdigest()
+
+    def _disk_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    def _load_from_disk(self, digest: str) -> Optional[Dict[str, Any]]:
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._disk_path(digest), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # 解析ロジックが変わった後の古いエントリは使わない
+        if entry.get("parser_version") != PARSER_VERSION:
+            return None
+        return entry
+
+    def _save_to_disk(self, digest: str, entry: Dict[str, Any]) -> None:
+        if not self.cache_dir:
+            return
+        path = self._disk_path(digest)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            # 書き込み途中のファイルを他のワーカーが読まないよう、置き換えで公開する
+            os.replace(tmp_path, path)
+        except OSError as e:
+            log_event("skillsheet_cache_save_failed", logging.WARNING, path=path, error=str(e))
+
+    def _remember(self, digest: str, entry: Dict[str, Any]) -> None:
+        self._entries[digest] = entry
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, digest: str) -> Optional[Dict[str, Any]]:
+        """キャッシュ済みのエントリを返す（無ければ None）"""
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return entry
+
+        entry = self._load_from_disk(digest)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(digest, entry)
+            return entry
+
+    def put(self, digest: str, data: Dict[str, Any], text: str) -> Dict[str, Any]:
+        entry = {"parser_version": PARSER_VERSION, "data": data, "text": text}
+        with self._lock:
+            self._remember(digest, entry)
+        self._save_to_disk(digest, entry)
+        return entry
+
+    async def get_async(self, digest: str) -> Optional[Dict[str, Any]]:
+        """get の非同期版（ディスクに保存している場合は、読み込みをイベントループの外で行う）"""
+        if not self.cache_dir:
+            return self.get(digest)
+        return await asyncio.to_thread(self.get, digest)
+
+    async def put_async(self, digest: str, data: Dict[str, Any], text: str) -> Dict[str, Any]:
+        """put の非同期版（ディスクに保存している場合は、書き込みをイベントループの外で行う）"""
+        if not self.cache_dir:
+            return self.put(digest, data, text)
+        return await asyncio.to_thread(self.put, digest, data, text)
+
+    def get_or_parse(self, file_bytes: bytes, digest: Optional[str] = None) -> Tuple[Dict[str, Any], bool]:
+        """
+        キャッシュにあればそれを返し、無ければ解析してキャッシュに登録する。
+        解析に失敗した場合は例外を送出し、キャッシュには登録しない。
+
+        Returns:
+            (エントリ, キャッシュヒットしたかどうか)
+        """
+        digest = digest or self.hash_bytes(file_bytes)
+        entry = self.get(digest)
+        if entry is not None:
+            return entry, True
+        data = parse_skillsheet_data(file_bytes)
+        return self.put(digest, data, format_skillsheet_for_ai(data)), False
+
+    async def get_or_parse_async(self, source: Union[bytes, str], digest: Optional[str] = None) -> Tuple[Dict[str, Any], bool]:
+        """
+        get_or_parse の非同期版。キャッシュミス時の解析は解析用プールで実行する。
+        source にはファイルのパスも渡せる（その場合は digest が必須。ファイルは書き直さずにそのまま解析する）
+        """
+        if digest is None:
+            if isinstance(source, str):
+                raise ValueError("ファイルのパスを渡す場合は digest を指定してください")
+            digest = self.hash_bytes(source)
+        entry = await self.get_async(digest)
+        if entry is not None:
+            return entry, True
+        data = await parse_skillsheet_data_async(source)
+        return await self.put_async(digest, data, format_skillsheet_for_ai(data)), False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "persistent": bool(self.cache_dir),
+            }
+
+
+def create_skillsheet_cache_from_env() -> SkillsheetCache:
+    """
+    環境変数からキャッシュを生成する。
+
+    SKILLSHEET_CACHE_MAX_ENTRIES: メモリ上に保持する件数の上限
+    SKILLSHEET_CACHE_DIR:         指定するとディスクにも保存する
+    """
+    return SkillsheetCache(
+        max_entries=int(os.getenv("SKILLSHEET_CACHE_MAX_ENTRIES", "256")),
+        cache_dir=os.getenv("SKILLSHEET_CACHE_DIR") or None,
+    )
@@ -0,0 +1,165 @@
+import os
+import re
+import math
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
+from typing import Dict, Any, List, Tuple, Optional
+
+from skillsheet_parser import format_profile_for_ai, format_project_for_ai
+from token_estimate import estimate_tokens
+
+# 深掘り質問のプロンプトに含めるプロジェクト数の上限
+SKILLSHEET_CONTEXT_TOP_K = int(os.getenv("SKILLSHEET_CONTEXT_TOP_K", "3"))
+# スキルシート部分のプロンプトトークン数の上限（推定値）
+SKILLSHEET_PROMPT_TOKEN_BUDGET = int(os.getenv("SKILLSHEET_PROMPT_TOKEN_BUDGET", "1500"))
+
+# 索引の対象にするプロジェクトの項目
+_INDEXED_FIELDS = ("プロジェクト名・業務概要", "役割/規模", "サーバーOS", "DB", "FW/MW/ツール", "使用言語", "担当工程")
+
+# 英数字の単語（C#, C++, .NET なども1語として扱う）と、日本語の連続部分
+_ASCII_WORD = re.compile(r"[a-z0-9][a-z0-9#+.]*")
+_JAPANESE_RUN = re.compile(r"[぀-ヿ㐀-鿿]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    検索用に文字列を語に分割する。
+    英数字は単語単位、日本語は分かち書きが無いため文字の2-gramにする。
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    tokens = _ASCII_WORD.findall(text)
+    for run in _JAPANESE_RUN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def project_keywords(project: Dict[str, Any]) -> str:
+    """プロジェクトの索引対象の項目をつなげた文字列"""
+    return " ".join(str(project[field]) for field in _INDEXED_FIELDS if field in project)
+
+
+class BM25Index:
+    """文字列の一覧に対する BM25 索引"""
+
+    def __init__(self, documents: List[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._doc_terms = [Counter(tokenize(document)) for document in documents]
+        self._doc_lengths = [sum(terms.values()) for terms in self._doc_terms]
+        self._avg_length = (sum(self._doc_lengths) / len(documents)) if documents else 0.0
+        doc_freq = Counter(term for terms in self._doc_terms for term in terms)
+        n = len(documents)
+        self._idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()}
+
+    def score(self, query: str) -> List[float]:
+        """各文書のクエリに対するスコアを、文書の並び順で返す"""
+        query_terms = set(tokenize(query))
+        scores = []
+        for terms, length in zip(self._doc_terms, self._doc_lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / self._avg_length) if self._avg_length else self.k1
+            score = 0.0
+            for term in query_terms:
+                tf = terms.get(term)
+                if tf:
+                    score += self._idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            scores.append(score)
+        return scores
+
+    def search(self, query: str, top_k: int) -> List[Tuple[int, float]]:
+        """スコアの高い順に (文書の位置, スコア) を返す"""
+        scores = self.score(query)
+        ranked = sorted(range(len(scores)), key=lambda i: (-scores[i], i))
+        return [(i, scores[i]) for i in ranked[:top_k]]
+
+
+class ProjectIndex(BM25Index):
+    """スキルシートのプロジェクト一覧に対する BM25 索引"""
+
+    def __init__(self, projects: List[Dict[str, Any]], k1: float = 1.5, b: float = 0.75):
+        super().__init__([project_keywords(p) for p in projects], k1, b)
+        self.projects = projects
+
+
+# スキルシートごとの索引（スキルシートのハッシュがキー）
+_index_cache: "OrderedDict[str, ProjectIndex]" = OrderedDict()
+_index_cache_lock = threading.Lock()
+_INDEX_CACHE_SIZE = 512
+
+
+def get_project_index(skillsheet_key: str, projects: List[Dict[str, Any]]) -> ProjectIndex:
+    """スキルシートの索引を返す（同じスキルシートの索引は作り直さない）"""
+    with _index_cache_lock:
+        index = _index_cache.get(skillsheet_key)
+        if index is not None:
+            _index_cache.move_to_end(skillsheet_key)
+            return index
+    index = ProjectIndex(projects)
+    with _index_cache_lock:
+        _index_cache[skillsheet_key] = index
+        while len(_index_cache) > _INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
+
+
+def _skill_summary(projects: List[Dict[str, Any]]) -> str:
+    """全プロジェクトの技術を種類ごとに集計した要約（選ばれなかったプロジェクトの経験も伝えるため）"""
+    lines = []
+    for field, label in (("使用言語", "言語"), ("DB", "DB"), ("FW/MW/ツール", "ツール"), ("担当工程", "担当工程")):
+        counter = Counter()
+        # 担当工程は「実装/テスト」のように / を含む名前があるため、読点でのみ区切る
+        separator = r"[、,，\n]" if field == "担当工程" else r"[、,，/／\n]"
+        for project in projects:
+            for item in re.split(separator, str(project.get(field, ""))):
+                if item.strip():
+                    counter[item.strip()] += 1
+        if counter:
+            lines.append(f"  {label}: " + ", ".join(f"{name}({count}件)" for name, count in counter.most_common(10)))
+    return "\n".join(lines)
+
+
+def build_skillsheet_context(skillsheet_data: Dict[str, Any], query: str, skillsheet_key: str,
+                             top_k: Optional[int] = None, token_budget: Optional[int] = None) -> str:
+    """
+    深掘り質問のプロンプト用に、スキルシートを必要な部分だけに絞ったテキストを返す。
+
+    全体がトークン予算に収まる場合はそのまま全体を返す。収まらない場合は、
+    プロフィール（基本情報・自己PR・資格・技術の集計）と、質問と回答に関連の高い
+    プロジェクト上位 top_k 件を、予算の範囲内で返す。
+    """
+    top_k = SKILLSHEET_CONTEXT_TOP_K if top_k is None else top_k
+    token_budget = SKILLSHEET_PROMPT_TOKEN_BUDGET if token_budget is None else token_budget
+    projects = skillsheet_data.get("projects") or []
+
+    formatted_projects = [format_project_for_ai(project, i) for i, project in enumerate(projects, 1)]
+    profile = format_profile_for_ai(skillsheet_data)
+    full_text = profile
+    if projects:
+        full_text += "■ プロジェクト経歴\n" + "".join(formatted_projects) + "\n"
+    if estimate_tokens(full_text) <= token_budget:
+        return full_text
+
+    summary = _skill_summary(projects)
+    header = profile
+    if summary:
+        header += f"■ 経験技術の集計（全{len(projects)}件のプロジェクト）\n{summary}\n\n"
+
+    used = estimate_tokens(header)
+    selected = []
+    for position, score in get_project_index(skillsheet_key, projects).search(query, top_k):
+        # 関連の無いプロジェクトは含めない（ただし1件も無い場合は最初の1件を含める）
+        if score <= 0 and selected:
+            break
+        cost = estimate_tokens(formatted_projects[position])
+        if used + cost > token_budget and selected:
+            break
+        selected.append(position)
+        used += cost
+
+    text = header + f"■ 関連するプロジェクト経歴（全{len(projects)}件中{len(selected)}件）\n"
+    # 読みやすさのため、選んだプロジェクトはスキルシート上の順序で並べる
+    text += "".join(formatted_projects[position] for position in sorted(selected))
+    return text + "\n"
@@ -1,7 +1,231 @@
-import pandas as pd
+import os
+import math
+import mmap
+import time
+import asyncio
+import datetime
+import unicodedata
 from io import BytesIO
-from typing import Dict, Any, List
+from contextlib import contextmanager
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import TYPE_CHECKING, BinaryIO, Dict, Any, Iterator, List, Optional, Tuple, Union
 import json
+import logging
+
+from observability import ERRORS, SKILLSHEET_PARSE_LATENCY, log_event, observe_latency
+
+# numpy・pandas・openpyxl・xlrd は読み込みに時間がかかるため、最初の解析（または warm_up_parser）で読み込む
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+# 解析結果の構造（parse_skillsheet_data の戻り値）や、同じファイルの解析結果が変わったら上げる。キャッシュの無効化に使う
+PARSER_VERSION = 3
+
+# Excelの読み込み方式: "openpyxl"（必要な行・列だけを読み取り専用モードで読む）または "pandas"
+SKILLSHEET_PARSER_BACKEND = os.getenv("SKILLSHEET_PARSER_BACKEND", "openpyxl")
+
+# 解析をイベントループの外で実行するプール: "thread" または "process"
+SKILLSHEET_PARSE_EXECUTOR = os.getenv("SKILLSHEET_PARSE_EXECUTOR", "thread")
+SKILLSHEET_PARSE_WORKERS = int(os.getenv("SKILLSHEET_PARSE_WORKERS", str(os.cpu_count() or 1)))
+
+SHEET_NAME = 'スキルシート'
+
+# 読み込む列数の上限。値のある最終列まで読み込み、資格や作業工程の列が右に追加・移動したシートも
+# 取りこぼさないようにする（上限は、書式だけが右端まで設定されたシートで全列を読まないためのもの）
+LAYOUT_MAX_COLUMNS = int(os.getenv("SKILLSHEET_MAX_COLUMNS", "256"))
+
+# プロジェクト欄の見出し行を探す範囲（先頭からの行数）
+PROJECT_HEADER_SEARCH_ROWS = 60
+
+# プロジェクト欄の見出しと解析結果の項目名の対応（見出しにいずれかの文字列を含む列をその項目とみなす）
+PROJECT_HEADER_LABELS = [
+    ("No", ("No",)),
+    ("期間", ("期間",)),
+    ("プロジェクト名・業務概要", ("プロジェクト名", "業務概要")),
+    ("役割/規模", ("役割", "規模")),
+    ("サーバーOS", ("OS",)),
+    ("DB", ("DB",)),
+    ("FW/MW/ツール", ("FW", "MW", "ツール")),
+    ("使用言語", ("使用言語",)),
+]
+# 作業工程の見出し（この列から右が工程ごとの列で、工程名は次の行に書かれている）
+PHASE_HEADER_LABELS = ("作業工程", "担当工程")
+# 工程名の行が無い場合に使う、標準のフォーマットの工程名
+DEFAULT_PHASES = ["要件定義", "基本設計", "詳細設計", "実装/テスト", "結合テスト", "保守/運用"]
+# 見出しが見つからない場合に使う、標準のフォーマットの配置（0始まり。10行目が見出し、12行目からデータ）
+DEFAULT_PROJECT_LAYOUT = {
+    "header_row": 9,
+    "data_start": 11,
+    "columns": {"No": 1, "期間": 2, "プロジェクト名・業務概要": 3, "役割/規模": 4, "サーバーOS": 5, "DB": 6,
+                "FW/MW/ツール": 7, "使用言語": 8},
+    "phase_columns": {9 + i: name for i, name in enumerate(DEFAULT_PHASES)},
+}
+# 担当した工程の欄に付ける印
+_PHASE_MARKS = ("●", "○")
+# 「ー」などで空欄を表す項目
+_DASH_AS_EMPTY_FIELDS = {"サーバーOS", "DB", "FW/MW/ツール"}
+
+# pandas.read_excel が既定で欠損値とみなす文字列（pandas と同じ結果にするため）
+_NA_STRINGS = {
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+}
+
+
+def _isna(value: Any) -> bool:
+    """セル値が欠損かどうか（None と NaN/NaT を欠損とみなす）"""
+    return value is None or value != value
+
+
+def _notna(value: Any) -> bool:
+    return not _isna(value)
+
+
+class SheetGrid:
+    """
+    openpyxl で読み込んだセル値を保持する軽量な表。
+    extract_*_from_format が DataFrame に対して使う操作（len, columns, iloc[row, col]）だけを提供する。
+    """
+
+    def __init__(self, rows: List[List[Any]], n_columns: int):
+        self._rows = rows
+        self.columns = range(n_columns)
+
+    def to_array(self) -> "np.ndarray":
+        """列単位の処理のために2次元の配列にする（dtype=object で、整数が float にならないようにする）"""
+        import numpy as np
+
+        array = np.empty((len(self._rows), len(self.columns)), dtype=object)
+        array[:] = self._rows
+        return array
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def iloc(self) -> "SheetGrid":
+        return self
+
+    def __getitem__(self, key):
+        row_idx, col_idx = key
+        return self._rows[row_idx][col_idx]
+
+
+def _convert_cell(value: Any) -> Any:
+    """openpyxl のセル値を pandas.read_excel と同じ値に変換する"""
+    if isinstance(value, str):
+        return None if value in _NA_STRINGS else value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _build_grid(rows_iter: Iterator[List[Any]]) -> SheetGrid:
+    """
+    変換済みのセル値の行から SheetGrid を作る。
+    行末の空のセルを除いたうえで、最も長い行に合わせて列数をそろえる（pandas.read_excel と同じ）。
+    プロジェクト欄の見出しより後で空行が5行続いた時点で打ち切る
+    （それ以降はプロジェクト欄の終端として extract_projects_from_format でも使わない）。
+    """
+    rows: List[List[Any]] = []
+    header_row = None
+    empty_run = 0
+
+    for row_idx, row in enumerate(rows_iter):
+        while row and row[-1] is None:
+            row.pop()
+        rows.append(row)
+
+        if header_row is None:
+            if _is_project_header(row):
+                header_row = row_idx
+            elif row_idx >= PROJECT_HEADER_SEARCH_ROWS:
+                header_row = DEFAULT_PROJECT_LAYOUT["header_row"]
+            continue
+        if all(_isna(v) or not str(v).strip() for v in row):
+            empty_run += 1
+        else:
+            empty_run = 0
+        # データは見出しの1-2行後から始まり、終端の判定はデータの6行目以降から行う（extract_projects_from_format と同じ）。
+        # ここでは遅い方に合わせ、解析に必要な行を読み飛ばさないようにする
+        if empty_run >= 5 and row_idx - 4 >= header_row + 7:
+            break
+
+    n_columns = max((len(row) for row in rows), default=0)
+    for row in rows:
+        row.extend([None] * (n_columns - len(row)))
+    return SheetGrid(rows, n_columns)
+
+
+def read_skillsheet_grid(source) -> SheetGrid:
+    """
+    スキルシート（.xlsx）を openpyxl の読み取り専用モードで読み込む。
+    A列から値のある最終列まで（最大 LAYOUT_MAX_COLUMNS 列）を保持する。
+
+    Args:
+        source: .xlsx のファイルパスまたはファイルオブジェクト（mmap も可）
+    """
+    import openpyxl
+
+    wb = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        ws = wb[SHEET_NAME]
+        # 読み取り専用モードではファイルに記録された範囲（dimension）を使うが、作成したアプリによっては
+        # 実際より狭いことがあるため使わない（pandas.read_excel と同じ）。行は終わりまで、列は上限まで読む
+        ws.reset_dimensions()
+        rows = ([_convert_cell(v) for v in values]
+                for values in ws.iter_rows(max_col=LAYOUT_MAX_COLUMNS, values_only=True))
+        return _build_grid(rows)
+    finally:
+        wb.close()
+
+
+def _convert_xls_cell(value: Any, cell_type: int, datemode: int) -> Any:
+    """xlrd のセル値を pandas.read_excel（xlrd エンジン）と同じ値に変換する"""
+    import xlrd
+
+    if cell_type == xlrd.XL_CELL_DATE:
+        try:
+            value = xlrd.xldate.xldate_as_datetime(value, datemode)
+        except OverflowError:
+            return value
+        # 日付の部分が基準日のセルは時刻のみとみなす
+        if value.timetuple()[0:3] == ((1904, 1, 1) if datemode else (1899, 12, 31)):
+            return datetime.time(value.hour, value.minute, value.second, value.microsecond)
+        return value
+    if cell_type in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK, xlrd.XL_CELL_ERROR):
+        return None
+    if cell_type == xlrd.XL_CELL_BOOLEAN:
+        return bool(value)
+    if cell_type == xlrd.XL_CELL_NUMBER and math.isfinite(value) and int(value) == value:
+        return int(value)
+    return None if isinstance(value, str) and value in _NA_STRINGS else value
+
+
+def read_skillsheet_grid_xls(contents) -> SheetGrid:
+    """
+    スキルシート（.xls）を xlrd で読み込む（必要なシートだけを読み込み、A列から最終列まで（最大 LAYOUT_MAX_COLUMNS 列）を保持する）。
+
+    Args:
+        contents: ファイルの内容（bytes または mmap。コピーせずにそのまま読む）
+    """
+    import xlrd
+
+    book = xlrd.open_workbook(file_contents=contents, on_demand=True)
+    try:
+        sheet = book.sheet_by_name(SHEET_NAME)
+        n_columns = min(LAYOUT_MAX_COLUMNS, sheet.ncols or LAYOUT_MAX_COLUMNS)
+        rows = (
+            [_convert_xls_cell(value, cell_type, book.datemode)
+             for value, cell_type in zip(sheet.row_values(i, 0, n_columns), sheet.row_types(i, 0, n_columns))]
+            for i in range(sheet.nrows)
+        )
+        return _build_grid(rows)
+    finally:
+        book.release_resources()
+
 
 def parse_skillsheet(file_bytes: bytes) -> str:
     """
@@ -14,29 +238,7 @@ def parse_skillsheet(file_bytes: bytes) -> str:
         str: 構造化されたスキルシート情報（テキスト形式）
     """
     try:
-        excel_file = BytesIO(file_bytes)
-        
-        # 「スキルシート」シートを読み込む（ヘッダーなしで読み込み）
-        df = pd.read_excel(excel_file, sheet_name='スキルシート', header=None)
-        
-        skillsheet_data = {
-            "basic_info": {},
-            "self_pr": "",
-            "certifications": [],
-            "projects": []
-        }
-        
-        # 基本情報の抽出（3-5行目あたり）
-        skillsheet_data["basic_info"] = extract_basic_info_from_format(df)
-        
-        # 自己PRの抽出
-        skillsheet_data["self_pr"] = extract_self_pr_from_format(df)
-        
-        # 資格情報の抽出
-        skillsheet_data["certifications"] = extract_certifications_from_format(df)
-        
-        # プロジェクト情報の抽出（10行目以降）
-        skillsheet_data["projects"] = extract_projects_from_format(df)
+        skillsheet_data = parse_skillsheet_data(file_bytes)
         
         # 構造化されたデータをテキスト形式に整形
         formatted_text = format_skillsheet_for_ai(skillsheet_data)
@@ -47,7 +249,193 @@ def parse_skillsheet(file_bytes: bytes) -> str:
         return f"スキルシート解析エラー: {str(e)}"
 
 
-def extract_basic_info_from_format(df: pd.DataFrame) -> Dict[str, Any]:
+# ファイルの先頭のバイト列（.xlsx は ZIP、.xls は OLE2 の複合ドキュメント）
+_XLSX_SIGNATURE = b"PK\x03\x04"
+_XLS_SIGNATURE = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+
+
+@contextmanager
+def open_skillsheet_source(source: Union[bytes, str]) -> Iterator[Tuple[Union[bytes, mmap.mmap], BinaryIO]]:
+    """
+    解析する内容を (バイト列, ファイルオブジェクト) で返す。
+    パスの場合はファイルを memory-map し、内容をメモリにコピーせずに読む（.xls は xlrd がファイル全体を参照するため mmap のまま渡す）。
+    .xlsx（ZIP）は必要な部分だけを読むため、開いたファイルをそのまま openpyxl / pandas に渡す。
+    """
+    if not isinstance(source, str):
+        yield source, BytesIO(source)
+        return
+    with open(source, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b"", f
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped, f
+
+
+def parse_skillsheet_data(source: Union[bytes, str], backend: Optional[str] = None) -> Dict[str, Any]:
+    """
+    特定フォーマットのスキルシートExcel（.xlsx / .xls）を解析し、テキスト整形前の構造化データを返す
+    （解析に失敗した場合は例外を送出する）
+    
+    Args:
+        source: Excelファイルのバイトデータ、またはファイルのパス（アップロードを一時ファイルに書き出した場合）
+        backend: "openpyxl" または "pandas"（省略時は SKILLSHEET_PARSER_BACKEND）
+        
+    Returns:
+        Dict: basic_info, self_pr, certifications, projects を持つ辞書
+    """
+    backend = backend or SKILLSHEET_PARSER_BACKEND
+    with open_skillsheet_source(source) as (contents, excel_file):
+        # 「スキルシート」シートを読み込む（ヘッダーなしで読み込み）
+        # openpyxl バックエンドでは、.xlsx は openpyxl、.xls は xlrd で必要な範囲だけを読む。それ以外は pandas で読み込む
+        if backend == "openpyxl" and contents[:4] == _XLSX_SIGNATURE:
+            df = read_skillsheet_grid(excel_file)
+        elif backend == "openpyxl" and contents[:8] == _XLS_SIGNATURE:
+            df = read_skillsheet_grid_xls(contents)
+        else:
+            import pandas as pd
+
+            df = pd.read_excel(excel_file, sheet_name=SHEET_NAME, header=None)
+    
+    skillsheet_data = {
+        "basic_info": {},
+        "self_pr": "",
+        "certifications": [],
+        "projects": []
+    }
+    
+    # 基本情報の抽出（3-5行目あたり）
+    skillsheet_data["basic_info"] = extract_basic_info_from_format(df)
+    
+    # 自己PRの抽出
+    skillsheet_data["self_pr"] = extract_self_pr_from_format(df)
+    
+    # 資格情報の抽出
+    skillsheet_data["certifications"] = extract_certifications_from_format(df)
+    
+    # プロジェクト情報の抽出（10行目以降）
+    skillsheet_data["projects"] = extract_projects_from_format(df)
+    
+    return skillsheet_data
+
+
+_parse_executor: Optional[Executor] = None
+_bulk_parse_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_parse_executor() -> Executor:
+    """解析用のプール（スレッドまたはプロセス）を返す（初回呼び出し時に生成）"""
+    global _parse_executor
+    if _parse_executor is None:
+        if SKILLSHEET_PARSE_EXECUTOR == "process":
+            _parse_executor = ProcessPoolExecutor(max_workers=SKILLSHEET_PARSE_WORKERS)
+        else:
+            _parse_executor = ThreadPoolExecutor(max_workers=SKILLSHEET_PARSE_WORKERS,
+                                                 thread_name_prefix="skillsheet-parse")
+    return _parse_executor
+
+
+def get_bulk_parse_executor() -> ProcessPoolExecutor:
+    """一括取り込み用のプロセスプールを返す（CPUコアを並列に使うため常にプロセスプール）"""
+    global _bulk_parse_executor
+    if _bulk_parse_executor is None:
+        _bulk_parse_executor = ProcessPoolExecutor(max_workers=SKILLSHEET_PARSE_WORKERS)
+    return _bulk_parse_executor
+
+
+def preload_parser_backends() -> None:
+    """設定された読み込み方式で使うライブラリを読み込んでおく（.xlsx / .xls 以外を読む pandas は pandas 方式の場合だけ）"""
+    import numpy
+    import openpyxl
+    import xlrd
+
+    if SKILLSHEET_PARSER_BACKEND == "pandas":
+        import pandas
+
+
+def warm_up_parser() -> None:
+    """
+    解析に使うライブラリを読み込み、解析用プールがプロセスの場合はワーカーのプロセスを起動しておく（ワーカーの起動時に呼び出す）。
+    先に親プロセスで読み込むため、fork で起動するプロセスは読み込み済みの状態で始まる
+    """
+    preload_parser_backends()
+    if SKILLSHEET_PARSE_EXECUTOR == "process":
+        executor = get_parse_executor()
+        for future in [executor.submit(preload_parser_backends) for _ in range(SKILLSHEET_PARSE_WORKERS)]:
+            future.result()
+
+
+def shutdown_parse_executor() -> None:
+    global _parse_executor, _bulk_parse_executor
+    if _parse_executor is not None:
+        _parse_executor.shutdown(wait=False, cancel_futures=True)
+        _parse_executor = None
+    if _bulk_parse_executor is not None:
+        _bulk_parse_executor.shutdown(wait=False, cancel_futures=True)
+        _bulk_parse_executor = None
+
+
+async def parse_skillsheet_data_async(source: Union[bytes, str]) -> Dict[str, Any]:
+    """
+    parse_skillsheet_data をプール上で実行する（イベントループをブロックしない）。
+    source にパスを渡した場合は、プロセスプールでも内容をコピーせずにワーカー側で読み込む
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        with observe_latency(SKILLSHEET_PARSE_LATENCY):
+            return await loop.run_in_executor(get_parse_executor(), parse_skillsheet_data, source)
+    except Exception:
+        ERRORS.labels(type="parse_error").inc()
+        raise
+
+
+def parse_skillsheet_job(filename: str, file_bytes: bytes) -> Dict[str, Any]:
+    """
+    一括取り込み用に1ファイルを解析する（プロセスプール上で実行される）。
+    解析に失敗しても例外は送出せず、status="error" の結果を返す。
+    """
+    start = time.perf_counter()
+    try:
+        data = parse_skillsheet_data(file_bytes)
+        return {
+            "filename": filename,
+            "status": "ok",
+            "data": data,
+            "text": format_skillsheet_for_ai(data),
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+    except Exception as e:
+        return {
+            "filename": filename,
+            "status": "error",
+            "error": f"スキルシート解析エラー: {str(e)}",
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+
+
+async def parse_skillsheet_job_async(filename: str, file_bytes: bytes) -> Dict[str, Any]:
+    """parse_skillsheet_job を一括取り込み用のプロセスプールで実行する"""
+    global _bulk_parse_executor
+    loop = asyncio.get_running_loop()
+    executor = get_bulk_parse_executor()
+    try:
+        with observe_latency(SKILLSHEET_PARSE_LATENCY) as outcome:
+            result = await loop.run_in_executor(executor, parse_skillsheet_job, filename, file_bytes)
+            if result["status"] != "ok":
+                outcome["outcome"] = "error"
+                ERRORS.labels(type="parse_error").inc()
+            return result
+    except BrokenProcessPool as e:
+        ERRORS.labels(type="parse_error").inc()
+        # ワーカープロセスが異常終了した場合はプールを作り直し、このファイルだけをエラーにする
+        if _bulk_parse_executor is executor:
+            _bulk_parse_executor = None
+            executor.shutdown(wait=False)
+        return {"filename": filename, "status": "error", "error": f"解析プロセスが異常終了しました: {e}",
+                "elapsed_ms": None}
+
+
+def extract_basic_info_from_format(df: "pd.DataFrame") -> Dict[str, Any]:
     """
     特定フォーマットから基本情報を抽出
     Row 3: ふりがな、性別、年齢、生年月日
@@ -59,44 +447,44 @@ def extract_basic_info_from_format(df: pd.DataFrame) -> Dict[str, Any]:
     try:
         # 3行目（インデックス2）: ふりがな
         if len(df) > 2:
-            furigana = df.iloc[2, 1] if pd.notna(df.iloc[2, 1]) else ""
+            furigana = df.iloc[2, 1] if _notna(df.iloc[2, 1]) else ""
             basic_info["ふりがな"] = str(furigana)
             
-            gender = df.iloc[2, 3] if pd.notna(df.iloc[2, 3]) else ""
+            gender = df.iloc[2, 3] if _notna(df.iloc[2, 3]) else ""
             basic_info["性別"] = str(gender)
             
-            age = df.iloc[2, 5] if pd.notna(df.iloc[2, 5]) else ""
+            age = df.iloc[2, 5] if _notna(df.iloc[2, 5]) else ""
             basic_info["年齢"] = str(age)
             
-            birth_date = df.iloc[2, 7] if pd.notna(df.iloc[2, 7]) else ""
+            birth_date = df.iloc[2, 7] if _notna(df.iloc[2, 7]) else ""
             basic_info["生年月日"] = str(birth_date)
         
         # 4行目（インデックス3）: 氏名
         if len(df) > 3:
-            name = df.iloc[3, 1] if pd.notna(df.iloc[3, 1]) else ""
+            name = df.iloc[3, 1] if _notna(df.iloc[3, 1]) else ""
             basic_info["氏名"] = str(name)
             
-            nationality = df.iloc[3, 3] if pd.notna(df.iloc[3, 3]) else ""
+            nationality = df.iloc[3, 3] if _notna(df.iloc[3, 3]) else ""
             basic_info["国籍"] = str(nationality)
             
-            spouse = df.iloc[3, 5] if pd.notna(df.iloc[3, 5]) else ""
+            spouse = df.iloc[3, 5] if _notna(df.iloc[3, 5]) else ""
             basic_info["配偶者"] = str(spouse)
             
-            station = df.iloc[3, 7] if pd.notna(df.iloc[3, 7]) else ""
+            station = df.iloc[3, 7] if _notna(df.iloc[3, 7]) else ""
             basic_info["最寄駅"] = str(station)
         
         # 5行目（インデックス4）: 学歴
         if len(df) > 4:
-            education = df.iloc[4, 1] if pd.notna(df.iloc[4, 1]) else ""
+            education = df.iloc[4, 1] if _notna(df.iloc[4, 1]) else ""
             basic_info["学歴"] = str(education)
             
     except Exception as e:
-        print(f"基本情報抽出エラー: {e}")
+        log_event("skillsheet_extract_failed", logging.WARNING, section="basic_info", error=str(e))
     
     return basic_info
 
 
-def extract_self_pr_from_format(df: pd.DataFrame) -> str:
+def extract_self_pr_from_format(df: "pd.DataFrame") -> str:
     """
     自己PR欄を抽出（7-8行目あたり）
     """
@@ -107,17 +495,17 @@ def extract_self_pr_from_format(df: pd.DataFrame) -> str:
         for row_idx in range(6, 9):  # 7-9行目をチェック
             if len(df) > row_idx:
                 # B列あたりに自己PRが記載されている
-                pr_text = df.iloc[row_idx, 1] if pd.notna(df.iloc[row_idx, 1]) else ""
+                pr_text = df.iloc[row_idx, 1] if _notna(df.iloc[row_idx, 1]) else ""
                 if pr_text and str(pr_text).strip():
                     self_pr += str(pr_text) + " "
                     
     except Exception as e:
-        print(f"自己PR抽出エラー: {e}")
+        log_event("skillsheet_extract_failed", logging.WARNING, section="self_pr", error=str(e))
     
     return self_pr.strip()
 
 
-def extract_certifications_from_format(df: pd.DataFrame) -> List[str]:
+def extract_certifications_from_format(df: "pd.DataFrame") -> List[str]:
     """
     資格情報を抽出（5行目の取得年月・資格欄）
     """
@@ -128,23 +516,110 @@ def extract_certifications_from_format(df: pd.DataFrame) -> List[str]:
         if len(df) > 4:
             for col_idx in range(7, len(df.columns)):
                 cert = df.iloc[4, col_idx]
-                if pd.notna(cert) and str(cert).strip() and str(cert) != "資格":
+                if _notna(cert) and str(cert).strip() and str(cert) != "資格":
                     # 取得年月と資格名を結合
-                    acquisition_date = df.iloc[4, 6] if col_idx == 7 and pd.notna(df.iloc[4, 6]) else ""
+                    acquisition_date = df.iloc[4, 6] if col_idx == 7 and _notna(df.iloc[4, 6]) else ""
                     cert_text = f"{acquisition_date} {cert}".strip() if acquisition_date else str(cert)
                     certifications.append(cert_text)
                     
     except Exception as e:
-        print(f"資格抽出エラー: {e}")
+        log_event("skillsheet_extract_failed", logging.WARNING, section="certifications", error=str(e))
     
     return certifications
 
 
-def extract_projects_from_format(df: pd.DataFrame) -> List[Dict[str, Any]]:
+def _normalize_label(value: Any) -> str:
+    """見出しの比較用に、全角・半角と空白の違いをなくす"""
+    if _isna(value):
+        return ""
+    return "".join(unicodedata.normalize("NFKC", str(value)).split())
+
+
+def _is_project_header(row: List[Any]) -> bool:
+    """プロジェクト欄の見出し行か（使用言語と作業工程の見出しがあり、他の項目の見出しも2つ以上ある）"""
+    labels = [_normalize_label(v) for v in row]
+    has_language = any("使用言語" in label for label in labels)
+    has_phase = any(any(name in label for name in PHASE_HEADER_LABELS) for label in labels)
+    matched = sum(1 for _, keywords in PROJECT_HEADER_LABELS
+                  if any(any(k in label for k in keywords) for label in labels))
+    return has_language and has_phase and matched >= 4
+
+
+def detect_project_layout(cells: "np.ndarray") -> Dict[str, Any]:
     """
-    プロジェクト情報を抽出（11行目以降）
-    
-    列の構造:
+    プロジェクト欄の見出し行を探し、見出しの文字列から各項目の列と作業工程の列を決める。
+    見出しが見つからない場合は標準のフォーマットの配置（DEFAULT_PROJECT_LAYOUT）を返す。
+
+    Returns:
+        Dict: header_row（見出し行）, data_start（データの開始行）,
+              columns（項目名 -> 列）, phase_columns（列 -> 工程名）
+    """
+    header_row = None
+    for row_idx in range(min(len(cells), PROJECT_HEADER_SEARCH_ROWS)):
+        if _is_project_header(cells[row_idx]):
+            header_row = row_idx
+            break
+    if header_row is None:
+        return DEFAULT_PROJECT_LAYOUT
+
+    labels = [_normalize_label(v) for v in cells[header_row]]
+    columns: Dict[str, int] = {}
+    phase_start = None
+    for col_idx, label in enumerate(labels):
+        if not label:
+            continue
+        if phase_start is None and any(name in label for name in PHASE_HEADER_LABELS):
+            phase_start = col_idx
+            continue
+        for field, keywords in PROJECT_HEADER_LABELS:
+            if field not in columns and any(k in label for k in keywords):
+                columns[field] = col_idx
+                break
+
+    # No. の見出しが無い場合は、最初の項目の1つ左の列を No. とみなす
+    columns.setdefault("No", max(min(columns.values(), default=1) - 1, 0))
+
+    # 作業工程の見出しの次の行に工程名があればそれを使い、データはその次の行から始まる。
+    # 次の行が1件目のプロジェクト（No. がある、または工程欄に●などの印がある）の場合は工程名の行とみなさない
+    phase_columns: Dict[int, str] = {}
+    data_start = header_row + 1
+    if header_row + 1 < len(cells):
+        sub_header = cells[header_row + 1]
+        names = {col_idx: str(sub_header[col_idx]).strip() for col_idx in range(phase_start, len(sub_header))
+                 if _notna(sub_header[col_idx]) and str(sub_header[col_idx]).strip()}
+        has_number = _notna(sub_header[columns["No"]]) and str(sub_header[columns["No"]]).strip()
+        if names and not has_number and not any(name in _PHASE_MARKS for name in names.values()):
+            phase_columns = names
+            data_start = header_row + 2
+    if not phase_columns:
+        phase_columns = {phase_start + i: name for i, name in enumerate(DEFAULT_PHASES)
+                         if phase_start + i < cells.shape[1]}
+
+    return {"header_row": header_row, "data_start": data_start, "columns": columns, "phase_columns": phase_columns}
+
+
+def _as_array(df) -> "np.ndarray":
+    """DataFrame / SheetGrid のセル値を2次元の配列（dtype=object）にする"""
+    if isinstance(df, SheetGrid):
+        return df.to_array()
+    return df.to_numpy(dtype=object)
+
+
+def _column_text(cells: "np.ndarray", col_idx: Optional[int]) -> List[str]:
+    """列の値を前後の空白を除いた文字列にする（欠損や列が無い場合は空文字）"""
+    if col_idx is None or col_idx >= cells.shape[1]:
+        return [""] * len(cells)
+    return ["" if _isna(v) else str(v).strip() for v in cells[:, col_idx]]
+
+
+def extract_projects_from_format(df: "pd.DataFrame") -> List[Dict[str, Any]]:
+    """
+    プロジェクト情報を抽出する。
+
+    見出し行（「使用言語」「作業工程」などの見出しがある行）から各項目の列を決め（detect_project_layout）、
+    列ごとにまとめて値を取り出す。行や列がずれたシートでも、見出しが同じであれば読み取れる。
+
+    列の構造（標準のフォーマット）:
     - B列: No.
     - C列: 期間(年数)
     - D列: プロジェクト名・業務概要
@@ -155,94 +630,50 @@ def extract_projects_from_format(df: pd.DataFrame) -> List[Dict[str, Any]]:
     - I列: 使用言語
     - J-O列: 作業工程（●で表示）
     """
+    import numpy as np
+
     projects = []
-    
+
     try:
-        # ヘッダー行を探す（10行目あたり）
-        header_row = 9  # 10行目（インデックス9）
-        
-        # 11行目以降のプロジェクトデータを読み込む
-        for row_idx in range(11, len(df)):
-            # No.が空でない行のみ処理
-            no_value = df.iloc[row_idx, 1]  # B列
-            
-            if pd.notna(no_value) and str(no_value).strip():
-                project = {}
-                
-                # No.
-                project["No"] = str(no_value).strip()
-                
-                # 期間（C列）
-                period = df.iloc[row_idx, 2]
-                if pd.notna(period):
-                    project["期間"] = str(period).strip()
-                
-                # プロジェクト名・業務概要（D列）
-                project_name = df.iloc[row_idx, 3]
-                if pd.notna(project_name):
-                    project["プロジェクト名・業務概要"] = str(project_name).strip()
-                
-                # 役割/規模（E列）
-                role = df.iloc[row_idx, 4]
-                if pd.notna(role):
-                    project["役割/規模"] = str(role).strip()
-                
-                # サーバーOS（F列）
-                server_os = df.iloc[row_idx, 5]
-                if pd.notna(server_os) and str(server_os).strip() and str(server_os) != "ー":
-                    project["サーバーOS"] = str(server_os).strip()
-                
-                # DB（G列）
-                db = df.iloc[row_idx, 6]
-                if pd.notna(db) and str(db).strip() and str(db) != "ー":
-                    project["DB"] = str(db).strip()
-                
-                # FW,MW,ツール等（H列）
-                tools = df.iloc[row_idx, 7]
-                if pd.notna(tools) and str(tools).strip() and str(tools) != "ー":
-                    project["FW/MW/ツール"] = str(tools).strip()
-                
-                # 使用言語（I列）
-                language = df.iloc[row_idx, 8]
-                if pd.notna(language) and str(language).strip():
-                    project["使用言語"] = str(language).strip()
-                
-                # 作業工程（J-O列）を抽出
-                phases = []
-                phase_columns = {
-                    9: "要件定義",
-                    10: "基本設計",
-                    11: "詳細設計",
-                    12: "実装/テスト",
-                    13: "結合テスト",
-                    14: "保守/運用"
-                }
-                
-                for col_idx, phase_name in phase_columns.items():
-                    if col_idx < len(df.columns):
-                        cell_value = df.iloc[row_idx, col_idx]
-                        # ●があれば担当フェーズとして記録
-                        if pd.notna(cell_value) and str(cell_value).strip() in ["●", "○"]:
-                            phases.append(phase_name)
-                
-                if phases:
-                    project["担当工程"] = "、".join(phases)
-                
-                projects.append(project)
-                
-            # 空行が続いたら終了
-            elif row_idx > 15:  # 最低でも15行目まではチェック
-                # 連続5行が空なら終了
-                empty_count = 0
-                for check_idx in range(row_idx, min(row_idx + 5, len(df))):
-                    if pd.isna(df.iloc[check_idx, 1]) or not str(df.iloc[check_idx, 1]).strip():
-                        empty_count += 1
-                if empty_count >= 5:
-                    break
-                    
+        cells = _as_array(df)
+        layout = detect_project_layout(cells)
+        body = cells[layout["data_start"]:]
+
+        # No. が空でない行をプロジェクトとし、No. が空の行が5行続いたところ（データの6行目以降）を終端とする
+        numbers = _column_text(body, layout["columns"]["No"])
+        has_number = np.array([number != "" for number in numbers], dtype=bool)
+        end = len(body)
+        for start in range(5, len(body) - 4):
+            if not has_number[start:start + 5].any():
+                end = start
+                break
+        rows = has_number[:end].nonzero()[0]
+        if len(rows) == 0:
+            return projects
+        body = body[rows]
+
+        values = {"No": [numbers[i] for i in rows]}
+        for field, col_idx in layout["columns"].items():
+            if field == "No":
+                continue
+            text = _column_text(body, col_idx)
+            if field in _DASH_AS_EMPTY_FIELDS:
+                text = ["" if v == "ー" else v for v in text]
+            values[field] = text
+        # ●（または○）がある列を担当工程とする
+        phases = [(name, [v in _PHASE_MARKS for v in _column_text(body, col_idx)])
+                  for col_idx, name in sorted(layout["phase_columns"].items())]
+
+        for i in range(len(rows)):
+            project = {field: column[i] for field, column in values.items() if column[i]}
+            assigned = [name for name, marks in phases if marks[i]]
+            if assigned:
+                project["担当工程"] = "、".join(assigned)
+            projects.append(project)
+
     except Exception as e:
-        print(f"プロジェクト抽出エラー: {e}")
-    
+        log_event("skillsheet_extract_failed", logging.WARNING, section="projects", error=str(e))
+
     return projects
 
 
@@ -250,6 +681,23 @@ def format_skillsheet_for_ai(data: Dict[str, Any]) -> str:
     """
     構造化されたスキルシートデータをAIプロンプト用のテキスト形式に整形
     """
+    formatted = format_profile_for_ai(data)
+    
+    # プロジェクト経歴
+    if data["projects"]:
+        formatted += "■ プロジェクト経歴\n"
+        for i, proj in enumerate(data["projects"], 1):
+            formatted += format_project_for_ai(proj, i)
+        
+        formatted += "\n"
+    
+    return formatted
+
+
+def format_profile_for_ai(data: Dict[str, Any]) -> str:
+    """
+    スキルシートのうち、プロジェクト経歴以外（基本情報・自己PR・資格）を整形
+    """
     formatted = "【スキルシート情報】\n\n"
     
     # 基本情報
@@ -272,38 +720,39 @@ def format_skillsheet_for_ai(data: Dict[str, Any]) -> str:
             formatted += f"  - {cert}\n"
         formatted += "\n"
     
-    # プロジェクト経歴
-    if data["projects"]:
-        formatted += "■ プロジェクト経歴\n"
-        for i, proj in enumerate(data["projects"], 1):
-            formatted += f"\n  【プロジェクト {proj.get('No', i)}】\n"
-            
-            if "期間" in proj:
-                formatted += f"    期間: {proj['期間']}\n"
-            
-            if "プロジェクト名・業務概要" in proj:
-                formatted += f"    概要: {proj['プロジェクト名・業務概要']}\n"
-            
-            if "役割/規模" in proj:
-                formatted += f"    役割: {proj['役割/規模']}\n"
-            
-            # 技術スタック
-            tech_stack = []
-            if "サーバーOS" in proj:
-                tech_stack.append(f"OS: {proj['サーバーOS']}")
-            if "DB" in proj:
-                tech_stack.append(f"DB: {proj['DB']}")
-            if "FW/MW/ツール" in proj:
-                tech_stack.append(f"ツール: {proj['FW/MW/ツール']}")
-            if "使用言語" in proj:
-                tech_stack.append(f"言語: {proj['使用言語']}")
-            
-            if tech_stack:
-                formatted += f"    技術: {', '.join(tech_stack)}\n"
-            
-            if "担当工程" in proj:
-                formatted += f"    担当工程: {proj['担当工程']}\n"
-        
-        formatted += "\n"
+    return formatted
+
+
+def format_project_for_ai(proj: Dict[str, Any], index: int) -> str:
+    """
+    プロジェクト1件分を整形（index は No. が無い場合の番号）
+    """
+    formatted = f"\n  【プロジェクト {proj.get('No', index)}】\n"
+    
+    if "期間" in proj:
+        formatted += f"    期間: {proj['期間']}\n"
+    
+    if "プロジェクト名・業務概要" in proj:
+        formatted += f"    概要: {proj['プロジェクト名・業務概要']}\n"
+    
+    if "役割/規模" in proj:
+        formatted += f"    役割: {proj['役割/規模']}\n"
+    
+    # 技術スタック
+    tech_stack = []
+    if "サーバーOS" in proj:
+        tech_stack.append(f"OS: {proj['サーバーOS']}")
+    if "DB" in proj:
+        tech_stack.append(f"DB: {proj['DB']}")
+    if "FW/MW/ツール" in proj:
+        tech_stack.append(f"ツール: {proj['FW/MW/ツール']}")
+    if "使用言語" in proj:
+        tech_stack.append(f"言語: {proj['使用言語']}")
+    
+    if tech_stack:
+        formatted += f"    技術: {', '.join(tech_stack)}\n"
+    
+    if "担当工程" in proj:
+        formatted += f"    担当工程: {proj['担当工程']}\n"
     
     return formatted
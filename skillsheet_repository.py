@@ -0,0 +1,447 @@
+import os
+import re
+import json
+import time
+import zlib
+import sqlite3
+import datetime
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Tuple
+
+from skillsheet_parser import PARSER_VERSION
+
+# numpy は読み込みに時間がかかるため、最初の検索で読み込む（ワーカーの起動を速くする）
+if TYPE_CHECKING:
+    import numpy as np
+
+# 検索条件に使える項目（検索のキー -> プロジェクトの項目名）。資格はプロジェクトではなくスキルシート単位
+SEARCH_FIELDS = {
+    "language": "使用言語",
+    "db": "DB",
+    "os": "サーバーOS",
+    "tool": "FW/MW/ツール",
+    "phase": "担当工程",
+}
+CERTIFICATION_FIELD = "certification"
+
+# 検索時にメモリ上に保持する、語ごとの出現位置（スキルシート・プロジェクト）の一覧の数
+SKILLSHEET_SEARCH_CACHE_TERMS = int(os.getenv("SKILLSHEET_SEARCH_CACHE_TERMS", "512"))
+
+# 使用言語・DB などの欄に複数の値を書く場合の区切り（空白・カンマ・読点・スラッシュ・中黒）
+_VALUE_SEPARATORS = re.compile(r"[\s,，、/／・;；]+")
+# 担当工程は「、」でつないでいる（工程名の「実装/テスト」を分割しないため、他の区切りは使わない）
+_PHASE_SEPARATOR = "、"
+# 「ー」「-」などの、値が無いことを表す記入
+_EMPTY_VALUES = {"", "ー", "-", "－", "―", "なし", "無し"}
+# 期間・取得年月の年月（2019/04、2019年4月、2019.4 など）
+_YEAR_MONTH = re.compile(r"((?:19|20)\d{2})\s*[/年.\-]\s*(\d{1,2})\s*月?")
+_UNTIL_NOW = ("現在", "継続", "至今")
+
+
+def normalize_term(value: str) -> str:
+    """索引と検索条件の語をそろえる（全角・半角、大文字・小文字の違いをなくす）"""
+    return unicodedata.normalize("NFKC", value).strip().lower()
+
+
+def query_term(key: str, value: str) -> str:
+    """検索条件の値を索引の語にする（資格名は空白の有無を区別しない）"""
+    if key == CERTIFICATION_FIELD:
+        return normalize_term("".join(unicodedata.normalize("NFKC", value).split()))
+    return normalize_term(value)
+
+
+def _split_values(field: str, value: str) -> List[str]:
+    if field == "担当工程":
+        values = value.split(_PHASE_SEPARATOR)
+    else:
+        values = _VALUE_SEPARATORS.split(unicodedata.normalize("NFKC", value))
+    terms = []
+    for item in values:
+        term = normalize_term(item)
+        if term not in _EMPTY_VALUES and term not in terms:
+            terms.append(term)
+    return terms
+
+
+def _year_month(year: int, month: int) -> int:
+    return year * 100 + min(max(month, 1), 12)
+
+
+def period_end(period: str, today: Optional[datetime.date] = None) -> Optional[int]:
+    """
+    期間の文字列から終了年月を YYYYMM の整数で返す（読み取れない場合は None）。
+    「2019/04～現在」のように終了が現在の場合は今日の年月とする。
+    """
+    text = unicodedata.normalize("NFKC", period or "")
+    today = today or datetime.date.today()
+    if any(word in text for word in _UNTIL_NOW) or re.search(r"[～~〜\-]\s*$", text):
+        return _year_month(today.year, today.month)
+    months = [_year_month(int(year), int(month)) for year, month in _YEAR_MONTH.findall(text)]
+    return max(months) if months else None
+
+
+def recent_cutoff(within_years: float, today: Optional[datetime.date] = None) -> int:
+    """「直近 within_years 年以内」の基準になる年月（YYYYMM）"""
+    today = today or datetime.date.today()
+    months = today.year * 12 + (today.month - 1) - int(round(within_years * 12))
+    return _year_month(months // 12, months % 12 + 1)
+
+
+def index_terms(data: Dict[str, Any]) -> List[Tuple[str, str, int, Optional[int]]]:
+    """
+    構造化データから索引に登録する語を作る。
+
+    Returns:
+        (検索のキー, 語, プロジェクトの位置（資格は -1）, 最後に使った年月 YYYYMM) の一覧
+    """
+    rows = []
+    for position, project in enumerate(data.get("projects") or []):
+        last_used = period_end(str(project.get("期間", "")))
+        for key, field in SEARCH_FIELDS.items():
+            if project.get(field):
+                rows.extend((key, term, position, last_used) for term in _split_values(field, str(project[field])))
+    for certification in data.get("certifications") or []:
+        text = unicodedata.normalize("NFKC", str(certification))
+        months = [_year_month(int(year), int(month)) for year, month in _YEAR_MONTH.findall(text)]
+        # 資格名は先頭の取得年月を除き、空白を詰めた全体を1語とする
+        name = query_term(CERTIFICATION_FIELD, _YEAR_MONTH.sub("", text))
+        if name and name not in _EMPTY_VALUES:
+            rows.append((CERTIFICATION_FIELD, name, -1, max(months) if months else None))
+    # 同じプロジェクト内（資格は同じ資格名）の重複は1件にし、最後に使った年月は新しい方にする
+    latest: Dict[Tuple[str, str, int], Optional[int]] = {}
+    for key, term, position, last_used in rows:
+        previous = latest.get((key, term, position))
+        latest[(key, term, position)] = max(previous or 0, last_used or 0) or None
+    return [(key, term, position, last_used) for (key, term, position), last_used in latest.items()]
+
+
+# sid と project を1つの整数にまとめる際の倍率（1つのスキルシートのプロジェクト数はこれ未満）
+_PROJECT_STRIDE = 1 << 16
+_BUMP_GENERATION = "UPDATE skillsheet_meta SET value = value + 1 WHERE name = 'generation'"
+
+
+def _unique_sorted(values: "np.ndarray") -> "np.ndarray":
+    """昇順の配列から重複を除く（np.unique と違い、並べ替えをしない）"""
+    import numpy as np
+
+    if values.size == 0:
+        return values
+    keep = np.empty(values.size, dtype=bool)
+    keep[0] = True
+    np.not_equal(values[1:], values[:-1], out=keep[1:])
+    return values[keep]
+
+
+class SkillsheetRepository:
+    """
+    解析済みのスキルシートを構造化データのまま保存し、スキルで検索するためのストア（SQLite）。
+
+    スキルシートはファイル内容の SHA-256 をキーに、構造化データを圧縮した JSON で保持する。
+    使用言語・DB・OS・ツール・担当工程・資格の語ごとに、どのスキルシートのどのプロジェクトに
+    出てくるか（と、その期間の終了年月）を転置索引に登録し、Excel を読み直さずに検索できるようにする。
+    索引はスキルシートと語を整数のIDで持ち、件数が数万件になっても小さく保つ。
+    """
+
+    def __init__(self, db_path: str, retention_seconds: Optional[float] = None):
+        self.db_path = db_path
+        # 最後にアップロードされてからこの秒数が過ぎたスキルシートは purge_expired で削除する（None は無期限）
+        self.retention_seconds = retention_seconds
+        self._local = threading.local()
+        # テーブルは最初に接続したときに作る（インポートや生成の時点ではファイルを作らない）
+        self._schema_ready = False
+
+        # tid -> (sid, project, last_used) の配列。検索の度に SQLite から読み直さないよう LRU で保持する
+        self._postings: "OrderedDict[int, Tuple[np.ndarray, np.ndarray, np.ndarray]]" = OrderedDict()
+        self._generation: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 の接続はスレッドをまたいで共有できないため、スレッドごとに保持する
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if not self._schema_ready:
+                self._create_schema(conn)
+                self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _create_schema(conn: sqlite3.Connection) -> None:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS skillsheets ("
+            " sid INTEGER PRIMARY KEY, sha256 TEXT NOT NULL UNIQUE, filename TEXT, name TEXT,"
+            " parser_version INTEGER NOT NULL, project_count INTEGER NOT NULL, data BLOB NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS skillsheet_terms ("
+            " tid INTEGER PRIMARY KEY, key TEXT NOT NULL, term TEXT NOT NULL, UNIQUE (key, term))"
+        )
+        # 検索は語のIDで引くため、主キーの順もそれに合わせる（WITHOUT ROWID で索引と本体を兼ねる）。
+        # 資格の project は -1
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS skillsheet_postings ("
+            " tid INTEGER NOT NULL, sid INTEGER NOT NULL, project INTEGER NOT NULL, last_used INTEGER,"
+            " PRIMARY KEY (tid, sid, project)) WITHOUT ROWID"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_skillsheet_postings_sid ON skillsheet_postings (sid)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_skillsheets_updated_at ON skillsheets (updated_at)")
+        # 保存・削除のたびに増やす番号。他のワーカーが更新した場合も、これでメモリ上の一覧を捨てる
+        conn.execute("CREATE TABLE IF NOT EXISTS skillsheet_meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO skillsheet_meta (name, value) VALUES ('generation', 0)")
+
+    @staticmethod
+    def _encode(data: Dict[str, Any]) -> bytes:
+        return zlib.compress(json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+    @staticmethod
+    def _decode(blob: bytes) -> Dict[str, Any]:
+        return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+    @staticmethod
+    def _term_ids(conn: sqlite3.Connection, keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], int]:
+        """(検索のキー, 語) の ID を返す（未登録のものは登録する）"""
+        conn.executemany("INSERT OR IGNORE INTO skillsheet_terms (key, term) VALUES (?, ?)", keys)
+        ids = {}
+        for key, term in keys:
+            ids[(key, term)] = conn.execute(
+                "SELECT tid FROM skillsheet_terms WHERE key = ? AND term = ?", (key, term)
+            ).fetchone()[0]
+        return ids
+
+    def put(self, sha256: str, data: Dict[str, Any], filename: Optional[str] = None) -> bool:
+        """
+        スキルシートを保存し、索引を作り直す（同じ内容・同じ解析ロジックで保存済みの場合は何もしない）。
+
+        Returns:
+            新たに保存（または更新）したかどうか
+        """
+        conn = self._conn()
+        row = conn.execute("SELECT parser_version FROM skillsheets WHERE sha256 = ?", (sha256,)).fetchone()
+        if row is not None and row[0] == PARSER_VERSION:
+            # 保存期間は最後にアップロードされた時点から数える
+            conn.execute("UPDATE skillsheets SET updated_at = ? WHERE sha256 = ?", (time.time(), sha256))
+            return False
+
+        name = str((data.get("basic_info") or {}).get("氏名", "")) or None
+        terms = index_terms(data)
+        # BEGIN IMMEDIATE で書き込みロックを先に取り、本体と索引を同時に更新する
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # 解析ロジックが変わった後の再登録では、IDを変えずに中身だけを置き換える
+            conn.execute(
+                "INSERT INTO skillsheets (sha256, filename, name, parser_version, project_count, data, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (sha256) DO UPDATE SET filename = excluded.filename, name = excluded.name,"
+                " parser_version = excluded.parser_version, project_count = excluded.project_count,"
+                " data = excluded.data, updated_at = excluded.updated_at",
+                (sha256, filename, name, PARSER_VERSION, len(data.get("projects") or []), self._encode(data), time.time()),
+            )
+            sid = conn.execute("SELECT sid FROM skillsheets WHERE sha256 = ?", (sha256,)).fetchone()[0]
+            term_ids = self._term_ids(conn, list(dict.fromkeys((key, term) for key, term, _, _ in terms)))
+            conn.execute("DELETE FROM skillsheet_postings WHERE sid = ?", (sid,))
+            conn.executemany(
+                "INSERT INTO skillsheet_postings (tid, sid, project, last_used) VALUES (?, ?, ?, ?)",
+                [(term_ids[(key, term)], sid, project, last_used) for key, term, project, last_used in terms],
+            )
+            conn.execute(_BUMP_GENERATION)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return True
+
+    def get(self, sha256: str) -> Optional[Dict[str, Any]]:
+        """保存済みのスキルシート（filename, name, data など）を返す（無ければ None）"""
+        row = self._conn().execute(
+            "SELECT sha256, filename, name, project_count, data, updated_at FROM skillsheets WHERE sha256 = ?",
+            (sha256,),
+        ).fetchone()
+        if row is None:
+            return None
+        return {"sha256": row[0], "filename": row[1], "name": row[2], "project_count": row[3],
+                "data": self._decode(row[4]), "updated_at": row[5]}
+
+    def delete(self, sha256: str) -> bool:
+        """スキルシートと索引を削除する。削除したかどうかを返す"""
+        return self._delete_where("sha256 = ?", (sha256,)) > 0
+
+    def purge_expired(self) -> int:
+        """保存期間を過ぎたスキルシートを削除し、削除した件数を返す（保存期間が無期限の場合は何もしない）"""
+        if self.retention_seconds is None:
+            return 0
+        return self._delete_where("updated_at < ?", (time.time() - self.retention_seconds,))
+
+    def _delete_where(self, condition: str, params: Tuple[Any, ...]) -> int:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                f"DELETE FROM skillsheet_postings WHERE sid IN (SELECT sid FROM skillsheets WHERE {condition})", params
+            )
+            deleted = conn.execute(f"DELETE FROM skillsheets WHERE {condition}", params).rowcount
+            if deleted:
+                conn.execute(_BUMP_GENERATION)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return deleted
+
+    def _load_postings(self, conn: sqlite3.Connection, tid: int) -> "Tuple[np.ndarray, np.ndarray, np.ndarray]":
+        """
+        語の出現位置の一覧を (sid, project, last_used) の配列で返す（last_used が不明の場合は 0）。
+        (sid, project) の昇順で、重複は無い（主キーのため）
+        """
+        import numpy as np
+
+        with self._lock:
+            cached = self._postings.get(tid)
+            if cached is not None:
+                self._postings.move_to_end(tid)
+                return cached
+        rows = conn.execute(
+            "SELECT sid, project, COALESCE(last_used, 0) FROM skillsheet_postings WHERE tid = ? ORDER BY sid, project",
+            (tid,),
+        ).fetchall()
+        table = np.array(rows, dtype=np.int64).reshape(-1, 3)
+        postings = (table[:, 0], table[:, 1], table[:, 2])
+        with self._lock:
+            self._postings[tid] = postings
+            while len(self._postings) > SKILLSHEET_SEARCH_CACHE_TERMS:
+                self._postings.popitem(last=False)
+        return postings
+
+    def _sync_generation(self, conn: sqlite3.Connection) -> None:
+        """他のワーカーを含め、保存・削除があった場合はメモリ上の一覧を捨てる"""
+        generation = conn.execute("SELECT value FROM skillsheet_meta WHERE name = 'generation'").fetchone()[0]
+        with self._lock:
+            if generation != self._generation:
+                self._postings.clear()
+                self._generation = generation
+
+    def search(self, criteria: Dict[str, List[str]], within_years: Optional[float] = None,
+               same_project: bool = False, limit: int = 50, offset: int = 0) -> Dict[str, Any]:
+        """
+        全ての条件に当てはまるスキルシートを、登録の新しい順に返す。
+
+        Args:
+            criteria: 検索のキー（SEARCH_FIELDS のキーまたは "certification"）-> 語の一覧（全てを含むものに絞る）
+                      例: {"language": ["Java"], "db": ["Oracle"], "phase": ["詳細設計"]}
+            within_years: 指定すると、直近この年数以内に終了した（または継続中の）プロジェクトでの経験に限る
+                          （資格は取得年月で判定する。期間が読み取れないものは対象外）
+            same_project: True の場合、プロジェクトの条件を全て同じプロジェクトで満たすものに限る
+
+        Returns:
+            Dict: total（該当件数）, results（sha256, filename, name, project_count, matched_projects）
+        """
+        import numpy as np
+
+        conditions = []
+        for key, values in criteria.items():
+            if key not in SEARCH_FIELDS and key != CERTIFICATION_FIELD:
+                raise ValueError(f"未対応の検索条件です: {key}")
+            conditions.extend((key, term) for term in (query_term(key, value) for value in values) if term)
+        if not conditions:
+            raise ValueError("検索条件を1つ以上指定してください")
+
+        conn = self._conn()
+        self._sync_generation(conn)
+        cutoff = recent_cutoff(within_years) if within_years is not None else None
+        empty: Dict[str, Any] = {"total": 0, "results": []}
+
+        # 条件ごとに (スキルシート, プロジェクト) の一覧を引き、積集合で全てを満たすものに絞る。
+        # 同じプロジェクトで満たす条件は、sid と project を1つの整数にまとめて比べる
+        matched: Optional[np.ndarray] = None
+        matched_pairs: Optional[np.ndarray] = None
+        project_hits: List[Tuple[np.ndarray, np.ndarray]] = []
+        for key, term in dict.fromkeys(conditions):
+            row = conn.execute("SELECT tid FROM skillsheet_terms WHERE key = ? AND term = ?", (key, term)).fetchone()
+            if row is None:
+                return empty
+            sids, projects, last_used = self._load_postings(conn, row[0])
+            if cutoff is not None:
+                recent = last_used >= cutoff
+                sids, projects = sids[recent], projects[recent]
+            if key != CERTIFICATION_FIELD:
+                project_hits.append((sids, projects))
+                if same_project:
+                    pairs = sids * _PROJECT_STRIDE + projects
+                    matched_pairs = pairs if matched_pairs is None else np.intersect1d(matched_pairs, pairs, assume_unique=True)
+                    if matched_pairs.size == 0:
+                        return empty
+                    continue
+            sheets = _unique_sorted(sids)
+            matched = sheets if matched is None else np.intersect1d(matched, sheets, assume_unique=True)
+            if matched.size == 0:
+                return empty
+        if matched_pairs is not None:
+            sheets = _unique_sorted(matched_pairs // _PROJECT_STRIDE)
+            matched = sheets if matched is None else np.intersect1d(matched, sheets, assume_unique=True)
+            # 同じプロジェクトで満たす場合は、該当したプロジェクトもその組だけにする
+            project_hits = [(matched_pairs // _PROJECT_STRIDE, matched_pairs % _PROJECT_STRIDE)]
+
+        ordered = matched[::-1]
+        page = [int(sid) for sid in ordered[offset:offset + limit]]
+        results = []
+        if page:
+            placeholders = ",".join("?" * len(page))
+            rows = {
+                row[0]: row[1:] for row in conn.execute(
+                    f"SELECT sid, sha256, filename, name, project_count FROM skillsheets WHERE sid IN ({placeholders})",
+                    page,
+                )
+            }
+            # 結果の各スキルシートで、条件に当てはまったプロジェクトの位置
+            matched_projects: Dict[int, set] = {sid: set() for sid in page}
+            for sids, projects in project_hits:
+                on_page = np.isin(sids, page)
+                for sid, project in zip(sids[on_page].tolist(), projects[on_page].tolist()):
+                    matched_projects[sid].add(project)
+            for sid in page:
+                if sid in rows:
+                    sha256, filename, name, project_count = rows[sid]
+                    results.append({"sha256": sha256, "filename": filename, "name": name,
+                                    "project_count": project_count, "matched_projects": sorted(matched_projects[sid])})
+        return {"total": int(ordered.size), "results": results}
+
+    def terms(self, key: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """検索のキーごとに、登録されている語とそれを含むスキルシート数を多い順に返す（検索条件の候補用）"""
+        rows = self._conn().execute(
+            "SELECT t.term, COUNT(DISTINCT p.sid) AS sheets FROM skillsheet_terms t"
+            " JOIN skillsheet_postings p ON p.tid = t.tid WHERE t.key = ?"
+            " GROUP BY t.tid ORDER BY sheets DESC, t.term LIMIT ?",
+            (key, limit),
+        ).fetchall()
+        return [{"term": term, "skillsheets": count} for term, count in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._conn()
+        skillsheets, projects = conn.execute("SELECT COUNT(*), COALESCE(SUM(project_count), 0) FROM skillsheets").fetchone()
+        terms = conn.execute("SELECT COUNT(*) FROM skillsheet_terms").fetchone()[0]
+        postings = conn.execute("SELECT COUNT(*) FROM skillsheet_postings").fetchone()[0]
+        return {"skillsheets": skillsheets, "projects": projects, "terms": terms, "postings": postings,
+                "db_path": self.db_path}
+
+
+def create_skillsheet_repository_from_env() -> Optional[SkillsheetRepository]:
+    """
+    環境変数からスキルシートの保存先を生成する（無効の場合は None）。
+    候補者の個人情報（氏名・生年月日・職務経歴）をそのまま保存するため、既定では無効にする。
+
+    SKILLSHEET_REPOSITORY_ENABLED:        "true" で有効化（アップロードされたスキルシートを保存する）
+    SKILLSHEET_REPOSITORY_PATH:           SQLite ファイルのパス（複数ワーカーで共有）
+    SKILLSHEET_REPOSITORY_RETENTION_DAYS: 最後のアップロードから保存しておく日数（0 は無期限）
+    """
+    if os.getenv("SKILLSHEET_REPOSITORY_ENABLED", "false").lower() != "true":
+        return None
+    retention_days = float(os.getenv("SKILLSHEET_REPOSITORY_RETENTION_DAYS", "90"))
+    return SkillsheetRepository(
+        os.getenv("SKILLSHEET_REPOSITORY_PATH", "skillsheets.db"),
+        retention_seconds=retention_days * 86400 if retention_days > 0 else None,
+    )
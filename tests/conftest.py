@@ -0,0 +1,15 @@
+import os
+import sys
+import tempfile
+
+# テストではリポジトリ直下のモジュールを読み込み、SQLite などのファイルは一時ディレクトリに作る
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_TMP = tempfile.mkdtemp(prefix="interview-tests-")
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "test")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "http://127.0.0.1:9")
+os.environ.setdefault("QUESTION_POOL_ENABLED", "false")
+os.environ.setdefault("WARMUP_ENABLED", "false")
+os.environ.setdefault("BATCH_REVIEW_DB_PATH", os.path.join(_TMP, "batch_reviews.db"))
+os.environ.setdefault("SKILLSHEET_REPOSITORY_PATH", os.path.join(_TMP, "skillsheets.db"))
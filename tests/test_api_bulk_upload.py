@@ -0,0 +1,61 @@
+import io
+import json
+import zipfile
+
+from fastapi.testclient import TestClient
+
+import api
+from benchmark import build_sample_skillsheet
+
+
+def make_zip(entries) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, contents in entries:
+            archive.writestr(name, contents)
+    return buffer.getvalue()
+
+
+def read_ndjson(response):
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    return sorted(lines[:-1], key=lambda r: r["filename"]), lines[-1]["summary"]
+
+
+def test_bulk_upload_parses_zip_entries_and_plain_files(monkeypatch):
+    monkeypatch.setattr(api, "skillsheet_repository", None)
+    archive = make_zip([
+        ("a.xlsx", build_sample_skillsheet(2)),
+        ("dir/b.xlsx", build_sample_skillsheet(4)),
+        ("broken.xlsx", b"not an excel file"),
+        ("notes.txt", b"ignored"),
+        ("__MACOSX/._a.xlsx", b"ignored"),
+    ])
+    with TestClient(api.app) as client:
+        response = client.post("/upload_skillsheets_bulk", files=[
+            ("files", ("sheets.zip", archive)),
+            ("files", ("c.xlsx", build_sample_skillsheet(3))),
+        ])
+    results, summary = read_ndjson(response)
+
+    assert [(r["filename"], r["status"]) for r in results] == [
+        ("c.xlsx", "ok"), ("sheets.zip/a.xlsx", "ok"), ("sheets.zip/broken.xlsx", "error"), ("sheets.zip/dir/b.xlsx", "ok"),
+    ]
+    assert (summary["total"], summary["ok"], summary["error"]) == (4, 3, 1)
+
+
+def test_bulk_upload_rejects_archive_over_total_size(monkeypatch):
+    monkeypatch.setattr(api, "BULK_MAX_TOTAL_BYTES", 1000)
+    # 圧縮すると小さいが、展開後の合計が上限を超える ZIP
+    archive = make_zip([(f"{i}.xlsx", b"\0" * 600) for i in range(2)])
+    with TestClient(api.app) as client:
+        response = client.post("/upload_skillsheets_bulk", files=[("files", ("sheets.zip", archive))])
+    assert response.status_code == 413
+
+
+def test_bulk_upload_is_rejected_by_content_length_before_reading(monkeypatch):
+    assert api.UPLOAD_MAX_BYTES_BY_PATH["/upload_skillsheets_bulk"] == api.BULK_MAX_TOTAL_BYTES
+    monkeypatch.setitem(api.UPLOAD_MAX_BYTES_BY_PATH, "/upload_skillsheets_bulk", 1000)
+    with TestClient(api.app) as client:
+        response = client.post("/upload_skillsheets_bulk",
+                               files=[("files", ("c.xlsx", b"\0" * (api.UPLOAD_FORM_OVERHEAD_BYTES + 2000)))])
+    assert response.status_code == 413
@@ -0,0 +1,46 @@
+import json
+
+from fastapi.testclient import TestClient
+
+import api
+from benchmark import build_sample_skillsheet
+
+
+def test_restart_keeps_skillsheet_of_legacy_shared_session():
+    """session_id を送らない旧クライアントが面接前にアップロードしたスキルシートは、/ を呼んでも残る"""
+    with TestClient(api.app) as client:
+        uploaded = client.post("/upload_skillsheet", files={"file": ("sheet.xlsx", build_sample_skillsheet(3))})
+        assert uploaded.status_code == 200
+        api.session_store.update(api.DEFAULT_SESSION_ID, stage=3, pending_turns=[{"type": "answer", "text": "x"}])
+
+        assert client.post("/", json={"company_info": "c"}).status_code == 200
+
+        state = api.session_store.get(api.DEFAULT_SESSION_ID)
+        assert state["stage"] == 1
+        assert state["pending_turns"] == []
+        assert state["skillsheet_data"]["projects"]
+        assert client.get("/get_skillsheet_info").json()["has_skillsheet"]
+
+
+def test_failed_turn_is_recorded_once_after_retry(monkeypatch):
+    """失敗してやり直したターンは、次の質問を返せたときに1回だけ記録する"""
+    replies = [json.dumps({"question": "AI質問生成エラー: down", "is_error": True}, ensure_ascii=False),
+               json.dumps({"question": "次の質問"}, ensure_ascii=False)]
+
+    async def generate(*args, **kwargs):
+        return replies.pop(0)
+
+    monkeypatch.setattr(api, "generate_followup_async", generate)
+    monkeypatch.setattr(api, "LLM_FALLBACK_ENABLED", False)
+    with TestClient(api.app) as client:
+        session_id = client.post("/", json={"company_info": "c"}).json()["session_id"]
+        api.session_store.update(session_id, stage=3)
+        request = {"session_id": session_id, "user_answer": "回答です", "current_question": "前の質問"}
+
+        assert client.post("/generate_next_question", json=request).json()["is_error"]
+        assert api.session_store.get(session_id)["pending_turns"] == []
+
+        assert client.post("/generate_next_question", json=request).json()["next_question"] == "次の質問"
+        assert api.session_store.get(session_id)["pending_turns"] == [
+            {"type": "question", "text": "前の質問"}, {"type": "answer", "text": "回答です"},
+        ]
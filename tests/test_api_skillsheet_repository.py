@@ -0,0 +1,21 @@
+from fastapi.testclient import TestClient
+
+import api
+from benchmark import build_sample_skillsheet
+from skillsheet_repository import SkillsheetRepository
+
+
+def test_repository_is_disabled_by_default(monkeypatch):
+    monkeypatch.delenv("SKILLSHEET_REPOSITORY_ENABLED", raising=False)
+    assert api.create_skillsheet_repository_from_env() is None
+
+
+def test_upload_stores_skillsheet_and_delete_removes_it(tmp_path, monkeypatch):
+    monkeypatch.setattr(api, "skillsheet_repository", SkillsheetRepository(str(tmp_path / "repo.db")))
+    with TestClient(api.app) as client:
+        uploaded = client.post("/upload_skillsheet", files={"file": ("sheet.xlsx", build_sample_skillsheet(3))}).json()
+        digest = uploaded["sha256"]
+        assert client.get(f"/skillsheet_repository/{digest}").status_code == 200
+        assert client.delete(f"/skillsheet_repository/{digest}").json() == {"deleted": digest}
+        assert client.get(f"/skillsheet_repository/{digest}").status_code == 404
+        assert client.delete(f"/skillsheet_repository/{digest}").status_code == 404
@@ -0,0 +1,168 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+import ai_question
+import api
+
+
+def read_events(response) -> list:
+    """SSE のレスポンスを (イベント名, データ) の一覧にする"""
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def start_stage3_session(client: TestClient) -> str:
+    session_id = client.post("/", json={"company_info": "c"}).json()["session_id"]
+    api.session_store.update(session_id, stage=3)
+    return session_id
+
+
+def test_stream_falls_back_when_first_token_misses_turn_budget(monkeypatch):
+    """最初の差分がターンのレイテンシ予算内に届かなければ、質問バンクの質問を送る"""
+    async def stalled(*args, **kwargs):
+        await asyncio.sleep(30)
+        yield "届かない質問"
+
+    monkeypatch.setattr(ai_question, "stream_followup_async", stalled)
+    monkeypatch.setattr(api, "TURN_LATENCY_BUDGET", 0.2)
+    with TestClient(api.app) as client:
+        session_id = start_stage3_session(client)
+        response = client.post("/generate_next_question_stream", json={
+            "session_id": session_id, "user_answer": "回答です", "current_question": "前の質問",
+        })
+
+    events = read_events(response)
+    event, done = events[-1]
+    assert event == "done"
+    assert done["fallback"] is True
+    assert done["is_error"] is False
+    assert done["next_question"] in api.questions_by_stage["stage_3_fallback"]
+    assert [data["text"] for name, data in events if name == "delta"] == [done["next_question"]]
+
+
+def test_stream_sends_deltas_after_first_token(monkeypatch):
+    async def deltas(*args, **kwargs):
+        for delta in ["御社", "の", "質問"]:
+            yield delta
+
+    monkeypatch.setattr(ai_question, "stream_followup_async", deltas)
+    with TestClient(api.app) as client:
+        session_id = start_stage3_session(client)
+        response = client.post("/generate_next_question_stream", json={
+            "session_id": session_id, "user_answer": "回答です", "current_question": "前の質問",
+        })
+
+    events = read_events(response)
+    assert [data["text"] for name, data in events if name == "delta"] == ["御社", "の", "質問"]
+    assert events[-1][1]["next_question"] == "御社の質問"
+    assert events[-1][1]["fallback"] is False
+
+
+def test_stream_review_starts_with_generator_and_stops_when_abandoned(monkeypatch):
+    """添削はジェネレーターを読み始めてから開始し、読み終わる前に閉じられたら止める"""
+    started = []
+
+    def start_review(user_answer):
+        task = asyncio.create_task(asyncio.sleep(30))
+        started.append(task)
+        return [], task
+
+    async def deltas(*args, **kwargs):
+        for delta in ["御社", "の", "質問"]:
+            yield delta
+
+    monkeypatch.setattr(api, "start_answer_review", start_review)
+    monkeypatch.setattr(ai_question, "stream_followup_async", deltas)
+
+    async def scenario():
+        session_id = api.session_store.create(dict(api.new_session_state(), stage=3))
+        request = api.AnswerRequest(session_id=session_id, user_answer="回答です", current_question="前の質問")
+        events = await api.start_next_question_stream(session_id, api.session_store.get(session_id), request)
+        assert started == []
+
+        assert (await events.__anext__())[0] == "delta"
+        await events.aclose()
+        await asyncio.sleep(0)
+        assert started[0].cancelled()
+
+    asyncio.run(scenario())
+
+
+def test_followup_stream_is_closed_when_abandoned(monkeypatch):
+    """クライアントが途中で切断したら、生成中のストリームも閉じる（デプロイメントの処理中の件数を戻すため）"""
+    closed = []
+
+    async def deltas(*args, **kwargs):
+        try:
+            for delta in ["御社", "の", "質問"]:
+                yield delta
+        finally:
+            closed.append(True)
+
+    monkeypatch.setattr(ai_question, "stream_followup_async", deltas)
+
+    async def scenario():
+        session_id = api.session_store.create(dict(api.new_session_state(), stage=3))
+        request = api.AnswerRequest(session_id=session_id, user_answer="回答です", current_question="前の質問")
+        events = await api.start_next_question_stream(session_id, api.session_store.get(session_id), request)
+        assert (await events.__anext__())[0] == "delta"
+        assert closed == []
+        await events.aclose()
+        assert closed == [True]
+
+    asyncio.run(scenario())
+
+
+def test_stage_advances_only_after_the_question_is_delivered(monkeypatch):
+    """ステージ2のターンは、次の質問を送り終えてからステージ3に進める（途中で失敗・切断したら進めない）"""
+    async def failing(*args, **kwargs):
+        raise RuntimeError("backend down")
+        yield
+
+    async def deltas(*args, **kwargs):
+        for delta in ["御社", "の", "質問"]:
+            yield delta
+
+    monkeypatch.setattr(api, "LLM_FALLBACK_ENABLED", False)
+    request = dict(user_answer="回答です", current_question="前の質問")
+
+    async def scenario():
+        session_id = api.session_store.create(dict(api.new_session_state(), stage=2))
+        session = api.session_store.get(session_id)
+
+        monkeypatch.setattr(ai_question, "stream_followup_async", failing)
+        events = await api.start_next_question_stream(session_id, session, api.AnswerRequest(**request))
+        assert [event async for event, _ in events][-1] == "done"
+        assert api.session_store.get(session_id)["stage"] == 2
+
+        monkeypatch.setattr(ai_question, "stream_followup_async", deltas)
+        events = await api.start_next_question_stream(session_id, session, api.AnswerRequest(**request))
+        assert (await events.__anext__())[0] == "delta"
+        await events.aclose()
+        assert api.session_store.get(session_id)["stage"] == 2
+
+        events = await api.start_next_question_stream(session_id, session, api.AnswerRequest(**request))
+        assert [event async for event, _ in events][-1] == "done"
+        assert api.session_store.get(session_id)["stage"] == 3
+
+    asyncio.run(scenario())
+
+
+def test_stream_rejects_invalid_stage_like_non_streaming_turn():
+    async def scenario():
+        session_id = api.session_store.create(dict(api.new_session_state(), stage=0))
+        request = api.AnswerRequest(session_id=session_id, user_answer="回答です", current_question="前の質問")
+        events = await api.start_next_question_stream(session_id, api.session_store.get(session_id), request)
+        streamed = [item async for item in events]
+        non_streamed = await api.run_next_question_turn(session_id, api.session_store.get(session_id), request)
+        return streamed, non_streamed
+
+    streamed, non_streamed = asyncio.run(scenario())
+    assert [event for event, _ in streamed] == ["done"]
+    assert streamed[0][1]["is_error"] is True
+    assert streamed[0][1]["next_question"] == non_streamed["next_question"]
@@ -0,0 +1,131 @@
+import asyncio
+import time
+
+import pytest
+
+import batch_review
+from batch_review import JOB_CANCELLED, JOB_COMPLETED, JOB_RUNNING, BatchJobStore, BatchReviewRunner
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BatchJobStore(str(tmp_path / "batch_reviews.db"))
+
+
+def test_claim_respects_live_lease_and_takes_over_expired_one(store, monkeypatch):
+    job_id = store.create([{"n": 1}], {})
+    assert store.claim(job_id, "worker-a")
+    assert not store.claim(job_id, "worker-b")
+    assert store.orphaned_jobs() == []
+
+    # リースの更新が途切れたら、他のワーカーが引き継げる
+    now = time.time()
+    monkeypatch.setattr(batch_review.time, "time", lambda: now + batch_review.BATCH_REVIEW_LEASE_SECONDS + 1)
+    assert store.orphaned_jobs() == [job_id]
+    assert store.claim(job_id, "worker-b")
+    assert store.get(job_id)["owner"] == "worker-b"
+
+
+def test_release_makes_job_orphaned_immediately(store):
+    job_id = store.create([{"n": 1}], {})
+    store.claim(job_id, "worker-a")
+    store.release([job_id], "worker-a")
+    assert store.orphaned_jobs() == [job_id]
+
+
+def test_record_result_is_checkpointed_once(store):
+    job_id = store.create([{"n": 0}, {"n": 1}, {"n": 2}], {})
+    assert store.record_result(job_id, 1, {"ok": True}, None, 1, 10.0)
+    assert not store.record_result(job_id, 1, {"ok": True}, None, 1, 10.0)
+    assert store.record_result(job_id, 2, None, "boom", 3, 10.0)
+
+    assert store.pending_indexes(job_id) == [0]
+    job = store.get(job_id)
+    assert (job["succeeded"], job["failed"], job["pending"]) == (1, 1, 1)
+    assert [r["index"] for r in store.results(job_id)] == [1, 2]
+    assert [r["index"] for r in store.results(job_id, after_seq=store.results(job_id)[0]["seq"])] == [2]
+    assert store.finish(job_id) == JOB_RUNNING
+
+
+def test_resume_resets_failed_items_of_cancelled_job(store):
+    job_id = store.create([{"n": 0}, {"n": 1}], {})
+    store.record_result(job_id, 0, {"ok": True}, None, 1, 1.0)
+    store.record_result(job_id, 1, None, "boom", 3, 1.0)
+    assert store.cancel(job_id)
+    assert store.status(job_id) == JOB_CANCELLED
+
+    assert store.resume(job_id) == 1
+    job = store.get(job_id)
+    assert (job["status"], job["succeeded"], job["failed"]) == (JOB_RUNNING, 1, 0)
+    assert store.pending_indexes(job_id) == [1]
+
+
+def run_job(store, review_fn, retryable=lambda error: True):
+    async def scenario():
+        runner = BatchReviewRunner(store, review_fn, concurrency=2, retryable=retryable)
+        job_id = await asyncio.to_thread(store.create, [{"n": n} for n in range(3)], {})
+        assert await runner.start(job_id)
+        await asyncio.gather(*runner._tasks.values())
+        return job_id
+
+    return asyncio.run(scenario())
+
+
+def test_runner_resumes_only_pending_items(store, monkeypatch):
+    monkeypatch.setattr(batch_review, "BATCH_REVIEW_RETRY_BACKOFF", 0)
+    seen = []
+
+    async def review(item):
+        seen.append(item["n"])
+        if item["n"] == 1:
+            raise TimeoutError("slow")
+        return {"n": item["n"]}
+
+    job_id = run_job(store, review)
+    assert store.get(job_id)["failed"] == 1
+    assert seen.count(1) == batch_review.BATCH_REVIEW_MAX_ATTEMPTS
+
+    # 再開時は失敗した1件だけを処理する
+    store.resume(job_id)
+    seen.clear()
+
+    async def review_again(item):
+        seen.append(item["n"])
+        return {"n": item["n"]}
+
+    async def resume():
+        runner = BatchReviewRunner(store, review_again)
+        assert await runner.start(job_id)
+        await asyncio.gather(*runner._tasks.values())
+
+    asyncio.run(resume())
+    assert seen == [1]
+    assert store.get(job_id)["status"] == JOB_COMPLETED
+    assert sorted(r["index"] for r in store.results(job_id) if r["status"] == "ok") == [0, 1, 2]
+
+
+def test_runner_does_not_retry_permanent_errors(store, monkeypatch):
+    monkeypatch.setattr(batch_review, "BATCH_REVIEW_RETRY_BACKOFF", 0)
+    calls = []
+
+    async def review(item):
+        calls.append(item["n"])
+        raise ValueError("invalid item")
+
+    job_id = run_job(store, review, retryable=lambda error: not isinstance(error, ValueError))
+    assert sorted(calls) == [0, 1, 2]
+    assert {r["attempts"] for r in store.results(job_id)} == {1}
+    assert store.get(job_id)["status"] == JOB_COMPLETED
+
+
+def test_batch_item_retries_only_transient_llm_errors():
+    import api
+    from pydantic import ValidationError
+
+    with pytest.raises(ValidationError) as invalid:
+        api.ConversationHistoryRequest.model_validate({"conversation_history": "x"})
+    assert not api.is_retryable_batch_error(invalid.value)
+    assert api.is_retryable_batch_error(asyncio.TimeoutError())
+    assert api.is_retryable_batch_error(api.CircuitOpenError("open"))
+    assert api.is_retryable_batch_error(api.IncompleteReviewError("timeout", retryable=True))
+    assert not api.is_retryable_batch_error(api.IncompleteReviewError("content filter", retryable=False))
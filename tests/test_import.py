@@ -0,0 +1,19 @@
+import os
+import subprocess
+import sys
+
+from import_benchmark import LAZY_MODULES, REPO_DIR
+
+
+def test_importing_api_creates_no_files_and_defers_heavy_modules(tmp_path):
+    """api のインポートではファイルを作らず、重いライブラリも読み込まない（最初の利用や起動時の準備で行う）"""
+    env = {key: value for key, value in os.environ.items()
+           if key not in ("BATCH_REVIEW_DB_PATH", "SKILLSHEET_REPOSITORY_PATH")}
+    env.update(PYTHONPATH=REPO_DIR, PYTHONDONTWRITEBYTECODE="1",
+               LLM_CACHE_ENABLED="true", SKILLSHEET_REPOSITORY_ENABLED="true")
+    code = f"import sys, api; print([m for m in {LAZY_MODULES!r} if m in sys.modules])"
+    output = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, check=True).stdout
+
+    assert output.strip() == "[]"
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,91 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import ai_question
+from llm_cache import SQLiteLLMCache, make_cache_key
+from llm_pool import Deployment, DeploymentPool
+
+MESSAGES = [{"role": "system", "content": "面接官です。"}, {"role": "user", "content": "回答:  Javaで開発しました"}]
+PARAMS = {"model": "gpt-4o-mini", "temperature": 0.7, "max_tokens": 200}
+
+
+def test_make_cache_key_normalizes_width_and_whitespace():
+    variant = [{"role": "system", "content": " 面接官です。"}, {"role": "user", "content": "回答: Ｊａｖａで開発しました\n"}]
+    assert make_cache_key(MESSAGES, PARAMS) == make_cache_key(variant, PARAMS)
+
+
+def test_make_cache_key_depends_on_role_content_and_params():
+    key = make_cache_key(MESSAGES, PARAMS)
+    assert key != make_cache_key([dict(m, role="user") for m in MESSAGES], PARAMS)
+    assert key != make_cache_key(MESSAGES[:1], PARAMS)
+    assert key != make_cache_key(MESSAGES, dict(PARAMS, max_tokens=300))
+    assert key != make_cache_key(MESSAGES, dict(PARAMS, model="gpt-4o"))
+
+
+def test_sqlite_cache_round_trip(tmp_path):
+    cache = SQLiteLLMCache(str(tmp_path / "llm_cache.db"))
+    key = make_cache_key(MESSAGES, PARAMS)
+    assert cache.get(key) is None
+    cache.set(key, '{"question": "q"}')
+    assert cache.get(key) == '{"question": "q"}'
+
+
+def test_pool_cache_key_uses_routable_deployments_not_configured_name(tmp_path, monkeypatch):
+    """キャッシュキーは振り分けうるデプロイメントで決まり、クラスが違えば（別のモデルなら）別のキーになる"""
+    pool = DeploymentPool([
+        Deployment("fast-1", "http://fast-1", "k", "gpt-4o-mini", deployment_class="fast"),
+        Deployment("fast-2", "http://fast-2", "k", "gpt-4o-mini", deployment_class="fast"),
+        Deployment("large-1", "http://large-1", "k", "gpt-4o", deployment_class="large"),
+    ], lambda deployment: None)
+    monkeypatch.setattr(ai_question, "_llm_pool", pool)
+    monkeypatch.setattr(ai_question, "_llm_cache", SQLiteLLMCache(str(tmp_path / "llm_cache.db")))
+    monkeypatch.setattr(ai_question, "_llm_cache_loaded", True)
+
+    assert pool.models("fast") == ["gpt-4o-mini"]
+    kwargs = ai_question._completion_kwargs(MESSAGES, 200, True)
+    followup = ai_question._cache_key(kwargs, ai_question._routable_models("followup", None))
+    assert followup == ai_question._cache_key(dict(kwargs, model="other"),
+                                              ai_question._routable_models("followup", None))
+    assert followup != ai_question._cache_key(kwargs, ai_question._routable_models("followup", "large"))
+
+    ai_question.llm_cache_bypass.set(True)
+    try:
+        assert ai_question._cache_key(kwargs, ["gpt-4o-mini"]) is None
+    finally:
+        ai_question.llm_cache_bypass.set(False)
+
+
+def test_async_completion_reads_and_writes_cache_off_event_loop(tmp_path, monkeypatch):
+    """非同期の呼び出しでは、キャッシュの読み書き（SQLite）をイベントループのスレッドで行わない"""
+    threads = []
+
+    class RecordingCache(SQLiteLLMCache):
+        def _get(self, key):
+            threads.append(threading.get_ident())
+            return super()._get(key)
+
+        def _set(self, key, value):
+            threads.append(threading.get_ident())
+            super()._set(key, value)
+
+    async def create(**kwargs):
+        message = SimpleNamespace(content='{"question": "q"}')
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+    deployment = Deployment("fast-1", "http://fast-1", "k", "gpt-4o-mini", deployment_class="fast")
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(ai_question, "_llm_pool", DeploymentPool([deployment], lambda d: client))
+    monkeypatch.setattr(ai_question, "_llm_cache", RecordingCache(str(tmp_path / "llm_cache.db")))
+    monkeypatch.setattr(ai_question, "_llm_cache_loaded", True)
+
+    async def scenario():
+        loop_thread = threading.get_ident()
+        first = await ai_question._chat_completion_async(MESSAGES, 200, json_mode=True, cacheable=True)
+        chunks = [c async for c in ai_question._chat_completion_stream_async(MESSAGES, 200, json_mode=True,
+                                                                               cacheable=True)]
+        return loop_thread, first, chunks
+
+    loop_thread, first, chunks = asyncio.run(scenario())
+    assert first == '{"question": "q"}' and chunks == [first]
+    assert len(threads) == 3 and loop_thread not in threads
@@ -0,0 +1,70 @@
+import pytest
+
+import llm_resilience
+from llm_pool import Deployment, DeploymentPool
+from llm_resilience import CircuitOpenError
+
+
+def make_pool(*deployments):
+    created = []
+
+    def client_factory(deployment):
+        created.append(deployment.name)
+        return object()
+
+    return DeploymentPool(list(deployments), client_factory), created
+
+
+def test_choose_prefers_least_loaded_deployment_in_class():
+    a = Deployment("a", "http://a", "k", "gpt-4o-mini", deployment_class="fast")
+    b = Deployment("b", "http://b", "k", "gpt-4o-mini", deployment_class="fast")
+    large = Deployment("large", "http://large", "k", "gpt-4o", deployment_class="large")
+    pool, created = make_pool(a, b, large)
+
+    a.observe_latency(0.5)
+    b.observe_latency(1.0)
+    assert pool.choose("fast") is a
+    # 処理中の件数が増えると、応答時間が遅い方にも振り分ける
+    a.begin()
+    a.begin()
+    assert pool.choose("fast") is b
+    assert pool.choose("large") is large
+    assert created == ["a", "b", "large"]
+
+
+def test_choose_falls_back_to_all_deployments_for_unknown_class():
+    only = Deployment("only", "http://only", "k", "gpt-4o-mini")
+    pool, _ = make_pool(only)
+    assert pool.choose("fast") is only
+    assert pool.models("fast") == ["gpt-4o-mini"]
+
+
+def test_choose_skips_excluded_and_open_deployments(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_resilience.time, "monotonic", lambda: now[0])
+    a = Deployment("a", "http://a", "k", "gpt-4o-mini")
+    b = Deployment("b", "http://b", "k", "gpt-4o-mini")
+    pool, _ = make_pool(a, b)
+
+    assert pool.choose(exclude=[a]) is b
+    for _ in range(a.breaker.failure_threshold):
+        a.breaker.record_failure()
+    assert all(pool.choose() is b for _ in range(5))
+
+    for _ in range(b.breaker.failure_threshold):
+        b.breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        pool.choose()
+
+    # 回復を確認する時刻になったら、切り離したデプロイメントを試しに使う
+    now[0] += a.breaker.recovery_seconds
+    assert pool.choose() in (a, b)
+    assert {a.breaker.state, b.breaker.state} == {"half_open", "open"}
+
+
+def test_rate_limits_are_split_across_workers(monkeypatch):
+    monkeypatch.setattr(llm_resilience, "LLM_RATE_LIMIT_WORKERS", 4)
+    deployment = Deployment("a", "http://a", "k", "gpt-4o-mini", tokens_per_minute=60000, requests_per_minute=2)
+    assert deployment.limiter.stats()["available_tokens"] == 60000 / 4 / 60 * llm_resilience.LLM_RATE_BURST_SECONDS
+    assert llm_resilience.per_worker_limit(2) == 1
+    assert llm_resilience.per_worker_limit(0) == 0
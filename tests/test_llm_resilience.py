@@ -0,0 +1,223 @@
+import asyncio
+
+import pytest
+
+import llm_resilience
+from llm_resilience import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    CircuitBreaker,
+    LatencyTracker,
+    TokenBucketLimiter,
+    hedge_delay,
+    run_hedged,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(llm_resilience.time, "monotonic", fake)
+    return fake
+
+
+def test_circuit_opens_after_consecutive_failures_and_recovers_after_probe(clock):
+    breaker = CircuitBreaker("test-recover", failure_threshold=3, recovery_seconds=30)
+    for _ in range(2):
+        breaker.record_failure()
+    breaker.record_success()
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow() and not breaker.probe_due()
+
+    # 回復の確認時刻を過ぎたら、試しの呼び出しを1回だけ通す
+    clock.now += 30
+    assert breaker.probe_due()
+    assert breaker.allow() and breaker.state == "half_open"
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.stats()["opened_count"] == 1 and breaker.stats()["rejected_count"] == 2
+
+
+def test_failed_probe_reopens_circuit(clock):
+    breaker = CircuitBreaker("test-reopen", failure_threshold=1, recovery_seconds=10)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    clock.now += 10
+    assert breaker.allow()
+
+
+def test_hedge_delay_requires_enough_samples(monkeypatch):
+    monkeypatch.setattr(llm_resilience, "LLM_HEDGE_ENABLED", True)
+    monkeypatch.setattr(llm_resilience, "LLM_HEDGE_MIN_SAMPLES", 10)
+    monkeypatch.setattr(llm_resilience, "LLM_HEDGE_MIN_DELAY", 0.5)
+    tracker = LatencyTracker()
+    for _ in range(9):
+        tracker.observe(2.0)
+    assert hedge_delay(tracker) is None
+    tracker.observe(3.0)
+    assert hedge_delay(tracker) == 3.0
+
+    fast = LatencyTracker()
+    for _ in range(10):
+        fast.observe(0.1)
+    assert hedge_delay(fast) == 0.5
+
+    monkeypatch.setattr(llm_resilience, "LLM_HEDGE_ENABLED", False)
+    assert hedge_delay(tracker) is None
+
+
+def make_factory(durations, results=None):
+    """呼び出すたびに durations の順に時間がかかる呼び出し（結果は呼び出し順の番号か results の値）"""
+    calls = []
+    cancelled = []
+
+    async def factory():
+        n = len(calls)
+        calls.append(n)
+        try:
+            await asyncio.sleep(durations[n])
+        except asyncio.CancelledError:
+            cancelled.append(n)
+            raise
+        result = results[n] if results else n
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    return factory, calls, cancelled
+
+
+def test_run_hedged_without_delay_calls_once():
+    factory, calls, _ = make_factory([0.01])
+    assert asyncio.run(run_hedged(factory, None)) == 0
+    assert calls == [0]
+
+
+def test_run_hedged_returns_hedge_when_primary_is_slow_and_cancels_primary():
+    factory, calls, cancelled = make_factory([1.0, 0.01])
+    assert asyncio.run(run_hedged(factory, 0.05)) == 1
+    assert calls == [0, 1] and cancelled == [0]
+
+
+def test_run_hedged_does_not_hedge_fast_primary():
+    factory, calls, _ = make_factory([0.01, 0.01])
+    assert asyncio.run(run_hedged(factory, 0.5)) == 0
+    assert calls == [0]
+
+
+def test_run_hedged_falls_back_to_primary_when_hedge_fails():
+    factory, _, _ = make_factory([0.1, 0.01], results=["primary", RuntimeError("hedge failed")])
+    assert asyncio.run(run_hedged(factory, 0.05)) == "primary"
+
+
+def test_run_hedged_raises_when_both_fail():
+    factory, _, _ = make_factory([0.1, 0.01], results=[RuntimeError("primary"), RuntimeError("hedge")])
+    with pytest.raises(RuntimeError, match="primary"):
+        asyncio.run(run_hedged(factory, 0.05))
+
+
+def test_run_hedged_discards_result_that_finished_with_the_winner():
+    """両方がほぼ同時に成功した場合、使わなかった方の結果を discard に渡す（ストリームを閉じられるように）"""
+    calls = []
+    discarded = []
+
+    async def scenario():
+        ready = asyncio.Event()
+
+        async def factory():
+            n = len(calls)
+            calls.append(n)
+            if n == 0:
+                await ready.wait()
+            else:
+                ready.set()
+            return n
+
+        async def discard(result):
+            discarded.append(result)
+
+        return await run_hedged(factory, 0.01, discard=discard)
+
+    result = asyncio.run(scenario())
+    assert calls == [0, 1]
+    assert sorted([result] + discarded) == [0, 1]
+
+
+def test_disabled_limiter_never_waits():
+    limiter = TokenBucketLimiter(0, 0)
+    assert not limiter.enabled
+    assert asyncio.run(limiter.acquire(10_000)) == 0.0
+
+
+def test_limiter_serves_higher_priority_first():
+    async def scenario():
+        # 1秒あたり10リクエスト、同時に通すのは1件まで
+        limiter = TokenBucketLimiter(0, 600, burst_seconds=0.1)
+        assert await limiter.acquire(100) == 0.0
+        order = []
+
+        async def request(name, priority):
+            await limiter.acquire(100, priority)
+            order.append(name)
+
+        background = asyncio.create_task(request("background", PRIORITY_BACKGROUND))
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(request("interactive", PRIORITY_INTERACTIVE))
+        await asyncio.sleep(0)
+        assert limiter.queue_depth() == {PRIORITY_INTERACTIVE: 1, PRIORITY_BACKGROUND: 1}
+        await asyncio.gather(background, interactive)
+        return order, limiter.queue_depth()
+
+    order, depth = asyncio.run(scenario())
+    assert order == ["interactive", "background"]
+    assert depth == {}
+
+
+def test_limiter_accounts_actual_tokens_and_pauses():
+    async def scenario():
+        limiter = TokenBucketLimiter(6000, 0, burst_seconds=10)
+        assert limiter.stats()["available_tokens"] == 1000
+        await limiter.acquire(800)
+        # 推定より少なかった分は戻す
+        limiter.adjust(800, 300)
+        assert limiter.stats()["available_tokens"] == pytest.approx(700, abs=1)
+        assert await limiter.acquire(600) == 0.0
+
+        limiter.pause(0.1)
+        waited = await limiter.acquire(1)
+        return waited
+
+    assert asyncio.run(scenario()) >= 0.09
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        limiter = TokenBucketLimiter(0, 60, burst_seconds=1)
+        await limiter.acquire(1)
+        waiter = asyncio.create_task(limiter.acquire(1))
+        await asyncio.sleep(0.01)
+        assert limiter.queue_depth() == {PRIORITY_BACKGROUND: 1}
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return limiter.queue_depth()
+
+    assert asyncio.run(scenario()) == {}
@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+import rule_engine
+from rule_engine import compile_rule, compile_rules
+
+RULES_TEXT = open(os.path.join(os.path.dirname(rule_engine.__file__), "review_rules.txt"), encoding="utf-8").read()
+
+
+def test_compile_rule_kinds_of_bundled_rules():
+    rule_set = compile_rules(RULES_TEXT)
+    assert [rule.kind for rule in rule_set.rules] == ["keyword", "regex", "judgment", "regex"]
+    assert rule_set.judgment_rules_text == "自分の経歴を説明する際には予め要点をまとめておくこと。"
+
+
+def test_compile_rule_extracts_forbidden_terms():
+    rule = compile_rule("基本的に自社の会社名（リューマン・RYUMAN）は出さないこと。")
+    assert rule.kind == "keyword"
+    assert [v["match"] for v in rule.check("前職はRYUMANでした")] == ["RYUMAN"]
+    assert rule.check("前職はSIerでした") == []
+
+
+def test_compile_rule_without_terms_is_judgment():
+    assert compile_rule("社外秘の情報は出さないこと。").kind == "judgment"
+
+
+def test_work_condition_question():
+    rule = compile_rule("勤務環境などは質問しないこと。")
+    assert rule.check("残業はどのくらいありますか？")
+    assert rule.check("残業を減らす工夫をしました。") == []
+
+
+def test_needs_judgment_depends_on_answer_length(monkeypatch):
+    monkeypatch.setattr(rule_engine, "REVIEW_JUDGMENT_MIN_CHARS", 10)
+    rule_set = compile_rules(RULES_TEXT)
+    assert not rule_set.needs_judgment("  短い回答  ")
+    assert rule_set.needs_judgment("十分な長さのある回答です。")
+
+    only_local = compile_rules("自社の人間に「さん」は付けないこと。")
+    assert not only_local.needs_judgment("十分な長さのある回答です。")
+
+
+HONORIFIC_RULE = compile_rule("自社の人間に「さん」は付けないこと。")
+
+
+@pytest.mark.parametrize("answer, match", [
+    ("弊社の田中さんと進めました。", "弊社の田中さん"),
+    ("弊社の部長の田中さんに相談しました。", "弊社の部長の田中さん"),
+    ("当社営業部の佐藤さんが窓口です。", "当社営業部の佐藤さん"),
+    ("上司の田中さんに報告しました。", "上司の田中さん"),
+    ("同僚のジョンさんとペアで実装しました。", "同僚のジョンさん"),
+])
+def test_own_company_honorific_is_detected(answer, match):
+    assert [v["match"] for v in HONORIFIC_RULE.check(answer)] == [match]
+
+
+@pytest.mark.parametrize("answer", [
+    "弊社のお客様である田中様にご説明しました。",
+    "弊社のお客様の田中さんと要件を詰めました。",
+    "当社の取引先の山田さんから依頼がありました。",
+    "先方の上司の田中さんにも同席いただきました。",
+    "クライアントのリーダーの佐藤さんと調整しました。",
+    "部長の田中さん（お客様側）に承認をいただきました。",
+    "社内の皆さんに共有しました。",
+])
+def test_honorific_for_clients_is_not_flagged(answer):
+    assert HONORIFIC_RULE.check(answer) == []
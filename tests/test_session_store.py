@@ -0,0 +1,23 @@
+from session_store import SQLiteSessionStore
+
+
+def count_rows(store: SQLiteSessionStore) -> int:
+    return store._conn().execute(f"SELECT COUNT(*) FROM {store.table}").fetchone()[0]
+
+
+def test_set_purges_expired_rows_written_without_create(tmp_path):
+    """create() を通さずに set() だけで書き込むデータ（登録済みの企業情報など）も期限切れで削除される"""
+    store = SQLiteSessionStore(str(tmp_path / "sessions.db"), ttl_seconds=-1, table="profiles")
+    store.set("old", {"company_info": "c"})
+    store.ttl_seconds = 3600
+    store.set("new", {"company_info": "c"})
+    assert count_rows(store) == 1
+    assert store.get("old") is None and store.get("new") == {"company_info": "c"}
+
+
+def test_set_keeps_row_count_within_max_sessions(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.db"), max_sessions=3, table="profiles")
+    for i in range(5):
+        store.set(f"profile-{i}", {"company_info": str(i)})
+    assert count_rows(store) == 3
+    assert store.get("profile-4") is not None
@@ -0,0 +1,47 @@
+from skillsheet_index import BM25Index, build_skillsheet_context, get_project_index, tokenize
+from token_estimate import estimate_tokens
+
+PROJECTS = [
+    {"No": str(i + 1), "プロジェクト名・業務概要": f"{domain}向けシステム開発", "使用言語": language, "DB": db,
+     "担当工程": "詳細設計、実装/テスト"}
+    for i, (domain, language, db) in enumerate([
+        ("保険会社", "Java", "Oracle"),
+        ("物流会社", "Python", "PostgreSQL"),
+        ("銀行", "C#", "SQL Server"),
+        ("小売業", "Go", "MySQL"),
+    ] * 5)
+]
+SKILLSHEET = {"basic_info": {"name": "山田 太郎"}, "self_pr": "", "certifications": [], "projects": PROJECTS}
+
+
+def test_tokenize_keeps_ascii_words_and_japanese_bigrams():
+    assert tokenize("Ｃ＃で開発") == ["c#", "で開", "開発"]
+    assert tokenize("ASP.NET Core") == ["asp.net", "core"]
+    assert tokenize("保") == ["保"]
+
+
+def test_bm25_ranks_matching_documents_first():
+    index = BM25Index(["Java Spring 保険", "Python Django 物流", "Java Struts 銀行"])
+    ranked = index.search("Javaの保険システム", 3)
+    assert [position for position, _ in ranked] == [0, 2, 1]
+    assert ranked[-1][1] == 0.0
+
+
+def test_small_skillsheet_is_returned_whole():
+    small = dict(SKILLSHEET, projects=PROJECTS[:2])
+    text = build_skillsheet_context(small, "Python", "small", token_budget=10_000)
+    assert "保険会社向け" in text and "物流会社向け" in text
+    assert "関連するプロジェクト経歴" not in text
+
+
+def test_large_skillsheet_selects_relevant_projects_within_budget():
+    text = build_skillsheet_context(SKILLSHEET, "PostgreSQLの性能改善", "large", top_k=3, token_budget=600)
+    assert estimate_tokens(text) <= 600
+    assert "関連するプロジェクト経歴（全20件中3件）" in text
+    assert "物流会社向け" in text and "保険会社向け" not in text
+    # 選ばれなかったプロジェクトの技術も集計として残る
+    assert "Java(5件)" in text
+
+
+def test_project_index_is_reused_per_skillsheet():
+    assert get_project_index("same-key", PROJECTS) is get_project_index("same-key", PROJECTS)
@@ -0,0 +1,123 @@
+import io
+import re
+import zipfile
+
+import openpyxl
+import pytest
+
+from benchmark import build_sample_skillsheet
+from skillsheet_parser import (DEFAULT_PROJECT_LAYOUT, _as_array, detect_project_layout, parse_skillsheet_data,
+                                read_skillsheet_grid)
+
+PROJECTS = [
+    (1, "2018/04～2019/03", "保険業界向けシステム開発", "PG/5名", "Linux", "Oracle", "Spring", "Java", [3, 4]),
+    (2, "2019/04～2021/03", "物流業界向け在庫管理", "SE/10名", "ー", "PostgreSQL", "Django", "Python", [1, 2, 3]),
+    (3, "2021/04～2023/03", "銀行向け勘定系移行", "PL/3名", "Windows", "ー", "ー", "C#", [0, 1, 5]),
+]
+
+
+def build_skillsheet(**options) -> bytes:
+    """負荷試験と同じ作り方で、PROJECTS を載せたスキルシートを作る（options は build_sample_skillsheet の引数）"""
+    return build_sample_skillsheet(projects=PROJECTS, **options)
+
+
+def test_openpyxl_backend_matches_pandas_backend():
+    contents = build_skillsheet()
+    data = parse_skillsheet_data(contents, backend="openpyxl")
+    assert data == parse_skillsheet_data(contents, backend="pandas")
+    assert [p["担当工程"] for p in data["projects"]] == ["実装/テスト、結合テスト", "基本設計、詳細設計、実装/テスト",
+                                                      "要件定義、基本設計、保守/運用"]
+
+
+def test_benchmark_sample_skillsheet_is_parsed():
+    """負荷試験の入力（既定の引数）も、テストと同じレイアウトとして全プロジェクトが読める"""
+    data = parse_skillsheet_data(build_sample_skillsheet(), backend="openpyxl")
+    assert data == parse_skillsheet_data(build_sample_skillsheet(), backend="pandas")
+    assert [p["No"] for p in data["projects"]] == [str(n) for n in range(1, 9)]
+
+
+def test_columns_beyond_the_standard_width_are_read():
+    """資格や作業工程の列が30列目より右にあっても取りこぼさない"""
+    contents = build_skillsheet(col_shift=30, certifications=((8, "基本情報技術者"), (40, "応用情報技術者")))
+    data = parse_skillsheet_data(contents, backend="openpyxl")
+    assert data == parse_skillsheet_data(contents, backend="pandas")
+    assert data["certifications"] == ["基本情報技術者", "応用情報技術者"]
+    assert data["projects"] == parse_skillsheet_data(build_skillsheet(), backend="openpyxl")["projects"]
+
+
+def with_dimension(contents: bytes, ref: str) -> bytes:
+    """シートに記録された範囲（dimension）を書き換えた .xlsx を返す（範囲を正しく記録しないアプリの再現）"""
+    source = zipfile.ZipFile(io.BytesIO(contents))
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as target:
+        for name in source.namelist():
+            data = source.read(name)
+            if name == "xl/worksheets/sheet1.xml":
+                data = re.sub(rb'<dimension ref="[^"]*"', f'<dimension ref="{ref}"'.encode(), data)
+            target.writestr(name, data)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("ref", ["A1:H8", "A1:C3"])
+def test_stale_dimension_does_not_truncate_sheet(ref):
+    expected = parse_skillsheet_data(build_skillsheet(), backend="openpyxl")
+    contents = with_dimension(build_skillsheet(), ref)
+    assert parse_skillsheet_data(contents, backend="openpyxl") == expected
+    assert parse_skillsheet_data(contents, backend="pandas") == expected
+    assert len(expected["projects"]) == 3 and expected["basic_info"]
+
+
+def test_detect_project_layout_follows_header_labels():
+    layout = detect_project_layout(_as_array(read_skillsheet_grid(io.BytesIO(build_skillsheet()))))
+    assert layout == DEFAULT_PROJECT_LAYOUT
+
+    contents = build_skillsheet(row_shift=3, col_shift=2)
+    shifted = detect_project_layout(_as_array(read_skillsheet_grid(io.BytesIO(contents))))
+    assert (shifted["header_row"], shifted["data_start"]) == (12, 14)
+    assert shifted["columns"] == {field: col + 2 for field, col in DEFAULT_PROJECT_LAYOUT["columns"].items()}
+    assert shifted["phase_columns"] == {col + 2: name for col, name in DEFAULT_PROJECT_LAYOUT["phase_columns"].items()}
+
+
+def test_projects_are_extracted_from_shifted_sheet():
+    expected = parse_skillsheet_data(build_skillsheet(), backend="openpyxl")["projects"]
+    assert [p["No"] for p in expected] == ["1", "2", "3"]
+    assert "サーバーOS" not in expected[1] and "DB" not in expected[2]
+    for backend in ("openpyxl", "pandas"):
+        assert parse_skillsheet_data(build_skillsheet(row_shift=3, col_shift=2), backend=backend)["projects"] == expected
+
+
+def test_sheet_without_phase_name_row_keeps_first_project():
+    """工程名の行が無いシートでは、見出しの次の行（1件目のプロジェクト）の●を工程名とみなさない"""
+    expected = parse_skillsheet_data(build_skillsheet(), backend="openpyxl")["projects"]
+    contents = build_skillsheet(phase_names=False)
+    layout = detect_project_layout(_as_array(read_skillsheet_grid(io.BytesIO(contents))))
+    assert layout["data_start"] == DEFAULT_PROJECT_LAYOUT["header_row"] + 1
+    assert layout["phase_columns"] == DEFAULT_PROJECT_LAYOUT["phase_columns"]
+    for backend in ("openpyxl", "pandas"):
+        assert parse_skillsheet_data(contents, backend=backend)["projects"] == expected
+
+
+def test_parsing_from_path_matches_parsing_from_bytes(tmp_path):
+    contents = build_skillsheet()
+    path = tmp_path / "skillsheet.xlsx"
+    path.write_bytes(contents)
+    assert parse_skillsheet_data(str(path)) == parse_skillsheet_data(contents)
+
+
+def test_xls_backend_matches_pandas_backend(tmp_path):
+    xlwt = pytest.importorskip("xlwt")
+    pytest.importorskip("xlrd")
+
+    source = openpyxl.load_workbook(io.BytesIO(build_skillsheet()))["スキルシート"]
+    book = xlwt.Workbook()
+    sheet = book.add_sheet("スキルシート")
+    for row in source.iter_rows():
+        for cell in row:
+            if cell.value is not None:
+                sheet.write(cell.row - 1, cell.column - 1, cell.value)
+    path = tmp_path / "skillsheet.xls"
+    book.save(str(path))
+
+    data = parse_skillsheet_data(str(path), backend="openpyxl")
+    assert data == parse_skillsheet_data(str(path), backend="pandas")
+    assert data["projects"] == parse_skillsheet_data(build_skillsheet())["projects"]
@@ -0,0 +1,81 @@
+import datetime
+import time
+
+import pytest
+
+from skillsheet_repository import SkillsheetRepository, index_terms, period_end, query_term
+
+
+def sheet(name, projects, certifications=()):
+    return {"basic_info": {"氏名": name}, "self_pr": "", "certifications": list(certifications), "projects": projects}
+
+
+def project(period, language="", db="", phase=""):
+    return {"期間": period, "使用言語": language, "DB": db, "サーバーOS": "", "FW/MW/ツール": "", "担当工程": phase}
+
+
+@pytest.fixture
+def repository(tmp_path):
+    repo = SkillsheetRepository(str(tmp_path / "skillsheets.db"), retention_seconds=3600)
+    repo.put("a", sheet("A", [project("2015/04～2016/03", "Java", "Oracle"), project("2022/04～現在", "Python", "MySQL")]))
+    repo.put("b", sheet("B", [project("2021/04～2022/03", "Java, Python", "Oracle", "詳細設計、実装/テスト")],
+                        ["2019年4月 基本情報 技術者"]))
+    repo.put("c", sheet("C", [project("2010/01～2011/01", "ｊａｖａ", "PostgreSQL")]))
+    return repo
+
+
+def shas(result):
+    return sorted(item["sha256"] for item in result["results"])
+
+
+def test_period_end_and_query_term():
+    today = datetime.date(2026, 10, 1)
+    assert period_end("2019/04～2021/3", today) == 202103
+    assert period_end("2019年4月～現在", today) == 202610
+    assert period_end("不明", today) is None
+    assert query_term("certification", "基本情報　技術者") == query_term("certification", "基本情報技術者")
+
+
+def test_index_terms_deduplicates_within_project():
+    terms = index_terms(sheet("X", [project("2020/01～2020/12", "Java/Java, SQL")]))
+    assert sorted(term for key, term, _, _ in terms if key == "language") == ["java", "sql"]
+
+
+def test_search_intersects_all_conditions(repository):
+    assert shas(repository.search({"language": ["Java"]})) == ["a", "b", "c"]
+    assert shas(repository.search({"language": ["Java"], "db": ["Oracle"]})) == ["a", "b"]
+    assert shas(repository.search({"language": ["java"], "certification": ["基本情報技術者"]})) == ["b"]
+    assert repository.search({"language": ["COBOL"]}) == {"total": 0, "results": []}
+
+
+def test_same_project_requires_one_project_to_match_every_condition(repository):
+    # A は Java と MySQL を別のプロジェクトで使っている
+    assert shas(repository.search({"language": ["Java"], "db": ["MySQL"]})) == ["a"]
+    assert shas(repository.search({"language": ["Java"], "db": ["MySQL"]}, same_project=True)) == []
+    result = repository.search({"language": ["Python"], "db": ["MySQL"]}, same_project=True)
+    assert shas(result) == ["a"] and result["results"][0]["matched_projects"] == [1]
+
+
+def test_within_years_uses_project_end(repository):
+    assert shas(repository.search({"language": ["Java"]}, within_years=8)) == ["b"]
+    assert shas(repository.search({"phase": ["実装/テスト"]})) == ["b"]
+
+
+def test_delete_and_retention(repository):
+    assert repository.delete("c") is True
+    assert repository.delete("c") is False
+    assert repository.get("c") is None
+    assert shas(repository.search({"language": ["Java"]})) == ["a", "b"]
+
+    conn = repository._conn()
+    conn.execute("UPDATE skillsheets SET updated_at = ? WHERE sha256 = 'a'", (time.time() - 7200,))
+    assert repository.purge_expired() == 1
+    assert shas(repository.search({"language": ["Java"]})) == ["b"]
+    assert repository.stats()["skillsheets"] == 1
+
+
+def test_reupload_extends_retention(repository):
+    conn = repository._conn()
+    conn.execute("UPDATE skillsheets SET updated_at = 0 WHERE sha256 = 'b'")
+    assert repository.put("b", sheet("B", [])) is False
+    assert repository.purge_expired() == 0
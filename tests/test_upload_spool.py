@@ -0,0 +1,128 @@
+import asyncio
+import hashlib
+import os
+
+import pytest
+
+import skillsheet_cache
+import upload_spool
+from benchmark import build_sample_skillsheet
+from skillsheet_cache import SkillsheetCache
+from skillsheet_parser import parse_skillsheet_data
+from upload_spool import InvalidUploadError, UploadTooLargeError, receive_upload
+
+BOUNDARY = "test-boundary"
+
+
+class FakeRequest:
+    """multipart/form-data の本文を chunk_bytes ずつ返す Request の代わり（受信したバイト数を記録する）"""
+
+    def __init__(self, contents: bytes, fields=None, chunk_bytes: int = 1024, filename: str = "sheet.xlsx"):
+        parts = [f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+                 for name, value in (fields or {}).items()]
+        parts.append(f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+                     f'Content-Type: application/octet-stream\r\n\r\n'.encode() + contents + b"\r\n")
+        self.body = b"".join(parts) + f"--{BOUNDARY}--\r\n".encode()
+        self.headers = {"content-type": f"multipart/form-data; boundary={BOUNDARY}"}
+        self.chunk_bytes = chunk_bytes
+        self.received = 0
+
+    async def stream(self):
+        for start in range(0, len(self.body), self.chunk_bytes):
+            chunk = self.body[start:start + self.chunk_bytes]
+            self.received += len(chunk)
+            yield chunk
+
+
+def spool_upload(contents: bytes, max_bytes: int, memory_bytes: int):
+    return asyncio.run(receive_upload(FakeRequest(contents), max_bytes, memory_bytes=memory_bytes))[0]
+
+
+@pytest.fixture
+def spool_dir(tmp_path, monkeypatch):
+    path = tmp_path / "spool"
+    path.mkdir()
+    monkeypatch.setattr(upload_spool, "UPLOAD_SPOOL_DIR", str(path))
+    return path
+
+
+def test_small_upload_stays_in_memory(spool_dir):
+    contents = b"x" * 3000
+    spool = spool_upload(contents, max_bytes=10_000, memory_bytes=4096)
+    assert spool.in_memory
+    assert spool.source() == contents
+    assert spool.sha256 == hashlib.sha256(contents).hexdigest()
+    assert os.listdir(spool_dir) == []
+
+
+def test_large_upload_is_spooled_to_one_file(spool_dir):
+    contents = bytes(range(256)) * 40
+    spool = spool_upload(contents, max_bytes=20_000, memory_bytes=4096)
+    try:
+        path = spool.source()
+        assert os.listdir(spool_dir) == [os.path.basename(path)]
+        with open(path, "rb") as f:
+            assert f.read() == contents
+        assert spool.size == len(contents)
+        assert spool.sha256 == hashlib.sha256(contents).hexdigest()
+    finally:
+        spool.close()
+    assert os.listdir(spool_dir) == []
+
+
+def test_too_large_upload_stops_receiving_and_removes_partial_file(spool_dir):
+    request = FakeRequest(b"x" * 100_000)
+    with pytest.raises(UploadTooLargeError):
+        asyncio.run(receive_upload(request, max_bytes=8000, memory_bytes=1024))
+    # 上限を超えた時点で受信をやめる（残りの本文は読まない）
+    assert request.received < 10_000
+    assert os.listdir(spool_dir) == []
+
+
+def test_form_fields_are_returned_with_the_file(spool_dir):
+    request = FakeRequest(b"contents", fields={"session_id": "abc", "mode": "fast"}, chunk_bytes=7)
+    spool, filename, fields = asyncio.run(receive_upload(request, max_bytes=1000))
+    assert (spool.source(), filename, fields) == (b"contents", "sheet.xlsx", {"session_id": "abc", "mode": "fast"})
+
+
+def test_request_without_file_part_is_rejected(spool_dir):
+    not_multipart = FakeRequest(b"x")
+    not_multipart.headers = {"content-type": "application/json"}
+    with pytest.raises(InvalidUploadError):
+        asyncio.run(receive_upload(not_multipart, max_bytes=1000))
+
+    other_field = FakeRequest(b"x")
+    other_field.body = other_field.body.replace(b'name="file"', b'name="other"')
+    with pytest.raises(InvalidUploadError):
+        asyncio.run(receive_upload(other_field, max_bytes=1000))
+    assert os.listdir(spool_dir) == []
+
+
+def test_cache_miss_parses_the_spool_file_in_place(spool_dir, tmp_path, monkeypatch):
+    """キャッシュミスの場合も、一時ファイルを書き直さずにそのパスを解析に渡す"""
+    contents = build_sample_skillsheet(3)
+    parsed_sources = []
+
+    async def parse(source):
+        parsed_sources.append(source)
+        assert len(os.listdir(spool_dir)) == 1
+        return parse_skillsheet_data(source)
+
+    monkeypatch.setattr(skillsheet_cache, "parse_skillsheet_data_async", parse)
+    cache = SkillsheetCache(cache_dir=str(tmp_path / "cache"))
+
+    async def scenario():
+        spool, _, _ = await receive_upload(FakeRequest(contents), max_bytes=len(contents), memory_bytes=1024)
+        try:
+            first = await cache.get_or_parse_async(spool.source(), spool.sha256)
+            second = await cache.get_or_parse_async(spool.source(), spool.sha256)
+            return spool.path, first, second
+        finally:
+            spool.close()
+
+    path, (entry, hit), (_, second_hit) = asyncio.run(scenario())
+    assert parsed_sources == [path]
+    assert (hit, second_hit) == (False, True)
+    assert entry["data"] == parse_skillsheet_data(contents)
+    # ディスクのキャッシュからも読める（他のワーカーや再起動後）
+    assert SkillsheetCache(cache_dir=str(tmp_path / "cache")).get(hashlib.sha256(contents).hexdigest())
@@ -0,0 +1,7 @@
+def estimate_tokens(text: str) -> int:
+    """
+    プロンプトのトークン数を概算する（トークナイザーを読み込まずに、送信前の見積もりやプロンプトの予算の判定に使う）。
+    日本語はおおむね1文字1トークン、英数字は4文字1トークンとして数える。
+    """
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return (len(text) - ascii_chars) + ascii_chars // 4
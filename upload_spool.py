@@ -0,0 +1,217 @@
+import os
+import asyncio
+import hashlib
+import tempfile
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple, Union
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ModuleNotFoundError:  # python-multipart 0.0.13 より前
+    from multipart.multipart import MultipartParser, parse_options_header
+
+# この大きさまではメモリ上に置き、超えたら一時ファイルに書き出す
+UPLOAD_SPOOL_MEMORY_BYTES = int(os.getenv("UPLOAD_SPOOL_MEMORY_BYTES", str(1024 * 1024)))
+# 一時ファイルの置き場所（未設定の場合は OS の一時ディレクトリ）
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None
+# フォームのファイル以外の項目（session_id など）の合計の大きさの上限
+UPLOAD_FORM_FIELDS_MAX_BYTES = 64 * 1024
+
+
+class UploadTooLargeError(ValueError):
+    """アップロードが上限の大きさを超えた"""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(f"ファイルサイズが上限（{max_bytes} バイト）を超えています。")
+        self.max_bytes = max_bytes
+
+
+class InvalidUploadError(ValueError):
+    """multipart/form-data の形式が正しくない、またはファイルが含まれていない"""
+
+
+class SpooledUpload:
+    """
+    アップロードされたファイルを、読み込みながら SHA-256 を計算して保持する。
+    小さいファイルはメモリ上に、memory_bytes を超えたら一時ファイル（名前付き）に書き出す。
+    一時ファイルの場合はパスを解析に渡すため、解析用のプロセスプールにも内容をコピーせずに渡せる。
+    """
+
+    def __init__(self, max_bytes: int, memory_bytes: int = UPLOAD_SPOOL_MEMORY_BYTES):
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._buffer: Optional[BytesIO] = BytesIO()
+        self._file = None
+        self.path: Optional[str] = None
+
+    def writes_to_disk(self, chunk: bytes) -> bool:
+        """chunk を追加すると一時ファイルに書き込むことになるか（呼び出し側がスレッドで書き込むかを決めるのに使う）"""
+        return self._file is not None or self.size + len(chunk) > self.memory_bytes
+
+    def write(self, chunk: bytes) -> None:
+        """チャンクを追加する（上限を超えた時点で UploadTooLargeError）"""
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise UploadTooLargeError(self.max_bytes)
+        self._hash.update(chunk)
+        if self._file is None and self.size > self.memory_bytes:
+            self._rollover()
+        (self._file or self._buffer).write(chunk)
+
+    def _rollover(self) -> None:
+        self._file = tempfile.NamedTemporaryFile(prefix="skillsheet-", suffix=".upload", dir=UPLOAD_SPOOL_DIR,
+                                                 delete=False)
+        self.path = self._file.name
+        self._file.write(self._buffer.getbuffer())
+        self._buffer = None
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+    @property
+    def in_memory(self) -> bool:
+        return self._file is None
+
+    def flush(self) -> None:
+        """一時ファイルへの書き込みを確定する（パスを他のスレッド・プロセスから読めるようにする）"""
+        if self._file is not None:
+            self._file.flush()
+
+    def source(self) -> Union[bytes, str]:
+        """解析に渡す内容（メモリ上の場合はバイト列、一時ファイルの場合はそのパス。書き込み済みのファイルをそのまま読む）"""
+        if self._file is not None:
+            self._file.flush()
+            return self.path
+        return self._buffer.getvalue()
+
+    def close(self) -> None:
+        """一時ファイルを削除する"""
+        if self._file is not None:
+            self._file.close()
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+            self._file = None
+        self._buffer = None
+
+
+class _FormReceiver:
+    """
+    MultipartParser のコールバック。file_field のファイルの内容は pending に溜め（呼び出し側が SpooledUpload に書き込む）、
+    それ以外の項目は文字列として fields に保持する。同じ名前の2つ目以降のファイルは読み飛ばす。
+    """
+
+    def __init__(self, file_field: str):
+        self.file_field = file_field
+        self.filename: Optional[str] = None
+        self.fields: Dict[str, str] = {}
+        self.pending: List[bytes] = []
+        self._field_bytes = 0
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._name = ""
+        self._target: Optional[str] = None  # "file" / "field" / None（読み飛ばす）
+        self._data = bytearray()
+
+    def callbacks(self) -> Dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        }
+
+    def on_part_begin(self) -> None:
+        self._disposition = b""
+        self._data = bytearray()
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._disposition)
+        self._name = options.get(b"name", b"").decode("utf-8", "replace")
+        if b"filename" not in options:
+            self._target = "field"
+        elif self._name == self.file_field and self.filename is None:
+            self._target = "file"
+            self.filename = options[b"filename"].decode("utf-8", "replace")
+        else:
+            self._target = None
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._target == "file":
+            self.pending.append(bytes(data[start:end]))
+        elif self._target == "field":
+            self._field_bytes += end - start
+            if self._field_bytes > UPLOAD_FORM_FIELDS_MAX_BYTES:
+                raise InvalidUploadError("フォームの項目が大きすぎます。")
+            self._data.extend(data[start:end])
+
+    def on_part_end(self) -> None:
+        if self._target == "field":
+            self.fields[self._name] = self._data.decode("utf-8", "replace")
+
+    def take_pending(self) -> List[bytes]:
+        pending, self.pending = self.pending, []
+        return pending
+
+
+async def receive_upload(request, max_bytes: int, file_field: str = "file",
+                         memory_bytes: int = UPLOAD_SPOOL_MEMORY_BYTES) -> Tuple[SpooledUpload, str, Dict[str, str]]:
+    """
+    multipart/form-data のリクエスト本文を受信しながら解析し、file_field のファイルを SpooledUpload に書き込む。
+
+    UploadFile（Starlette が本文全体を自前の一時ファイルに受信してからハンドラーを呼ぶ）は使わない。
+    そのため、上限を超えた時点で受信をやめて UploadTooLargeError を送出でき（途中までの一時ファイルは削除する）、
+    内容を保持するのも SpooledUpload の1か所だけになる。一時ファイルへの書き込みはスレッドで行う。
+
+    Returns:
+        (SpooledUpload, ファイル名, ファイル以外の項目)
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type"))
+    if content_type != b"multipart/form-data" or not params.get(b"boundary"):
+        raise InvalidUploadError("multipart/form-data で送信してください。")
+
+    spool = SpooledUpload(max_bytes, memory_bytes)
+    receiver = _FormReceiver(file_field)
+    try:
+        parser = MultipartParser(params[b"boundary"], receiver.callbacks())
+        async for chunk in request.stream():
+            try:
+                parser.write(chunk)
+            except InvalidUploadError:
+                raise
+            except Exception as e:
+                raise InvalidUploadError(f"multipart/form-data の形式が正しくありません: {e}")
+            for data in receiver.take_pending():
+                if spool.writes_to_disk(data):
+                    await asyncio.to_thread(spool.write, data)
+                else:
+                    spool.write(data)
+        parser.finalize()
+        if receiver.filename is None:
+            raise InvalidUploadError(f"ファイル（{file_field}）が含まれていません。")
+        if not spool.in_memory:
+            await asyncio.to_thread(spool.flush)
+        return spool, receiver.filename, receiver.fields
+    except BaseException:
+        spool.close()
+        raise